@@ -219,6 +219,7 @@ const ResultsPage = () => {
                 title={getLanguageTitle(result.title)}
                 snippet={result.snippet}
                 link={result.link}
+                query={query}
                 isSelectedForComparison={selectedItems.some(item => item.link === result.link)}
                 onSelectForComparison={() => handleSelectForComparison({
                   title: result.title,
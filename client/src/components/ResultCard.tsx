@@ -6,6 +6,7 @@ interface ResultCardProps {
   title: string;
   snippet: string;
   link: string;
+  query?: string;
   isSelectedForComparison: boolean;
   onSelectForComparison: () => void;
 }
@@ -52,6 +53,7 @@ const ResultCard: React.FC<ResultCardProps> = ({
   title,
   snippet,
   link,
+  query,
   isSelectedForComparison,
   onSelectForComparison
 }) => {
@@ -82,7 +84,8 @@ const ResultCard: React.FC<ResultCardProps> = ({
       const response = await fetch(`${BASE_URL}/summary`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ url: link })
+        // The search query focuses the summary on the relevant passages
+        body: JSON.stringify({ url: link, query })
       });
 
       if (!response.ok) {
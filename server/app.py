@@ -1,21 +1,67 @@
-from flask import Flask, request, jsonify, g
-from services import compare_websites, get_summary, get_summerized_results
-from search import search
+from flask import Flask, Response, request, jsonify, g
+from werkzeug.exceptions import HTTPException
+from services import (
+    compare_many,
+    compare_websites,
+    get_summary,
+    get_summerized_results,
+    summarize_many,
+    stream_compare,
+    stream_summary,
+    stream_summerized_results,
+    warm_up,
+)
+from streaming import sse, sse_response, wants_stream
+import llm_scheduler
+import models
+from llm_scheduler import LLMOverloaded
+from search import search, snippets_text
+import prefetch
+import metrics
+import jobs
+import resilience
+import ratelimit  # registers the sqlite:// and batched+ limiter storages
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-import pandas as pd
 import json
 import os
 import logging
 import time
 import uuid
 import asyncio
+import runtime
+from settings import (
+    RATELIMIT_ENABLED,
+    RATELIMIT_QUOTA,
+    WARMUP_ON_START,
+    COMPARE_JOB_WORKERS,
+    COMPARE_JOB_MAX_QUEUE,
+    COMPARE_JOB_TTL,
+    COMPARE_JOB_TIMEOUT,
+    COMPARE_JOB_BACKEND,
+    COMPARE_MAX_SITES,
+    SUMMARY_BATCH_MAX_URLS,
+)
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = Flask(__name__)
+class AsyncFlask(Flask):
+    """Flask that runs async views on the worker's persistent runtime loop
+    instead of spinning up a fresh event loop for every request."""
+
+    def async_to_sync(self, func):
+        def run(*args, **kwargs):
+            return runtime.run_in_context(func(*args, **kwargs))
+        return run
+
+app = AsyncFlask(__name__)
+
+# One long-lived event loop per worker process; stopped at exit.
+runtime.start()
+if WARMUP_ON_START:
+    runtime.on_startup(warm_up)
 
 # Security: Load allowed origins from env
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS").split(",")
@@ -27,12 +73,56 @@ CORS(
     max_age=3600
 )
 
-# Rate Limiting (In-memory for now)
+# Rate limiting; counters are shared by every worker using the same storage
 limiter = Limiter(
     get_remote_address,
     app=app,
     default_limits=["200 per day", "50 per hour"],
-    storage_uri="memory://"
+    storage_uri=ratelimit.storage_uri(),
+    in_memory_fallback_enabled=True,
+    enabled=RATELIMIT_ENABLED,
+)
+
+def _spends_quota(response):
+    """Requests rejected as invalid (400) did no LLM work and spend no quota."""
+    return response.status_code != 400
+
+# Quota shared by the LLM-backed endpoints, spent by each route's cost weight
+llm_quota = limiter.shared_limit(
+    RATELIMIT_QUOTA,
+    scope="llm-quota",
+    cost=lambda: ratelimit.cost(request.url_rule.rule),
+    deduct_when=_spends_quota,
+)
+
+def _batch_urls():
+    """Distinct non-empty URL strings from a {"urls": [...]} body, in order."""
+    data = request.get_json(silent=True) or {}
+    urls = data.get('urls') if isinstance(data, dict) else None
+    if not isinstance(urls, list):
+        return []
+    return list(dict.fromkeys(u.strip() for u in urls if isinstance(u, str) and u.strip()))
+
+def _summary_query(data):
+    """The optional search query a summary should focus on, or None."""
+    query = data.get('query') if isinstance(data, dict) else None
+    return query.strip() or None if isinstance(query, str) else None
+
+def _batch_cost():
+    """A batch spends the /summary cost once per distinct URL. One that will be
+    rejected (no URLs, or over SUMMARY_BATCH_MAX_URLS) does no LLM work: it is
+    checked like a single /summary, so it gets its 400 rather than a 429, and
+    being a 400 it is not charged."""
+    count = len(_batch_urls())
+    if not 1 <= count <= SUMMARY_BATCH_MAX_URLS:
+        count = 1
+    return ratelimit.cost("/summary") * count
+
+batch_quota = limiter.shared_limit(
+    RATELIMIT_QUOTA,
+    scope="llm-quota",
+    cost=_batch_cost,
+    deduct_when=_spends_quota,
 )
 
 # Configure logging once for the server
@@ -57,6 +147,10 @@ for handler in logging.getLogger().handlers:
 def add_request_context():
     g.request_id = request.headers.get('X-Request-ID', str(uuid.uuid4()))
     g.start_time = time.time()
+    # Fair-queue LLM work per caller
+    llm_scheduler.current_client.set(get_remote_address())
+    # Label pipeline stages by route pattern, like request_seconds
+    metrics.current_endpoint.set(request.url_rule.rule if request.url_rule else "unmatched")
     logger.info(
         "Incoming request",
         extra={"request_id": g.request_id}
@@ -66,7 +160,14 @@ def add_request_context():
 def add_response_headers(response):
     response.headers['X-Request-ID'] = getattr(g, 'request_id', '-')
     try:
-        duration_ms = int((time.time() - getattr(g, 'start_time', time.time())) * 1000)
+        elapsed = time.time() - getattr(g, 'start_time', time.time())
+        # Label by route pattern, not raw path, to keep series bounded
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        if endpoint != "/metrics":
+            metrics.request_seconds.observe(
+                elapsed, endpoint=endpoint, method=request.method, status=response.status_code
+            )
+        duration_ms = int(elapsed * 1000)
         logger.info(
             f"Handled {request.method} {request.path} in {duration_ms}ms with {response.status_code}",
             extra={"request_id": getattr(g, 'request_id', '-')}
@@ -75,8 +176,31 @@ def add_response_headers(response):
         pass
     return response
 
+@app.errorhandler(LLMOverloaded)
+def handle_llm_overloaded(e):
+    logger.warning(f"Shedding request: {e}", extra={"request_id": getattr(g, 'request_id', '-')})
+    response = jsonify({
+        "error": str(e),
+        "request_id": getattr(g, 'request_id', '-')
+    })
+    response.headers['Retry-After'] = str(int(e.retry_after))
+    return response, e.status
+
+@app.errorhandler(jobs.QueueFull)
+def handle_queue_full(e):
+    logger.warning(f"Rejecting job: {e}", extra={"request_id": getattr(g, 'request_id', '-')})
+    response = jsonify({
+        "error": str(e),
+        "request_id": getattr(g, 'request_id', '-')
+    })
+    response.headers['Retry-After'] = str(int(e.retry_after))
+    return response, 503
+
 @app.errorhandler(Exception)
 def handle_unexpected_error(e):
+    if isinstance(e, HTTPException):
+        # 404s, 405s and rate-limit 429s keep their own status
+        return e
     logger.exception("Unhandled server error", extra={"request_id": getattr(g, 'request_id', '-')})
     return jsonify({
         "error": "Internal server error",
@@ -87,26 +211,49 @@ def handle_unexpected_error(e):
 def home():
     return "Welcome"
 
+@app.route('/metrics')
+@limiter.exempt
+def metrics_endpoint():
+    """Prometheus text exposition of this worker's metrics."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/health')
+@limiter.exempt
+def health():
+    """Circuit breaker state per upstream; "degraded" while any breaker is not closed.
+    Also reports this worker's LLM scheduler state and per-task model usage."""
+    upstreams = resilience.stats()
+    degraded = any(u["state"] != resilience.CLOSED for u in upstreams.values())
+    return jsonify({
+        "status": "degraded" if degraded else "ok",
+        "upstreams": upstreams,
+        "llm": {"scheduler": llm_scheduler.stats(), "tasks": models.stats()},
+    })
+
 @app.route("/search", methods=['POST'])
 @limiter.limit("10 per minute")
+@llm_quota
 async def search_form():
     body = request.get_json(silent=True) or {}
     query = (body.get('query') or '').strip()
     if not query:
         return jsonify({"error": "Missing or empty 'query' in request body", "request_id": getattr(g, 'request_id', '-') }), 400
+
+    if wants_stream(request):
+        return sse_response(_stream_search(query), getattr(g, 'request_id', '-'))
     
     # Async Search
     results = await search(query)
+    prefetch.schedule([r.link for r in results], query)
     
     # Calculate snippets for summary
-    top_snippets = results['snippet'].head(3).fillna('') if not results.empty else []
-    snippets_text = '. '.join(top_snippets) if len(top_snippets) > 0 else ''
+    snippets = snippets_text(results)
 
     # Generate summary directly
     sentences = []
     try:
-        if snippets_text:
-            summary_result = await get_summerized_results(snippets_text)
+        if snippets:
+            summary_result = await get_summerized_results(snippets)
             if summary_result:
                 # Basic parsing validity check logic from original code
                 # Note: original logic assumed specific format with brackets and pipes
@@ -126,11 +273,48 @@ async def search_form():
         logger.exception("Failed to generate summary in /search", extra={"request_id": getattr(g, 'request_id', '-')})
         sentences = []
 
-    return jsonify({'results': results.to_dict(orient='records'), 'summary_result': sentences})
+    return jsonify({'results': [r.to_dict() for r in results], 'summary_result': sentences})
+
+async def _stream_bullets(deltas):
+    """Yield summary sentences from a streamed "[s1|s2|...]" response as each one completes."""
+    buffer = ''
+    start = None
+    async for delta in deltas:
+        buffer += delta
+        if start is None:
+            idx = buffer.find('[')
+            if idx == -1:
+                continue
+            start = idx + 1
+        *done, rest = buffer[start:].split('|')
+        for sentence in done:
+            if sentence.strip():
+                yield sentence.strip()
+        start = len(buffer) - len(rest)
+
+    # Flush the last sentence; without brackets fall back to splitting everything
+    tail = buffer if start is None else buffer[start:]
+    if start is not None and tail.rfind(']') != -1:
+        tail = tail[:tail.rfind(']')]
+    for sentence in tail.split('|'):
+        if sentence.strip():
+            yield sentence.strip()
+
+async def _stream_search(query):
+    results = await search(query)
+    prefetch.schedule([r.link for r in results], query)
+    yield sse("results", [r.to_dict() for r in results])
+
+    snippets = snippets_text(results)
+    if snippets:
+        async for sentence in _stream_bullets(stream_summerized_results(snippets)):
+            yield sse("summary", sentence)
+    yield sse("done", {})
 
 
 @app.route('/compare-results', methods=['GET', 'POST'])
-@limiter.limit("5 per minute") 
+@limiter.limit("5 per minute")
+@llm_quota
 async def compare_webpages():
     if request.method == 'POST':
         data = request.get_json(silent=True) or {}
@@ -146,6 +330,11 @@ async def compare_webpages():
 
     if not url1 or not url2:
         return jsonify({"error": "Missing 'url1' or 'url2'", "request_id": getattr(g, 'request_id', '-') }), 400
+    prefetch.note_request(url1)
+    prefetch.note_request(url2)
+
+    if wants_stream(request):
+        return sse_response(_stream_compare(url1, url2, title1, title2), getattr(g, 'request_id', '-'))
     
     try:
         comparison_result = await compare_websites(url1, url2)
@@ -154,10 +343,163 @@ async def compare_webpages():
         if not final_comparison_data:
             return jsonify({"error": "Failed to compare the webpages", "request_id": getattr(g, 'request_id', '-') }), 500
         return jsonify({"websites": final_comparison_data}), 200
+    except LLMOverloaded:
+        raise
     except Exception as e:
         logger.exception("Error in /compare", extra={"request_id": getattr(g, 'request_id', '-')})
         return jsonify({"error": str(e), "request_id": getattr(g, 'request_id', '-') }), 500
 
+async def _stream_compare(url1, url2, title1, title2):
+    async for event, data in stream_compare(url1, url2):
+        if event == "result":
+            websites = convert_into_compare_format(data, url1, url2, title1, title2)
+            if not websites:
+                raise ValueError("Failed to compare the webpages")
+            yield sse("result", {"websites": websites})
+        else:
+            yield sse(event, data)
+    yield sse("done", {})
+
+async def _run_compare_job(url1, url2):
+    comparison = await compare_websites(url1, url2)
+    if convert_into_compare_format(comparison, url1, url2, None, None) is None:
+        raise ValueError("Failed to compare the webpages")
+    return comparison
+
+compare_jobs = jobs.JobQueue(
+    "compare",
+    _run_compare_job,
+    workers=COMPARE_JOB_WORKERS,
+    max_queue=COMPARE_JOB_MAX_QUEUE,
+    ttl=COMPARE_JOB_TTL,
+    timeout=COMPARE_JOB_TIMEOUT,
+    backend=COMPARE_JOB_BACKEND,
+)
+
+def _job_body(record):
+    body = {"job_id": record["id"], "status": record["status"]}
+    if record["status"] == jobs.DONE:
+        url1, url2 = record["args"]
+        titles = record["meta"].get("titles", {})
+        body["websites"] = convert_into_compare_format(
+            record["result"], url1, url2, titles.get(url1), titles.get(url2)
+        )
+    elif record["status"] == jobs.FAILED:
+        body["error"] = record["error"]
+    return body
+
+@app.route('/compare-jobs', methods=['POST'])
+@limiter.limit("5 per minute")
+@llm_quota
+async def submit_compare_job():
+    """Start (or join) a background comparison and return its job id right away."""
+    data = request.get_json(silent=True) or {}
+    url1 = data.get('url1')
+    url2 = data.get('url2')
+    if not url1 or not url2:
+        return jsonify({"error": "Missing 'url1' or 'url2'", "request_id": getattr(g, 'request_id', '-') }), 400
+    prefetch.note_request(url1)
+    prefetch.note_request(url2)
+
+    titles = {url1: data.get('title1'), url2: data.get('title2')}
+
+    # (url1, url2) and (url2, url1) are the same job; results list each site with its url
+    url1, url2 = sorted((url1, url2))
+    record, _created = await compare_jobs.submit(jobs.pair_id(url1, url2), (url1, url2), {"titles": titles})
+
+    body = _job_body(record)
+    body["poll"] = f"/compare-jobs/{record['id']}"
+    status = 200 if record["status"] in jobs.TERMINAL else 202
+    return jsonify(body), status, {"Location": body["poll"]}
+
+@app.route('/compare-jobs/<job_id>', methods=['GET'])
+@limiter.limit("120 per minute")
+async def get_compare_job(job_id):
+    """Job status and, once done, the comparison. `?wait=N` long-polls up to N seconds; `?stream=1` streams updates."""
+    if await compare_jobs.get(job_id) is None:
+        return jsonify({"error": "Unknown or expired job", "request_id": getattr(g, 'request_id', '-') }), 404
+
+    if wants_stream(request):
+        return sse_response(_stream_job(job_id), getattr(g, 'request_id', '-'))
+
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0.0), 30.0)
+    except ValueError:
+        wait = 0.0
+    record = await compare_jobs.wait_done(job_id, wait) if wait else await compare_jobs.get(job_id)
+    if record is None:
+        return jsonify({"error": "Unknown or expired job", "request_id": getattr(g, 'request_id', '-') }), 404
+    return jsonify(_job_body(record)), 200
+
+async def _stream_job(job_id):
+    async for record in compare_jobs.updates(job_id):
+        body = _job_body(record)
+        if record["status"] == jobs.DONE:
+            yield sse("result", {"websites": body["websites"]})
+        elif record["status"] == jobs.FAILED:
+            yield sse("error", {"error": body["error"]})
+        else:
+            yield sse("status", body)
+    yield sse("done", {})
+
+@app.route('/compare-multi', methods=['POST'])
+@limiter.limit("5 per minute")
+@llm_quota
+async def compare_multi():
+    """Compare 2..COMPARE_MAX_SITES sites. Body: {"sites": [{"url", "title"?}, ...]} or {"urls": [...]}."""
+    data = request.get_json(silent=True) or {}
+    sites = data.get('sites') or [{"url": url} for url in data.get('urls') or []]
+    sites = [site for site in sites if isinstance(site, dict) and site.get('url')]
+    titles = {site['url']: site.get('title') for site in sites}
+    urls = list(titles)
+    if len(urls) < 2 or len(urls) > COMPARE_MAX_SITES:
+        return jsonify({
+            "error": f"Provide between 2 and {COMPARE_MAX_SITES} distinct site urls",
+            "request_id": getattr(g, 'request_id', '-'),
+        }), 400
+    for url in urls:
+        prefetch.note_request(url)
+
+    try:
+        outcome = await compare_many(urls)
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        logger.exception("Error in /compare-multi", extra={"request_id": getattr(g, 'request_id', '-')})
+        return jsonify({"error": str(e), "request_id": getattr(g, 'request_id', '-') }), 500
+
+    comparison = outcome["comparison"] or {}
+    unique = comparison.get("unique_features", {})
+    websites = []
+    for url in urls:
+        analysis = outcome["sites"].get(url)
+        if not analysis:
+            websites.append({"url": url, "title": titles[url], "error": "Failed to analyze this webpage"})
+            continue
+        websites.append({
+            "url": url,
+            "title": titles[url],
+            "keyPoints": analysis.get("key_points", []),
+            "uniqueFeatures": unique.get(url, []),
+            "contentStructure": analysis.get("content_structure", {}),
+            "advantages": analysis.get("strengths", []),
+            "limitations": analysis.get("limitations", []),
+        })
+    if not outcome["comparison"]:
+        return jsonify({
+            "error": "Failed to compare the webpages",
+            "websites": websites,
+            "request_id": getattr(g, 'request_id', '-'),
+        }), 500
+    return jsonify({
+        "websites": websites,
+        "comparison": {
+            "similarities": comparison.get("similarities", []),
+            "differences": comparison.get("differences", []),
+            "summary": comparison.get("summary", ""),
+        },
+    }), 200
+
 def convert_into_compare_format(original_data, url1, url2, title1, title2):
     if not original_data or not isinstance(original_data, dict):
         return None
@@ -195,24 +537,70 @@ def convert_into_compare_format(original_data, url1, url2, title1, title2):
 
 @app.route('/summary', methods=['POST'])
 @limiter.limit("10 per minute")
+@llm_quota
 async def get_summary_api():
     data = request.get_json(silent=True) or {}
     url = data.get('url') if data else None
 
     if not url:
         return jsonify({"error": "Missing 'url' in request body", "request_id": getattr(g, 'request_id', '-') }), 400
+    query = _summary_query(data)
+    prefetch.note_request(url)
+
+    if wants_stream(request):
+        return sse_response(_stream_summary(url, query), getattr(g, 'request_id', '-'))
 
     try:
-        summary = await get_summary(url)
+        summary = await get_summary(url, query)
         if not summary:
             return jsonify({"error": "Failed to process the webpage", "request_id": getattr(g, 'request_id', '-') }), 500
         return jsonify({"summary": summary}), 200
+    except LLMOverloaded:
+        raise
     except Exception as e:
         logger.exception("Error in /summary", extra={"request_id": getattr(g, 'request_id', '-')})
         return jsonify({"error": str(e), "request_id": getattr(g, 'request_id', '-') }), 500
 
+async def _stream_summary(url, query=None):
+    async for delta in stream_summary(url, query):
+        yield sse("token", delta)
+    yield sse("done", {})
+
+@app.route('/summary/batch', methods=['POST'])
+@limiter.limit("5 per minute")
+@batch_quota
+async def summary_batch():
+    """Summaries for up to SUMMARY_BATCH_MAX_URLS pages. Body: {"urls": [...], "query"?}.
+
+    Returns {"results": [{"url", "summary"} | {"url", "error"}, ...]} in request
+    order, or with ?stream=1 one `result` event per URL as each finishes.
+    """
+    urls = _batch_urls()
+    if not urls or len(urls) > SUMMARY_BATCH_MAX_URLS:
+        return jsonify({
+            "error": f"Provide between 1 and {SUMMARY_BATCH_MAX_URLS} distinct urls in 'urls'",
+            "request_id": getattr(g, 'request_id', '-'),
+        }), 400
+    query = _summary_query(request.get_json(silent=True))
+    for url in urls:
+        prefetch.note_request(url)
+
+    if wants_stream(request):
+        return sse_response(_stream_summary_batch(urls, query), getattr(g, 'request_id', '-'))
+
+    results = {result["url"]: result async for result in summarize_many(urls, query=query)}
+    return jsonify({"results": [results[url] for url in urls]}), 200
+
+async def _stream_summary_batch(urls, query=None):
+    failed = 0
+    async for result in summarize_many(urls, query=query):
+        failed += "error" in result
+        yield sse("result", result)
+    yield sse("done", {"total": len(urls), "failed": failed})
+
 @app.route('/query-summary', methods=['GET'])
 @limiter.limit("10 per minute")
+@llm_quota
 async def query_summary():
     """
     Stateless /query-summary. Requires 'q' param to perform search + summarize.
@@ -225,13 +613,12 @@ async def query_summary():
             
         # Perform search to get content to summarize
         results = await search(q)
-        top_snippets = results['snippet'].head(3).fillna('') if not results.empty else []
-        snippets_text = '. '.join(top_snippets) if len(top_snippets) > 0 else ''
+        snippets = snippets_text(results)
 
-        if not snippets_text:
+        if not snippets:
             return jsonify({"summary_result": []}), 200
             
-        summary_result = await get_summerized_results(snippets_text)
+        summary_result = await get_summerized_results(snippets)
         
         if not summary_result:
             return jsonify({"summary_result": []}), 200
@@ -245,10 +632,14 @@ async def query_summary():
 
         sentences = [s.strip() for s in sentences if s.strip()]
         return jsonify({"summary_result": sentences}), 200
+    except LLMOverloaded:
+        raise
     except Exception as e:
         logger.exception("Error in /query-summary", extra={"request_id": getattr(g, 'request_id', '-')})
         return jsonify({"error": str(e), "request_id": getattr(g, 'request_id', '-') }), 500
 
 if __name__ == '__main__':
+    # Development server only; see gunicorn.conf.py for production serving
     port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=True)
\ No newline at end of file
+    debug = os.environ.get("FLASK_DEBUG", "1").lower() in ("1", "true", "yes")
+    app.run(host="0.0.0.0", port=port, debug=debug, threaded=True)
\ No newline at end of file
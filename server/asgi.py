@@ -0,0 +1,12 @@
+"""ASGI entry point: uvicorn asgi:app --workers 4
+
+The Flask app is wrapped with a2wsgi's WSGIMiddleware, which runs requests on
+a pool of ASGI_THREADS threads (default 32, like GUNICORN_THREADS), so that
+many run at once per worker. Every async view still runs on this process's
+persistent runtime loop, so pooling works the same as under gunicorn.conf.py.
+"""
+import os
+from a2wsgi import WSGIMiddleware
+from app import app as flask_app
+
+app = WSGIMiddleware(flask_app, workers=int(os.getenv("ASGI_THREADS", "32")))
@@ -0,0 +1,101 @@
+"""Benchmark HTML-to-text extraction on a corpus of saved pages.
+
+Compares the old BeautifulSoup path (full tree + get_text) against
+extract.extract_from_bytes. Run from the server directory:
+
+    python -m bench.bench_extract
+    python -m bench.bench_extract --pages /path/to/saved/pages --repeat 20
+    python -m bench.bench_extract --inflate 4   # also time each page blown up to ~4 MB
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extract  # noqa: E402
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+
+
+def bs4_baseline(body, content_type=None):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(extract.decode(body, content_type), 'html.parser')
+    for script in soup(["script", "style"]):
+        script.extract()
+    return soup.get_text()
+
+
+def load_corpus(directory):
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith((".html", ".htm")):
+            with open(os.path.join(directory, name), "rb") as f:
+                pages.append((name, f.read()))
+    return pages
+
+
+def inflate(body, megabytes):
+    """Repeat the <body> of a page until the document reaches roughly `megabytes` MB."""
+    target = int(megabytes * 1024 * 1024)
+    start = body.lower().find(b"<body")
+    end = body.lower().rfind(b"</body>")
+    if start == -1 or end == -1:
+        return body * max(1, target // max(1, len(body)))
+    inner = body[body.index(b">", start) + 1:end]
+    copies = max(1, (target - len(body)) // max(1, len(inner)))
+    return body[:end] + inner * copies + body[end:]
+
+
+def time_fn(fn, body, repeat):
+    samples = []
+    output = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = fn(body)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), output
+
+
+def run(pages, repeat):
+    print(f"{'page':<28}{'KB':>9}{'bs4 ms':>10}{'new ms':>10}{'speedup':>9}{'bs4 chars':>11}{'new chars':>11}")
+    total_old = total_new = total_bytes = 0.0
+    for name, body in pages:
+        old_ms, old_text = time_fn(bs4_baseline, body, repeat)
+        new_ms, new_text = time_fn(extract.extract_from_bytes, body, repeat)
+        total_old += old_ms
+        total_new += new_ms
+        total_bytes += len(body)
+        print(
+            f"{name[:27]:<28}{len(body) / 1024:>9.1f}{old_ms:>10.2f}{new_ms:>10.2f}"
+            f"{old_ms / max(new_ms, 1e-9):>8.1f}x{len(old_text):>11}{len(new_text):>11}"
+        )
+    mb = total_bytes / (1024 * 1024)
+    print(
+        f"{'total':<28}{total_bytes / 1024:>9.1f}{total_old:>10.2f}{total_new:>10.2f}"
+        f"{total_old / max(total_new, 1e-9):>8.1f}x"
+    )
+    print(f"throughput: bs4 {mb / (total_old / 1000):.1f} MB/s, new {mb / (total_new / 1000):.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default=PAGES_DIR, help="directory of saved .html pages")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per page (median is reported)")
+    parser.add_argument("--inflate", type=float, default=0, help="also benchmark each page inflated to N MB")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.pages)
+    if not pages:
+        parser.error(f"no .html files in {args.pages}")
+    run(pages, args.repeat)
+    if args.inflate:
+        print()
+        big = [(f"{name} x{args.inflate:g}MB", inflate(body, args.inflate)) for name, body in pages]
+        run(big, max(1, args.repeat // 5))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""Local stand-ins for every upstream the server talks to, so load tests run offline.
+
+One aiohttp app serves all three on a single port:
+
+    GET  /search.json                    SerpApi-shaped results linking to /site/...
+    POST /openai/v1/chat/completions     Groq (OpenAI-compatible) chat, plain or streamed
+    GET  /site/<n>/<page>.html           the bench/pages corpus; <n> makes distinct URLs
+
+Point the server at it with (loadtest.py does this for you):
+
+    SERPAPI_URL=http://127.0.0.1:8900/search.json
+    GROQ_API_BASE=http://127.0.0.1:8900
+
+Run standalone from the server directory:
+
+    python -m bench.fakes --port 8900 --llm-latency 0.4 --llm-tps 250
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+from aiohttp import web
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+
+WORDS = (
+    "latency throughput cache request worker queue model token page search summary "
+    "result server client pipeline budget stream event content extract compare"
+).split()
+
+
+@dataclass
+class FakeConfig:
+    search_latency: float = 0.3
+    page_latency: float = 0.1
+    llm_latency: float = 0.4       # time to first token
+    llm_tps: float = 250.0         # generated tokens per second after the first
+    output_tokens: int = 120       # tokens in free-text answers
+    sites: int = 50                # distinct /site/<n>/ prefixes handed out by search
+    results: int = 10
+    error_rate: float = 0.0        # fraction of upstream calls answered with a 5xx
+    seed: int = 0
+
+
+def _jitter(seconds):
+    # +/-20% so concurrent requests don't finish in lockstep
+    return max(0.0, seconds * random.uniform(0.8, 1.2))
+
+
+def _words(n, salt=""):
+    rng = random.Random(salt)
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def _fake_answer(prompt, output_tokens):
+    """Something that passes the server's validators for whichever prompt was sent."""
+    salt = hashlib.sha1(prompt.encode()).hexdigest()
+    if "Analyze the single website" in prompt:
+        return json.dumps({
+            "key_points": [_words(8, salt + "k1").capitalize(), _words(8, salt + "k2").capitalize()],
+            "strengths": [_words(6, salt + "s").capitalize()],
+            "limitations": [_words(6, salt + "l").capitalize()],
+            "content_structure": {"introduction": "intro", "mainContent": "body", "conclusion": "end"},
+        }, indent=2)
+    if "analyses of several websites" in prompt:
+        labels = sorted(set(re.findall(r'"(site\d+)"', prompt.split("### Analyses:")[-1])))
+        return json.dumps({
+            "unique_features": {label: [_words(5, salt + label).capitalize()] for label in labels},
+            "similarities": [_words(8, salt + "same").capitalize()],
+            "differences": [_words(8, salt + "diff").capitalize()],
+            "summary": _words(20, salt + "sum").capitalize() + ".",
+        }, indent=2)
+    if "compare the following two websites" in prompt:
+        def pair(kind):
+            return {"web1": [f"{kind} one", f"{kind} two"], "web2": [f"{kind} three"]}
+        structure = {"introduction": "intro", "mainContent": "body", "conclusion": "end"}
+        return json.dumps({
+            "key_information": pair("point"),
+            "unique_features": pair("feature"),
+            "content_structure": {"web1": structure, "web2": structure},
+            "strengths": pair("strength"),
+            "limitations": pair("limitation"),
+        }, indent=2)
+    if "pipe(|) separated" in prompt:
+        return "[" + "|\n".join(_words(12, salt + str(i)).capitalize() + "." for i in range(5)) + " ]"
+    if "Summarize the content below" in prompt:
+        per_line = max(8, output_tokens // 4)
+        return "\n".join(_words(per_line, salt + str(i)).capitalize() + "." for i in range(4))
+    return _words(output_tokens, salt).capitalize() + "."
+
+
+def _prompt_text(body):
+    return "\n".join(str(m.get("content") or "") for m in body.get("messages", []))
+
+
+def _usage(prompt, completion):
+    prompt_tokens = len(prompt) // 4 + 1
+    completion_tokens = len(completion) // 4 + 1
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def make_app(config):
+    stats = Counter()
+    pages = {
+        name: open(os.path.join(PAGES_DIR, name), "rb").read()
+        for name in sorted(os.listdir(PAGES_DIR))
+        if name.endswith(".html")
+    }
+    page_names = sorted(pages)
+    started = time.time()
+
+    def failing():
+        return config.error_rate > 0 and random.random() < config.error_rate
+
+    async def search_json(request):
+        stats["search"] += 1
+        await asyncio.sleep(_jitter(config.search_latency))
+        if failing():
+            stats["search_errors"] += 1
+            return web.json_response({"error": "fake upstream failure"}, status=503)
+        query = request.query.get("q", "")
+        rng = random.Random(query)
+        base = f"{request.scheme}://{request.host}"
+        organic = []
+        for position in range(1, min(config.results, int(request.query.get("num", config.results))) + 1):
+            site = rng.randrange(config.sites)
+            page = rng.choice(page_names)
+            organic.append({
+                "position": position,
+                "title": f"{query} - result {position}",
+                "link": f"{base}/site/{site}/{page}",
+                "snippet": _words(30, f"{query}{position}").capitalize() + ".",
+            })
+        return web.json_response({"search_metadata": {"status": "Success"}, "organic_results": organic})
+
+    async def site_page(request):
+        stats["pages"] += 1
+        await asyncio.sleep(_jitter(config.page_latency))
+        if failing():
+            stats["page_errors"] += 1
+            return web.Response(status=502, text="bad gateway")
+        body = pages.get(request.match_info["page"])
+        if body is None:
+            raise web.HTTPNotFound()
+        charset = "iso-8859-1" if b"iso-8859-1" in body[:1024].lower() else "utf-8"
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        headers = {
+            "ETag": etag,
+            "Last-Modified": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(started)),
+            "Cache-Control": "max-age=300",
+        }
+        if request.headers.get("If-None-Match") == etag:
+            stats["pages_304"] += 1
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=body, content_type="text/html", charset=charset, headers=headers)
+
+    async def chat_completions(request):
+        stats["llm"] += 1
+        body = await request.json()
+        prompt = _prompt_text(body)
+        model = body.get("model", "fake")
+        if failing():
+            stats["llm_errors"] += 1
+            return web.json_response({"error": {"message": "fake upstream failure"}}, status=503)
+
+        answer = _fake_answer(prompt, config.output_tokens)
+        pieces = re.findall(r"\S+\s*", answer) or [answer]
+        per_token = 1.0 / config.llm_tps if config.llm_tps > 0 else 0.0
+        completion_id = f"chatcmpl-{stats['llm']}"
+        created = int(time.time())
+        await asyncio.sleep(_jitter(config.llm_latency))
+
+        if not body.get("stream"):
+            await asyncio.sleep(per_token * len(pieces))
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": answer},
+                    "finish_reason": "stop",
+                }],
+                "usage": _usage(prompt, answer),
+            })
+
+        stats["llm_streams"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(delta, finish=None, extra=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+                **(extra or {}),
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        await send({"role": "assistant", "content": ""})
+        for piece in pieces:
+            await send({"content": piece})
+            if per_token:
+                await asyncio.sleep(per_token)
+        await send({}, finish="stop", extra={"x_groq": {"id": completion_id, "usage": _usage(prompt, answer)}})
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def fake_stats(request):
+        return web.json_response(dict(stats))
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app["stats"] = stats
+    app.router.add_get("/search.json", search_json)
+    app.router.add_get("/site/{site}/{page}", site_page)
+    app.router.add_post("/openai/v1/chat/completions", chat_completions)
+    app.router.add_get("/_stats", fake_stats)
+    return app
+
+
+async def start(config, host="127.0.0.1", port=8900):
+    """Start the fakes on the current loop; returns the AppRunner (call .cleanup() to stop)."""
+    random.seed(config.seed)
+    runner = web.AppRunner(make_app(config), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def add_arguments(parser):
+    defaults = FakeConfig()
+    parser.add_argument("--search-latency", type=float, default=defaults.search_latency, help="SerpApi delay (s)")
+    parser.add_argument("--page-latency", type=float, default=defaults.page_latency, help="site delay (s)")
+    parser.add_argument("--llm-latency", type=float, default=defaults.llm_latency, help="LLM time to first token (s)")
+    parser.add_argument("--llm-tps", type=float, default=defaults.llm_tps, help="LLM output tokens per second")
+    parser.add_argument("--output-tokens", type=int, default=defaults.output_tokens, help="tokens per free-text answer")
+    parser.add_argument("--sites", type=int, default=defaults.sites, help="distinct site prefixes in search results")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="fraction of upstream 5xx")
+
+
+def config_from_args(args):
+    return FakeConfig(
+        search_latency=args.search_latency,
+        page_latency=args.page_latency,
+        llm_latency=args.llm_latency,
+        llm_tps=args.llm_tps,
+        output_tokens=args.output_tokens,
+        sites=args.sites,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--seed", type=int, default=0)
+    add_arguments(parser)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    web.run_app(make_app(config_from_args(args)), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Closed-loop load generator for the SixthSense API.
+
+Each of `--concurrency` workers picks an endpoint from `--mix`, sends one
+request, waits for the full response (or the end of the SSE stream with
+--stream) and repeats until `--requests` are done or `--duration` elapses.
+
+    python -m bench.loadgen --target http://127.0.0.1:5000 --sites http://127.0.0.1:8900 \\
+        --concurrency 16 --duration 60 --mix search=4,summary=2,query-summary=2,compare=1 --out run.json
+
+Page URLs for /summary and /compare-results point at the fake site corpus
+(bench/fakes.py), so the server under test must be able to reach `--sites`.
+Queries and URLs are drawn from small pools (`--queries`, `--urls`), so
+repeats exercise the caches; raise the pool sizes for a cold-cache run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import aiohttp
+
+from bench import report
+from bench.fakes import PAGES_DIR
+
+ENDPOINTS = ("search", "summary", "summary-batch", "query-summary", "compare", "compare-multi")
+DEFAULT_MIX = "search=4,summary=2,query-summary=2,compare=1"
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in mix: {name!r} (expected one of {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("Mix must give at least one endpoint a positive weight")
+    return mix
+
+
+class Workload:
+    """Request factory: turns an endpoint name into (method, path, kwargs)."""
+
+    def __init__(self, sites_base, queries=20, urls=30, stream=False, seed=0):
+        self.rng = random.Random(seed)
+        pages = sorted(p for p in os.listdir(PAGES_DIR) if p.endswith(".html"))
+        self.queries = [f"benchmark query {i}" for i in range(queries)]
+        self.urls = [f"{sites_base.rstrip('/')}/site/{i}/{pages[i % len(pages)]}" for i in range(urls)]
+        self.stream = stream
+
+    def build(self, endpoint):
+        params = {"stream": "1"} if self.stream else {}
+        if endpoint == "search":
+            return "POST", "/search", {"json": {"query": self.rng.choice(self.queries)}, "params": params}
+        if endpoint == "query-summary":
+            return "GET", "/query-summary", {"params": {"q": self.rng.choice(self.queries)}}
+        if endpoint == "summary":
+            return "POST", "/summary", {"json": {"url": self.rng.choice(self.urls)}, "params": params}
+        if endpoint == "summary-batch":
+            return "POST", "/summary/batch", {"json": {"urls": self.rng.sample(self.urls, 5)}, "params": params}
+        if endpoint == "compare-multi":
+            return "POST", "/compare-multi", {"json": {"urls": self.rng.sample(self.urls, 3)}}
+        url1, url2 = self.rng.sample(self.urls, 2)
+        return "POST", "/compare-results", {"json": {"url1": url1, "url2": url2}, "params": params}
+
+
+async def _send(session, target, method, path, kwargs):
+    """Returns (status, latency_s, ttfb_s). Transport failures are reported as status 0."""
+    started = time.perf_counter()
+    ttfb = None
+    try:
+        async with session.request(method, target + path, **kwargs) as response:
+            async for _ in response.content.iter_any():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - started
+            status = response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        status = 0
+    return status, time.perf_counter() - started, ttfb
+
+
+async def run(target, workload, mix, concurrency=8, requests=None, duration=None, timeout=120, on_sample=None):
+    """Drive `target` and return the list of (endpoint, status, latency_s, ttfb_s) samples and elapsed time."""
+    if requests is None and duration is None:
+        requests = 100
+    names, weights = zip(*mix.items())
+    samples = []
+    issued = 0
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_endpoint():
+        nonlocal issued
+        if requests is not None and issued >= requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        issued += 1
+        return workload.rng.choices(names, weights)[0]
+
+    async def worker(session):
+        while True:
+            endpoint = next_endpoint()
+            if endpoint is None:
+                return
+            method, path, kwargs = workload.build(endpoint)
+            status, latency, ttfb = await _send(session, target.rstrip("/"), method, path, kwargs)
+            samples.append((endpoint, status, latency, ttfb))
+            if on_sample is not None:
+                on_sample(len(samples))
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    session_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=session_timeout) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+def add_arguments(parser):
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel clients")
+    parser.add_argument("--requests", type=int, help="total requests (default 100 unless --duration)")
+    parser.add_argument("--duration", type=float, help="run for this many seconds instead")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint weights, e.g. search=4,compare=1")
+    parser.add_argument("--queries", type=int, default=20, help="distinct search queries")
+    parser.add_argument("--urls", type=int, default=30, help="distinct page URLs")
+    parser.add_argument("--stream", action="store_true", help="request SSE responses where supported")
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", help="free-form run label stored in the report")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--baseline", help="compare against an earlier JSON report")
+
+
+def finish(args, samples, elapsed, extra=None):
+    """Summarize, print and optionally save/compare a run."""
+    result = report.summarize(samples, elapsed)
+    result["config"] = {
+        "label": args.label,
+        "concurrency": args.concurrency,
+        "mix": args.mix,
+        "stream": args.stream,
+        "queries": args.queries,
+        "urls": args.urls,
+        **(extra or {}),
+    }
+    print(report.render(result))
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"report written to {args.out}")
+    if args.baseline:
+        print()
+        print(report.compare(result, report.load(args.baseline)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="http://127.0.0.1:5000", help="server under test")
+    parser.add_argument("--sites", default="http://127.0.0.1:8900", help="base URL of bench.fakes")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    workload = Workload(args.sites, args.queries, args.urls, args.stream, args.seed)
+    samples, elapsed = asyncio.run(run(
+        args.target,
+        workload,
+        parse_mix(args.mix),
+        concurrency=args.concurrency,
+        requests=args.requests,
+        duration=args.duration,
+        timeout=args.timeout,
+    ))
+    finish(args, samples, elapsed, {"target": args.target})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Fully offline load test: fake upstreams + a real server process + the load generator.
+
+Starts bench.fakes on --fakes-port, launches the server (gunicorn by default)
+pointed at them with rate limiting off and a fresh content cache, drives it
+with bench.loadgen and prints p50/p95/p99 and throughput per endpoint. Run
+from the server directory:
+
+    python -m bench.loadtest --concurrency 16 --duration 60 --out runs/base.json
+    python -m bench.loadtest --concurrency 16 --duration 60 --out runs/new.json --baseline runs/base.json
+    python -m bench.loadtest --server flask --llm-latency 1.5 --llm-tps 80 --stream
+    python -m bench.loadtest --env LLM_MAX_CONCURRENCY=4 --env PREFETCH_ENABLED=false
+
+No network access or API keys are needed.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from bench import fakes, loadgen
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def server_command(kind):
+    if kind == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"]
+    if kind == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", "{port}",
+                "--workers", "{workers}", "--no-access-log"]
+    return [sys.executable, "app.py"]
+
+
+def server_env(args, fakes_base, cache_dir):
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(args.port),
+        "WEB_CONCURRENCY": str(args.workers),
+        "FLASK_DEBUG": "0",
+        "ALLOWED_ORIGINS": "*",
+        "RATELIMIT_ENABLED": "false",
+        "SERPAPI_KEY": "bench",
+        "SERPAPI_URL": f"{fakes_base}/search.json",
+        "GROQ_API_KEY": "bench",
+        "GROQ_API_BASE": fakes_base,
+        "CONTENT_CACHE_BACKEND": f"sqlite:///{os.path.join(cache_dir, 'content.db')}",
+        "RATELIMIT_STORAGE_URI": f"sqlite:///{os.path.join(cache_dir, 'ratelimit.db')}",
+        # The fakes have no provider quota; measure the server, not the free tier
+        "LLM_RPM": "0",
+        "LLM_TPM": "0",
+        # Every fake site shares one host; don't let politeness serialize them
+        "FETCH_PER_HOST": "64",
+        "FETCH_HOST_INTERVAL": "0",
+        "NO_PROXY": "127.0.0.1,localhost",
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+async def wait_ready(url, timeout):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=2)) as response:
+                    if response.status < 500:
+                        return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"server at {url} did not become ready within {timeout}s")
+
+
+async def scrape(url):
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                return await response.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return None
+
+
+async def main_async(args):
+    config = fakes.config_from_args(args)
+    runner = await fakes.start(config, port=args.fakes_port)
+    fakes_base = f"http://127.0.0.1:{args.fakes_port}"
+    target = f"http://127.0.0.1:{args.port}"
+    cache_dir = tempfile.mkdtemp(prefix="sixthsense-bench-")
+    log_path = args.server_log or os.path.join(tempfile.gettempdir(), "sixthsense-bench-server.log")
+    command = [part.format(port=args.port, workers=args.workers) for part in server_command(args.server)]
+
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            command, cwd=SERVER_DIR, env=server_env(args, fakes_base, cache_dir), stdout=log, stderr=subprocess.STDOUT
+        )
+    try:
+        await wait_ready(target + "/", args.startup_timeout)
+        print(f"server ({args.server}, {args.workers} worker(s)) ready at {target}; log: {log_path}")
+        workload = loadgen.Workload(fakes_base, args.queries, args.urls, args.stream, args.seed)
+        samples, elapsed = await loadgen.run(
+            target,
+            workload,
+            loadgen.parse_mix(args.mix),
+            concurrency=args.concurrency,
+            requests=args.requests,
+            duration=args.duration,
+            timeout=args.timeout,
+        )
+        if args.metrics_out:
+            text = await scrape(target + "/metrics")
+            if text is not None:
+                with open(args.metrics_out, "w") as f:
+                    f.write(text)
+        upstream = dict(runner.app["stats"])
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        await runner.cleanup()
+        if not args.keep_cache:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    extra = {
+        "server": args.server,
+        "workers": args.workers,
+        "fakes": {k: getattr(config, k) for k in ("search_latency", "page_latency", "llm_latency",
+                                                  "llm_tps", "output_tokens", "error_rate")},
+        "env": list(args.env),
+        "upstream_calls": upstream,
+    }
+    loadgen.finish(args, samples, elapsed, extra)
+    print(f"upstream calls: {upstream}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=("gunicorn", "uvicorn", "flask"), default="gunicorn")
+    parser.add_argument("--workers", type=int, default=2, help="server worker processes")
+    parser.add_argument("--port", type=int, default=5050, help="port for the server under test")
+    parser.add_argument("--fakes-port", type=int, default=8900)
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the server")
+    parser.add_argument("--startup-timeout", type=float, default=30)
+    parser.add_argument("--server-log", help="write server output here instead of the temp dir")
+    parser.add_argument("--keep-cache", action="store_true", help="don't delete the temp content cache")
+    parser.add_argument("--metrics-out", help="save the server's /metrics after the run")
+    fakes.add_arguments(parser)
+    loadgen.add_arguments(parser)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
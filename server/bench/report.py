@@ -0,0 +1,108 @@
+"""Latency/throughput reports for load-test runs, and comparison between runs.
+
+    python -m bench.report runs/after.json --baseline runs/before.json
+"""
+import argparse
+import json
+import math
+from collections import Counter
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, elapsed):
+    """Build a report from (endpoint, status, latency_s, ttfb_s) samples over `elapsed` seconds."""
+    by_endpoint = {}
+    for endpoint, status, latency, ttfb in samples:
+        by_endpoint.setdefault(endpoint, []).append((status, latency, ttfb))
+    by_endpoint["all"] = [(s, l, t) for _, s, l, t in samples]
+
+    endpoints = {}
+    for endpoint, rows in by_endpoint.items():
+        ok = sorted(latency for status, latency, _ in rows if 200 <= status < 400)
+        ttfb = sorted(t for status, _, t in rows if 200 <= status < 400 and t is not None)
+        statuses = Counter(str(status) for status, _, _ in rows)
+        entry = {
+            "requests": len(rows),
+            "errors": len(rows) - len(ok),
+            "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+            "status": dict(statuses),
+            "mean_ms": round(sum(ok) / len(ok) * 1000, 1) if ok else None,
+            "max_ms": round(ok[-1] * 1000, 1) if ok else None,
+        }
+        for pct in PERCENTILES:
+            value = percentile(ok, pct)
+            entry[f"p{pct}_ms"] = round(value * 1000, 1) if value is not None else None
+        if ttfb:
+            entry["ttfb_p50_ms"] = round(percentile(ttfb, 50) * 1000, 1)
+            entry["ttfb_p95_ms"] = round(percentile(ttfb, 95) * 1000, 1)
+        endpoints[endpoint] = entry
+    return {"elapsed_s": round(elapsed, 2), "endpoints": endpoints}
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def render(report):
+    lines = [f"{'endpoint':<18}{'reqs':>7}{'errs':>6}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'ttfb50':>9}"]
+    for endpoint, e in report["endpoints"].items():
+        lines.append(
+            f"{endpoint:<18}{e['requests']:>7}{e['errors']:>6}{e['throughput_rps']:>8.1f}"
+            f"{_fmt(e['p50_ms']):>9}{_fmt(e['p95_ms']):>9}{_fmt(e['p99_ms']):>9}{_fmt(e['max_ms']):>9}"
+            f"{_fmt(e.get('ttfb_p50_ms')):>9}"
+        )
+    lines.append(f"latencies in ms over {report['elapsed_s']}s")
+    return "\n".join(lines)
+
+
+def _delta(new, old):
+    if new is None or old is None:
+        return "-"
+    if not old:
+        return f"{new:.1f}"
+    return f"{(new - old) / old * 100:+.0f}%"
+
+
+def compare(report, baseline):
+    """Per-endpoint change vs. a baseline report; negative latency / positive rps is better."""
+    keys = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+    lines = [f"{'endpoint':<18}" + "".join(f"{k:>24}" for k in keys)]
+    for endpoint, e in report["endpoints"].items():
+        old = baseline["endpoints"].get(endpoint)
+        if old is None:
+            continue
+        cells = []
+        for key in keys:
+            cells.append(f"{_fmt(old[key])}->{_fmt(e[key])} {_delta(e[key], old[key])}")
+        lines.append(f"{endpoint:<18}" + "".join(f"{c:>24}" for c in cells))
+    return "\n".join(lines)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("report", help="JSON report written by loadgen/loadtest --out")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args()
+    report = load(args.report)
+    print(render(report))
+    if args.baseline:
+        print()
+        print(compare(report, load(args.baseline)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Worker cold-start profile and import-time budget check.
+
+Imports `app` in fresh interpreters, reports the slowest imports (from
+`python -X importtime`) and checks two things:
+
+- the median wall time of `import app` stays under --budget-ms;
+- the modules in DEFERRED are not loaded by `import app` but on first use,
+  or by the WARMUP_ON_START hook.
+
+Exits non-zero when a check fails, so CI can run it. From the server directory:
+
+    python -m bench.startup                  # profile + checks
+    python -m bench.startup --budget-ms 600 --runs 7 --top 30
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy modules that must only be imported when first needed
+DEFERRED = ("pandas", "bs4", "langchain_core", "langchain_groq", "langchain_text_splitters", "groq", "numpy")
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+import_ms = (time.perf_counter() - started) * 1000
+loaded = sorted(m for m in {deferred!r} if m in sys.modules)
+started = time.perf_counter()
+import services
+services._load_llm_stack()
+stack_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{"import_ms": import_ms, "loaded": loaded, "stack_ms": stack_ms}}))
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("ALLOWED_ORIGINS", "*")
+    env.setdefault("GROQ_API_KEY", "bench")
+    env["WARMUP_ON_START"] = "false"
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def probe():
+    """One fresh interpreter: `import app` wall time, deferred modules it loaded, cost of the lazy stack."""
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(deferred=DEFERRED)],
+        cwd=SERVER_DIR, env=_env(), capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_profile():
+    """(module, self_us, cumulative_us) rows for `import app` from -X importtime."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=SERVER_DIR, env=_env(), capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=800, help="max median wall time of `import app`")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=20, help="slowest imports to list")
+    args = parser.parse_args()
+
+    print("slowest imports under `import app` (cumulative ms, self ms):")
+    rows = import_profile()
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>9.1f} {self_us / 1000:>8.1f}  {name}")
+
+    probes = [probe() for _ in range(args.runs)]
+    import_ms = statistics.median(p["import_ms"] for p in probes)
+    stack_ms = statistics.median(p["stack_ms"] for p in probes)
+    loaded = sorted({m for p in probes for m in p["loaded"]})
+    print()
+    print(f"import app: median {import_ms:.0f}ms over {args.runs} runs (budget {args.budget_ms:.0f}ms)")
+    print(f"deferred LLM stack (first use / warm-up): median {stack_ms:.0f}ms")
+
+    failed = False
+    if import_ms > args.budget_ms:
+        print(f"FAIL: import time {import_ms:.0f}ms is over the {args.budget_ms:.0f}ms budget")
+        failed = True
+    if loaded:
+        print(f"FAIL: imported eagerly by app: {', '.join(loaded)}")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import metrics
+import runtime
+from settings import (
+    CACHE_MMAP_SIZE,
+    CACHE_COMPACT_INTERVAL,
+    CACHE_IO_WORKERS,
+)
+
+logger = logging.getLogger("cache")
+
+# SQLite values at least this large (as JSON) are stored compressed
+COMPRESS_MIN_BYTES = 1024
+# A read only rewrites a row's LRU timestamp when it is older than this (seconds)
+ACCESS_UPDATE_INTERVAL = 60
+# Eviction trims a full table to this fraction of its caps, so the next writes don't evict again
+EVICT_LOW_WATER = 0.9
+
+# Blocking backend calls from async code run here, not on the runtime loop
+_io_executor = ThreadPoolExecutor(max_workers=CACHE_IO_WORKERS, thread_name_prefix="cache-io")
+
+
+class CacheBackend:
+    """Storage interface used by TTLCache. Entries are (value, expires_at) pairs."""
+
+    # Whether the backend may be called from several threads at once
+    thread_safe = False
+    # Whether calls may block on disk or other processes (and so must stay off the event loop)
+    blocking = False
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, entry):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU bounded by entry count."""
+
+    def __init__(self, max_entries=1024, on_evict=None):
+        self.max_entries = 1024 if max_entries is None else max_entries
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data.move_to_end(key)
+        return entry
+
+    def set(self, key, entry):
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            if self.on_evict:
+                self.on_evict()
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend(CacheBackend):
+    """SQLite-backed store bounded by total value size, shareable across worker processes.
+
+    Values must be JSON-serializable; payloads over COMPRESS_MIN_BYTES are
+    stored zlib-compressed. Each thread gets its own connection, opened after
+    fork, and the database runs in WAL mode with memory-mapped reads, so
+    readers in every worker proceed concurrently and don't block the writer.
+    Eviction drops least-recently-used rows once the table grows past
+    `max_bytes` (of stored, i.e. compressed, data) or `max_entries` rows, down
+    to EVICT_LOW_WATER of both. Writes keep a running estimate of the table's
+    size and only measure it when the estimate crosses a cap; rows written by
+    other workers are caught by `compact()`, which always measures, also
+    purges expired rows and returns free pages to the filesystem.
+    """
+
+    thread_safe = True
+    blocking = True
+
+    def __init__(self, path, table="cache", max_bytes=64 * 1024 * 1024, max_entries=None, on_evict=None):
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._pid = None
+        # (rows, bytes) as this process last measured them plus what it wrote since
+        self._estimate = None
+        self._estimate_lock = threading.Lock()
+        # Fail at start-up, not on first use, if the file can't be opened
+        self._conn()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._pid != os.getpid():
+            if self._pid != os.getpid():
+                # Connections must not cross a fork
+                self._pid = os.getpid()
+                self._local = threading.local()
+                self._estimate = None
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            # Only takes effect on a new file; compact() converts older ones
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={CACHE_MMAP_SIZE}")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, "
+                "size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _encode(value):
+        payload = json.dumps(value).encode("utf-8")
+        if len(payload) < COMPRESS_MIN_BYTES:
+            return payload.decode("utf-8")
+        # Stored as a BLOB; plain-text rows (small, or written before compression) still read fine
+        return zlib.compress(payload, 6)
+
+    @staticmethod
+    def _decode(stored):
+        if isinstance(stored, bytes):
+            stored = zlib.decompress(stored)
+        return json.loads(stored)
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute(
+            f"SELECT value, expires_at, accessed_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        # Reads stay read-only unless the LRU clock is noticeably stale
+        if now - row[2] > ACCESS_UPDATE_INTERVAL:
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        return self._decode(row[0]), row[1]
+
+    def set(self, key, entry):
+        value, expires_at = entry
+        stored = self._encode(value)
+        conn = self._conn()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, size, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, stored, expires_at, len(stored), time.time()),
+        )
+        with self._estimate_lock:
+            if self._estimate is None:
+                self._estimate = self._measure(conn)
+            else:
+                # Replacing a row overcounts; that only makes the next measurement come sooner
+                rows, size = self._estimate
+                self._estimate = (rows + 1, size + len(stored))
+            over = self._over(*self._estimate)
+        if over:
+            self._evict(conn)
+
+    def _measure(self, conn):
+        rows, size = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        return rows, size
+
+    def _over(self, rows, size, fraction=1.0):
+        return size > self.max_bytes * fraction or (
+            self.max_entries is not None and rows > self.max_entries * fraction
+        )
+
+    def _evict(self, conn):
+        """Drop least-recently-used rows if the table is over a cap. Scans the table; not for every write."""
+        rows, size = self._measure(conn)
+        victims = []
+        if self._over(rows, size):
+            for key, row_size in conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed_at"):
+                if not self._over(rows, size, EVICT_LOW_WATER):
+                    break
+                victims.append((key,))
+                rows -= 1
+                size -= row_size
+            conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", victims)
+        with self._estimate_lock:
+            self._estimate = (rows, size)
+        if self.on_evict:
+            for _ in victims:
+                self.on_evict()
+        return len(victims)
+
+    def delete(self, key):
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute(f"DELETE FROM {self.table}")
+        with self._estimate_lock:
+            self._estimate = (0, 0)
+
+    def __len__(self):
+        return self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def claim_compaction(self, interval):
+        """True for the one process that should compact this table now.
+
+        Workers sharing the file race on a conditional update, so only one of
+        them does the work per `interval`.
+        """
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_compactions (name TEXT PRIMARY KEY, compacted_at REAL NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO cache_compactions (name, compacted_at) VALUES (?, 0)", (self.table,))
+        now = time.time()
+        return conn.execute(
+            "UPDATE cache_compactions SET compacted_at = ? WHERE name = ? AND compacted_at <= ?",
+            (now, self.table, now - interval),
+        ).rowcount == 1
+
+    def compact(self):
+        """Purge expired rows, enforce the size cap, release free pages and truncate the WAL.
+
+        Returns (expired, evicted) row counts.
+        """
+        conn = self._conn()
+        expired = conn.execute(
+            f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        ).rowcount
+        evicted = self._evict(conn)
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                # A file created before incremental vacuum: one full VACUUM switches it over
+                logger.info(f"Converting {self.path} to incremental vacuum")
+                conn.execute("VACUUM")
+            else:
+                conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.OperationalError as e:
+            # Busy with another process's transaction; the next round will retry
+            logger.info(f"Skipped vacuum/checkpoint of {self.path}: {e}")
+        return expired, evicted
+
+
+def make_backend(spec="memory", name="cache", max_entries=None, max_bytes=64 * 1024 * 1024, on_evict=None):
+    """Build a backend from a spec string: "memory" or "sqlite:///path/to/file.db".
+
+    `max_entries` caps both backends (None: 1024 in memory, unbounded in
+    SQLite); `max_bytes` caps SQLite only.
+    """
+    if spec in ("", "memory", "memory://"):
+        return MemoryBackend(max_entries=max_entries, on_evict=on_evict)
+    if spec.startswith("sqlite:///"):
+        return SQLiteBackend(
+            spec[len("sqlite:///"):], table=name, max_bytes=max_bytes, max_entries=max_entries, on_evict=on_evict
+        )
+    raise ValueError(f"Unsupported cache backend: {spec}")
+
+
+# Every TTLCache in the process, for the metrics collector
+caches = []
+
+
+class TTLCache:
+    """Thread-safe TTL cache with hit/miss/eviction counters over a pluggable backend.
+
+    A cache is an optimization: when the backend fails (e.g. SQLite is locked
+    by another worker for longer than its busy timeout) the error is logged and
+    counted, a read is a miss and a write is dropped. The `a`-prefixed methods
+    are for async code; they run blocking backends on a small thread pool.
+    """
+
+    def __init__(self, name, ttl=3600, max_entries=None, max_bytes=64 * 1024 * 1024, backend="memory"):
+        caches.append(self)
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        if isinstance(backend, CacheBackend):
+            self._backend = backend
+        else:
+            self._backend = make_backend(
+                backend,
+                name=name,
+                max_entries=max_entries,
+                max_bytes=max_bytes,
+                on_evict=self._count_eviction,
+            )
+        # SQLite readers run concurrently; only the in-process LRU needs serializing
+        self._lock = nullcontext() if self._backend.thread_safe else threading.Lock()
+
+    def _count_eviction(self):
+        self.evictions += 1
+
+    def _failed(self, operation, error):
+        self.errors += 1
+        logger.warning(f"Cache {self.name} {operation} failed: {error}")
+
+    def get(self, key, default=None):
+        try:
+            with self._lock:
+                entry = self._backend.get(key)
+                if entry is not None:
+                    value, expires_at = entry
+                    if expires_at is None or expires_at > time.time():
+                        self.hits += 1
+                        return value
+                    self._backend.delete(key)
+        except sqlite3.Error as e:
+            self._failed("get", e)
+        self.misses += 1
+        return default
+
+    def contains(self, key):
+        """Check for a live entry without touching the hit/miss counters."""
+        try:
+            with self._lock:
+                entry = self._backend.get(key)
+        except sqlite3.Error as e:
+            self._failed("get", e)
+            return False
+        return entry is not None and (entry[1] is None or entry[1] > time.time())
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        try:
+            with self._lock:
+                self._backend.set(key, (value, expires_at))
+        except sqlite3.Error as e:
+            self._failed("set", e)
+
+    def delete(self, key):
+        try:
+            with self._lock:
+                self._backend.delete(key)
+        except sqlite3.Error as e:
+            self._failed("delete", e)
+
+    def clear(self):
+        with self._lock:
+            self._backend.clear()
+
+    async def _offload(self, fn, *args):
+        if not self._backend.blocking:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(_io_executor, fn, *args)
+
+    async def aget(self, key, default=None):
+        return await self._offload(self.get, key, default)
+
+    async def acontains(self, key):
+        return await self._offload(self.contains, key)
+
+    async def aset(self, key, value, ttl=None):
+        await self._offload(self.set, key, value, ttl)
+
+    async def adelete(self, key):
+        await self._offload(self.delete, key)
+
+    def stats(self):
+        try:
+            with self._lock:
+                size = len(self._backend)
+        except sqlite3.Error as e:
+            self._failed("count", e)
+            size = None
+        return {
+            "name": self.name,
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
+
+
+compacted_rows = metrics.Counter(
+    "sixthsense_cache_compacted_rows_total",
+    "Rows removed from SQLite caches by background compaction.",
+    ("cache", "reason"),
+)
+
+
+def compact_all(interval=CACHE_COMPACT_INTERVAL):
+    """Compact every SQLite-backed cache this process can claim. Blocking."""
+    for cache in caches:
+        backend = cache._backend
+        if not isinstance(backend, SQLiteBackend) or not backend.claim_compaction(interval):
+            continue
+        started = time.perf_counter()
+        try:
+            expired, evicted = backend.compact()
+        except sqlite3.Error:
+            logger.exception(f"Compacting cache {cache.name} failed")
+            continue
+        compacted_rows.inc(expired, cache=cache.name, reason="expired")
+        compacted_rows.inc(evicted, cache=cache.name, reason="evicted")
+        logger.info(
+            f"Compacted cache {cache.name}: {expired} expired, {evicted} evicted "
+            f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+
+
+_compactor = None
+
+
+async def _compaction_loop():
+    while True:
+        await asyncio.sleep(CACHE_COMPACT_INTERVAL)
+        # SQLite work blocks; keep it off the event loop
+        await asyncio.to_thread(compact_all)
+
+
+@runtime.on_startup
+async def _start_compactor():
+    global _compactor
+    if CACHE_COMPACT_INTERVAL > 0:
+        _compactor = asyncio.create_task(_compaction_loop())
+
+
+@runtime.on_shutdown
+async def _stop_compactor():
+    global _compactor
+    if _compactor is not None:
+        _compactor.cancel()
+        _compactor = None
+
+
+@metrics.register_collector
+def _collect():
+    snapshots = [cache.stats() for cache in caches]
+    yield (
+        "sixthsense_cache_events_total",
+        "counter",
+        "Cache lookups, evictions and backend errors by cache.",
+        [
+            ({"cache": snap["name"], "event": event}, snap[field])
+            for snap in snapshots
+            for event, field in (
+                ("hit", "hits"), ("miss", "misses"), ("eviction", "evictions"), ("error", "errors"),
+            )
+        ],
+    )
+    yield (
+        "sixthsense_cache_entries",
+        "gauge",
+        "Entries currently stored per cache.",
+        [({"cache": snap["name"]}, snap["size"]) for snap in snapshots if snap["size"] is not None],
+    )
@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import time
+from email.utils import parsedate_to_datetime
+import metrics
+from cache import TTLCache
+from settings import (
+    CONTENT_CACHE_BACKEND,
+    CONTENT_CACHE_MAX_BYTES,
+    PAGE_CACHE_TTL,
+    PAGE_FRESH_TTL,
+    LLM_CACHE_TTL,
+)
+
+logger = logging.getLogger("content_cache")
+
+# Both tables live in the same store; each gets half of the cap so together
+# they stay within CONTENT_CACHE_MAX_BYTES
+_TABLE_MAX_BYTES = CONTENT_CACHE_MAX_BYTES // 2
+
+# URL -> extracted page text, the validators the server sent with it and how
+# long it may be used without asking the server again
+page_cache = TTLCache(
+    "pages",
+    ttl=PAGE_CACHE_TTL,
+    max_bytes=_TABLE_MAX_BYTES,
+    backend=CONTENT_CACHE_BACKEND,
+)
+
+# hash(prompt) + hash(input) -> LLM output (cleaned content, summaries)
+llm_cache = TTLCache(
+    "llm_outputs",
+    ttl=LLM_CACHE_TTL,
+    max_bytes=_TABLE_MAX_BYTES,
+    backend=CONTENT_CACHE_BACKEND,
+)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def prompt_version(template: str) -> str:
+    """Short hash of a prompt template; editing a prompt invalidates its cached outputs."""
+    return content_hash(template)[:12]
+
+
+def llm_key(kind: str, template: str, content: str, model: str = "") -> str:
+    return f"{kind}:{model}:{prompt_version(template)}:{content_hash(content)}"
+
+
+revalidations = metrics.Counter(
+    "sixthsense_page_revalidations_total",
+    "Outcomes of conditional re-fetches of stale cached pages.",
+    ("outcome",),
+)
+
+
+def body_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def _cache_directives(headers):
+    directives = {}
+    for part in (headers.get("Cache-Control") or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+
+def freshness_lifetime(headers):
+    """Seconds a response may be reused without revalidation, capped at PAGE_CACHE_TTL."""
+    directives = _cache_directives(headers)
+    if "no-cache" in directives or "no-store" in directives:
+        return 0
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            try:
+                return min(max(0, int(directives[name])), PAGE_CACHE_TTL)
+            except ValueError:
+                return 0
+    if headers.get("Expires"):
+        try:
+            expires = parsedate_to_datetime(headers["Expires"]).timestamp()
+        except (TypeError, ValueError):
+            return 0
+        return min(max(0, int(expires - time.time())), PAGE_CACHE_TTL)
+    return PAGE_FRESH_TTL
+
+
+async def get_page(url):
+    return await page_cache.aget(url)
+
+
+def is_fresh(entry):
+    return entry.get("fresh_until", 0) > time.time()
+
+
+def conditional_headers(entry):
+    """If-None-Match / If-Modified-Since for revalidating a cached page."""
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+async def put_page(url, text, headers=None, digest=None, previous=None):
+    """Store a page's text with its validators. `previous` is the entry being
+    revalidated: validators a 304 doesn't repeat are carried over from it."""
+    headers = headers or {}
+    previous = previous or {}
+    if "no-store" in _cache_directives(headers):
+        await page_cache.adelete(url)
+        return
+    cache_control = headers.get("Cache-Control") or previous.get("cache_control")
+    lifetime = freshness_lifetime({"Cache-Control": cache_control, "Expires": headers.get("Expires")})
+    await page_cache.aset(url, {
+        "text": text,
+        "etag": headers.get("ETag") or previous.get("etag"),
+        "last_modified": headers.get("Last-Modified") or previous.get("last_modified"),
+        "cache_control": cache_control,
+        "digest": digest or previous.get("digest"),
+        "fresh_until": time.time() + lifetime,
+    })
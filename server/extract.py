@@ -0,0 +1,167 @@
+import asyncio
+import codecs
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from html.parser import HTMLParser
+import runtime
+from settings import EXTRACT_EXECUTOR, EXTRACT_WORKERS
+
+logger = logging.getLogger("extract")
+
+# Subtrees whose text is never page content. Forms are kept (WebForms and many
+# CMS templates wrap the whole page in one); their controls are skipped here.
+SKIP_TAGS = frozenset([
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe",
+    "nav", "footer", "aside", "button", "select",
+])
+# Skipped only as direct children of <body>: the site header, not an <article>'s title block
+PAGE_CHROME_TAGS = frozenset(["header"])
+# Tags that end a line of text
+BLOCK_TAGS = frozenset([
+    "p", "div", "section", "article", "main", "br", "li", "ul", "ol", "tr", "td", "th",
+    "table", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "dd", "dt", "hr",
+])
+VOID_TAGS = frozenset([
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr",
+])
+
+TEXT_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain", "application/xml", "text/xml")
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_\-]+)""", re.IGNORECASE)
+_HEADER_CHARSET = re.compile(r"charset\s*=\s*[\"']?([a-zA-Z0-9_\-]+)", re.IGNORECASE)
+_SPACES = re.compile(r"[ \t\r\f\v\xa0]+")
+
+
+class UnsupportedContent(ValueError):
+    pass
+
+
+def check_content_type(content_type):
+    """Raise UnsupportedContent for bodies we can't extract text from (PDFs, images, ...)."""
+    mime = (content_type or "").split(";")[0].strip().lower()
+    if mime and mime not in TEXT_CONTENT_TYPES:
+        raise UnsupportedContent(f"Unsupported content type: {mime}")
+
+
+def sniff_charset(body: bytes, content_type=None) -> str:
+    """Pick a charset from the BOM, the Content-Type header or a <meta> tag, in that order."""
+    for bom, name in ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16")):
+        if body.startswith(bom):
+            return name
+    for candidate in (
+        _HEADER_CHARSET.search(content_type or ""),
+        _META_CHARSET.search(body[:4096]),
+    ):
+        if candidate:
+            name = candidate.group(1)
+            if isinstance(name, bytes):
+                name = name.decode("ascii", "ignore")
+            try:
+                return codecs.lookup(name).name
+            except LookupError:
+                continue
+    return "utf-8"
+
+
+def decode(body: bytes, content_type=None) -> str:
+    return body.decode(sniff_charset(body, content_type), errors="replace")
+
+
+class _TextExtractor(HTMLParser):
+    """Single pass over the markup; text inside SKIP_TAGS subtrees (and
+    PAGE_CHROME_TAGS directly under <body>) is dropped.
+
+    Open elements are tracked on a stack, so an end tag also closes any
+    elements left open inside it, and a skipped subtree ends with its own
+    end tag even in sloppy markup.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+        # (tag, skipped) for each open non-void element
+        self.stack = []
+
+    def _skips(self, tag):
+        if tag in SKIP_TAGS:
+            return True
+        if tag in PAGE_CHROME_TAGS:
+            parent = self.stack[-1][0] if self.stack else None
+            return parent in (None, "html", "body")
+        return False
+
+    def handle_starttag(self, tag, attrs):
+        skipped = self._skips(tag)
+        if tag not in VOID_TAGS:
+            self.stack.append((tag, skipped))
+            self.skip_depth += skipped
+        if tag in BLOCK_TAGS and not self.skip_depth:
+            self.parts.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS and not self.skip_depth:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if any(open_tag == tag for open_tag, _ in self.stack):
+            while True:
+                open_tag, skipped = self.stack.pop()
+                self.skip_depth -= skipped
+                if open_tag == tag:
+                    break
+        if tag in BLOCK_TAGS and not self.skip_depth:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+
+def extract_text(html: str) -> str:
+    """Visible main text of an HTML document with boilerplate removed, one block per line."""
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        logger.warning("HTML parser gave up early; returning partial text")
+    lines = (_SPACES.sub(" ", line).strip() for line in "".join(parser.parts).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def extract_from_bytes(body: bytes, content_type=None) -> str:
+    mime = (content_type or "").split(";")[0].strip().lower()
+    text = decode(body, content_type)
+    if mime == "text/plain":
+        return text
+    return extract_text(text)
+
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        if EXTRACT_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="extract")
+    return _executor
+
+
+@runtime.on_shutdown
+async def _shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def extract_async(body: bytes, content_type=None) -> str:
+    """Decode and extract off the event loop, in the configured thread/process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), extract_from_bytes, body, content_type)
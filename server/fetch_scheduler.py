@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+import http_client
+import metrics
+import runtime
+import singleflight
+from settings import (
+    FETCH_MAX_CONCURRENCY,
+    FETCH_PER_HOST,
+    FETCH_HOST_INTERVAL,
+    FETCH_RESPECT_ROBOTS,
+    FETCH_ROBOTS_AGENT,
+    FETCH_ROBOTS_TTL,
+    FETCH_SLOW_THRESHOLD,
+    FETCH_SLOW_STRIKES,
+    FETCH_SLOW_TIMEOUT,
+    FETCH_SLOW_PENALTY,
+)
+
+logger = logging.getLogger("fetch_scheduler")
+
+# Idle host entries are pruned once there are more than this many
+_MAX_HOSTS = 4096
+
+
+class FetchBlocked(Exception):
+    """The site's robots.txt disallows fetching this URL."""
+
+
+class _Host:
+    __slots__ = ("semaphore", "active", "waiting", "next_start", "strikes", "slow_until")
+
+    def __init__(self, per_host):
+        self.semaphore = asyncio.Semaphore(per_host)
+        self.active = 0
+        self.waiting = 0
+        self.next_start = 0.0
+        self.strikes = 0
+        self.slow_until = 0.0
+
+    @property
+    def idle(self):
+        return not self.active and not self.waiting and self.slow_until <= time.monotonic()
+
+
+class FetchScheduler:
+    """Politeness and concurrency control for outbound page fetches.
+
+    Each host gets at most `per_host` concurrent requests, started at least
+    `min_interval` seconds apart, and the process at most `max_concurrency`
+    overall. A host whose fetches stall (time out or take longer than
+    `slow_threshold`) `slow_strikes` times in a row is marked slow for
+    `slow_penalty` seconds, during which its fetches get the shorter
+    `slow_timeout`, so one bad site can't hold a comparison hostage. Only
+    touched from the runtime loop.
+    """
+
+    def __init__(self, max_concurrency=32, per_host=2, min_interval=0.5, slow_threshold=5.0,
+                 slow_strikes=3, slow_timeout=5.0, slow_penalty=300.0):
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.min_interval = min_interval
+        self.slow_threshold = slow_threshold
+        self.slow_strikes = slow_strikes
+        self.slow_timeout = slow_timeout
+        self.slow_penalty = slow_penalty
+        self.active = 0
+        self.waiting = 0
+        self.counters = Counter()
+        self._hosts = {}
+        self._global = None
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            if len(self._hosts) >= _MAX_HOSTS:
+                self._prune()
+            state = self._hosts[host] = _Host(self.per_host)
+        return state
+
+    def _prune(self):
+        for host in [h for h, state in self._hosts.items() if state.idle]:
+            del self._hosts[host]
+
+    def _get_global(self):
+        # Created lazily so it binds to the runtime loop
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.max_concurrency)
+        return self._global
+
+    def is_slow(self, host):
+        state = self._hosts.get(host)
+        return state is not None and state.slow_until > time.monotonic()
+
+    def timeout_for(self, host, timeout):
+        return min(timeout, self.slow_timeout) if self.is_slow(host) else timeout
+
+    async def _acquire(self, state):
+        queued_at = time.monotonic()
+        state.waiting += 1
+        self.waiting += 1
+        try:
+            await state.semaphore.acquire()
+            try:
+                # Reserve the next start time for this host before sleeping so
+                # concurrent callers space themselves out
+                now = time.monotonic()
+                start = max(now, state.next_start)
+                state.next_start = start + self.min_interval
+                if start > now:
+                    await asyncio.sleep(start - now)
+                await self._get_global().acquire()
+            except BaseException:
+                state.semaphore.release()
+                raise
+        finally:
+            state.waiting -= 1
+            self.waiting -= 1
+        state.active += 1
+        self.active += 1
+        metrics.stage_seconds.observe(time.monotonic() - queued_at, stage="fetch_queue")
+
+    def _release(self, state):
+        state.active -= 1
+        self.active -= 1
+        self._get_global().release()
+        state.semaphore.release()
+
+    def _record(self, host, state, elapsed, stalled):
+        if not stalled and elapsed < self.slow_threshold:
+            state.strikes = 0
+            return
+        state.strikes += 1
+        if state.strikes >= self.slow_strikes and state.slow_until <= time.monotonic():
+            state.slow_until = time.monotonic() + self.slow_penalty
+            self.counters["slow_hosts"] += 1
+            logger.warning(f"{host} keeps stalling; using a {self.slow_timeout:g}s timeout for {self.slow_penalty:g}s")
+
+    async def fetch(self, url, headers=None, timeout=15, max_bytes=None, check_headers=None):
+        host = (urlsplit(url).netloc or "").lower()
+        if FETCH_RESPECT_ROBOTS and not await robots_allowed(url):
+            self.counters["robots_blocked"] += 1
+            raise FetchBlocked(f"robots.txt disallows {url}")
+
+        state = self._host(host)
+        await self._acquire(state)
+        started = time.monotonic()
+        stalled = False
+        try:
+            timeout = self.timeout_for(host, timeout)
+            return await http_client.fetch_bytes(
+                url, headers=headers, timeout=timeout, max_bytes=max_bytes, check_headers=check_headers,
+            )
+        except asyncio.TimeoutError:
+            stalled = True
+            self.counters["timeouts"] += 1
+            raise
+        finally:
+            self._release(state)
+            self.counters["fetches"] += 1
+            self._record(host, state, time.monotonic() - started, stalled)
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": self.waiting,
+            "hosts": len(self._hosts),
+            "slow_hosts": sum(1 for host in self._hosts if self.is_slow(host)),
+            **self.counters,
+        }
+
+
+scheduler = FetchScheduler(
+    max_concurrency=FETCH_MAX_CONCURRENCY,
+    per_host=FETCH_PER_HOST,
+    min_interval=FETCH_HOST_INTERVAL,
+    slow_threshold=FETCH_SLOW_THRESHOLD,
+    slow_strikes=FETCH_SLOW_STRIKES,
+    slow_timeout=FETCH_SLOW_TIMEOUT,
+    slow_penalty=FETCH_SLOW_PENALTY,
+)
+
+# netloc -> (RobotFileParser, expires_at); per worker
+_robots = {}
+
+
+async def _load_robots(origin):
+    parser = RobotFileParser(origin + "/robots.txt")
+    try:
+        status, text = await http_client.get_status_text(origin + "/robots.txt", timeout=5)
+    except Exception as e:
+        logger.info(f"Could not read {origin}/robots.txt ({e}); allowing")
+        status, text = 404, ""
+    # Same rules as RobotFileParser.read(): auth errors block, other errors allow
+    if status in (401, 403):
+        parser.disallow_all = True
+    elif status >= 400:
+        parser.allow_all = True
+    else:
+        parser.parse(text.splitlines())
+    _robots[origin] = (parser, time.monotonic() + FETCH_ROBOTS_TTL)
+    return parser
+
+
+async def robots_allowed(url):
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc.lower()}"
+    cached = _robots.get(origin)
+    if cached is not None and cached[1] > time.monotonic():
+        parser = cached[0]
+    else:
+        parser = await singleflight.do("robots", origin, lambda: _load_robots(origin))
+    return parser.can_fetch(FETCH_ROBOTS_AGENT, url)
+
+
+async def fetch(url, headers=None, timeout=15, max_bytes=None, check_headers=None):
+    """http_client.fetch_bytes for page downloads, subject to per-host politeness and global limits."""
+    return await runtime.run(scheduler.fetch(
+        url, headers=headers, timeout=timeout, max_bytes=max_bytes, check_headers=check_headers,
+    ))
+
+
+def stats():
+    return scheduler.stats()
+
+
+@metrics.register_collector
+def _collect():
+    snapshot = scheduler.stats()
+    yield ("sixthsense_fetch_active", "gauge", "Page fetches in flight.", [({}, snapshot["active"])])
+    yield ("sixthsense_fetch_queued", "gauge", "Page fetches waiting for a host or global slot.", [({}, snapshot["queued"])])
+    yield ("sixthsense_fetch_slow_hosts", "gauge", "Hosts currently on the short slow-host timeout.", [({}, snapshot["slow_hosts"])])
+    yield (
+        "sixthsense_fetch_events_total",
+        "counter",
+        "Page fetches, timeouts, robots.txt blocks and hosts marked slow.",
+        [({"event": event}, snapshot.get(event, 0)) for event in ("fetches", "timeouts", "robots_blocked", "slow_hosts")],
+    )
@@ -0,0 +1,39 @@
+"""Production serving config: gunicorn -c gunicorn.conf.py app:app
+
+Each worker process runs one persistent asyncio loop (see runtime.py) that
+executes every async view and owns the shared HTTP pool, caches of in-flight
+work and LLM clients. Worker threads only hand requests to that loop and wait,
+so they are cheap: size `threads` for concurrent in-flight requests per worker,
+and `workers` for CPU cores.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# One worker per core by default. Every worker has its own loop, connection
+# pool and in-memory caches; the SQLite content cache is shared between them.
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+# Long LLM pipelines (compare, streaming) need more than the 30s default
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+# The runtime loop is a thread; threads don't survive fork, so the app must be
+# imported in each worker rather than in the master.
+preload_app = False
+
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    import runtime
+    runtime.start()
+
+
+def worker_exit(server, worker):
+    import runtime
+    runtime.shutdown()
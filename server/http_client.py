@@ -0,0 +1,108 @@
+import aiohttp
+import logging
+import runtime
+from settings import (
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_DNS_TTL,
+    HTTP_KEEPALIVE_TIMEOUT,
+)
+
+logger = logging.getLogger("http_client")
+
+_session = None
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """Return the shared session. Must be called on the runtime loop."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+        logger.info("Created shared HTTP session")
+    return _session
+
+
+@runtime.on_shutdown
+async def close():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("Closed shared HTTP session")
+    _session = None
+
+
+async def _get_json(url, params=None, headers=None, timeout=10):
+    session = _get_session()
+    async with session.get(url, params=params, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()
+        return await response.json()
+
+
+async def _get_text(url, params=None, headers=None, timeout=15):
+    session = _get_session()
+    async with session.get(url, params=params, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()
+        return await response.text()
+
+
+async def _get_status_text(url, headers=None, timeout=15):
+    session = _get_session()
+    async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        return response.status, await response.text(errors="replace")
+
+
+async def _fetch_bytes(url, headers=None, timeout=15, max_bytes=None, check_headers=None):
+    session = _get_session()
+    async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()
+        if response.status == 304:
+            return None, response.headers.copy()
+        if check_headers is not None:
+            check_headers(response.headers)
+        chunks = []
+        received = 0
+        truncated = False
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            chunks.append(chunk)
+            received += len(chunk)
+            if max_bytes and received >= max_bytes:
+                truncated = True
+                break
+        body = b"".join(chunks)
+        if truncated:
+            body = body[:max_bytes]
+            logger.info(f"Truncated {url} at {max_bytes} bytes")
+        return body, response.headers.copy()
+
+
+async def get_json(url, params=None, headers=None, timeout=10):
+    """GET `url` through the shared pool and decode the JSON body."""
+    return await runtime.run(_get_json(url, params=params, headers=headers, timeout=timeout))
+
+
+async def get_text(url, params=None, headers=None, timeout=15):
+    """GET `url` through the shared pool and return the decoded body."""
+    return await runtime.run(_get_text(url, params=params, headers=headers, timeout=timeout))
+
+
+async def get_status_text(url, headers=None, timeout=15):
+    """GET `url` through the shared pool without raising on HTTP errors. Returns (status, body)."""
+    return await runtime.run(_get_status_text(url, headers=headers, timeout=timeout))
+
+
+async def fetch_bytes(url, headers=None, timeout=15, max_bytes=None, check_headers=None):
+    """Stream the body of `url`, stopping after `max_bytes`. Returns (body, headers).
+
+    `check_headers(headers)` runs before the body is read and may raise to
+    abandon the download (e.g. for an unwanted content type). For a conditional
+    request answered with 304 Not Modified, body is None.
+    """
+    return await runtime.run(_fetch_bytes(
+        url, headers=headers, timeout=timeout, max_bytes=max_bytes, check_headers=check_headers,
+    ))
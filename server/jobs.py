@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import Counter
+import metrics
+import runtime
+from cache import TTLCache
+
+logger = logging.getLogger("jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+TERMINAL = (DONE, FAILED)
+
+# Failed jobs are kept briefly so pollers see the error, then may be resubmitted
+FAILED_TTL = 60
+# How often a worker that isn't running a job re-reads the shared store
+POLL_INTERVAL = 0.5
+
+queues = []
+
+
+class QueueFull(Exception):
+    """Raised by submit when the executor already has its maximum of running and waiting jobs."""
+
+    def __init__(self, message, retry_after=10):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def pair_id(*parts):
+    """Stable job id for an unordered set of inputs, so (a, b) and (b, a) share a job."""
+    return hashlib.sha256("\n".join(sorted(parts)).encode("utf-8")).hexdigest()[:32]
+
+
+class JobQueue:
+    """Deduplicated background jobs with results kept for `ttl` seconds.
+
+    `submit(job_id, args)` returns at once; `run(*args)` executes later on the
+    runtime loop, with at most `workers` running and `max_queue` more waiting
+    (beyond that QueueFull is raised). A job id that is queued, running or done
+    is never started twice. Job records live in a TTLCache, so with a SQLite
+    backend every worker on the host can answer polls, while the work runs in
+    the worker that accepted it. Unfinished records expire after `timeout`, so a
+    worker dying mid-job doesn't pin them.
+    """
+
+    def __init__(self, name, run, workers=4, max_queue=32, ttl=3600, timeout=300, backend="memory"):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.store = TTLCache(f"{name}_jobs", ttl=ttl, backend=backend)
+        self.counters = Counter()
+        self._run = run
+        self._tasks = {}
+        self._changed = {}
+        self._semaphore = None
+        queues.append(self)
+
+    def _get_semaphore(self):
+        # Created lazily so it binds to the runtime loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        return self._semaphore
+
+    async def get(self, job_id):
+        return await self.store.aget(job_id)
+
+    async def _save(self, record):
+        record["updated"] = time.time()
+        if record["status"] == DONE:
+            ttl = None
+        elif record["status"] == FAILED:
+            ttl = FAILED_TTL
+        else:
+            ttl = self.timeout + FAILED_TTL
+        await self.store.aset(record["id"], record, ttl=ttl)
+        changed = self._changed.pop(record["id"], None)
+        if changed is not None:
+            changed.set()
+
+    async def submit(self, job_id, args, meta=None):
+        """Start job `job_id` unless an equivalent one exists; returns (record, created)."""
+        return await runtime.run(self._submit(job_id, list(args), meta or {}))
+
+    async def _submit(self, job_id, args, meta):
+        record = await self.store.aget(job_id)
+        if record is not None and (record["status"] != FAILED or job_id in self._tasks):
+            self.counters["deduplicated"] += 1
+            return record, False
+        if job_id in self._tasks:
+            # Submitted while the store read was in flight
+            self.counters["deduplicated"] += 1
+            return await self.store.aget(job_id), False
+        if len(self._tasks) >= self.workers + self.max_queue:
+            self.counters["rejected"] += 1
+            raise QueueFull(f"Too many pending {self.name} jobs; try again later")
+
+        record = {
+            "id": job_id,
+            "status": QUEUED,
+            "args": args,
+            "meta": meta,
+            "created": time.time(),
+            "result": None,
+            "error": None,
+        }
+        await self._save(record)
+        if job_id in self._tasks:
+            self.counters["deduplicated"] += 1
+            return await self.store.aget(job_id), False
+        task = asyncio.ensure_future(self._execute(record))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _t: self._tasks.pop(job_id, None))
+        self.counters["submitted"] += 1
+        return record, True
+
+    async def _execute(self, record):
+        started = time.monotonic()
+        try:
+            async with self._get_semaphore():
+                record["status"] = RUNNING
+                await self._save(record)
+                remaining = max(0.0, self.timeout - (time.monotonic() - started))
+                result = await asyncio.wait_for(self._run(*record["args"]), remaining)
+            if result is None:
+                raise ValueError(f"{self.name} job produced no result")
+            record.update(status=DONE, result=result)
+            self.counters["done"] += 1
+        except asyncio.CancelledError:
+            record.update(status=FAILED, error="Job was cancelled")
+            await self._save(record)
+            raise
+        except asyncio.TimeoutError:
+            record.update(status=FAILED, error=f"Job timed out after {self.timeout:.0f}s")
+            self.counters["failed"] += 1
+        except Exception as e:
+            logger.warning(f"{self.name} job {record['id']} failed: {e}")
+            record.update(status=FAILED, error=str(e))
+            self.counters["failed"] += 1
+        metrics.stage_seconds.observe(time.monotonic() - started, stage=f"{self.name}_job")
+        await self._save(record)
+
+    async def wait(self, job_id, timeout, status=None):
+        """Wait up to `timeout` seconds for the job to leave `status`; returns the latest record."""
+        return await runtime.run(self._wait(job_id, timeout, status))
+
+    async def _wait(self, job_id, timeout, status):
+        record = await self.store.aget(job_id)
+        if record is None or record["status"] != status:
+            return record
+        if job_id in self._tasks:
+            changed = self._changed.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            # Running in another worker: poll the shared store
+            await asyncio.sleep(min(timeout, POLL_INTERVAL))
+        return await self.store.aget(job_id)
+
+    async def wait_done(self, job_id, timeout):
+        """Long-poll: the job record once it is done or failed, or the latest one after `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        record = await self.get(job_id)
+        while record is not None and record["status"] not in TERMINAL:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            record = await self.wait(job_id, remaining, record["status"])
+        return record
+
+    async def updates(self, job_id, timeout=None):
+        """Yield the job record each time its status changes, ending with the terminal one."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        record = await self.get(job_id)
+        while record is not None:
+            yield record
+            status = record["status"]
+            while record is not None and record["status"] == status:
+                remaining = deadline - time.monotonic()
+                if status in TERMINAL or remaining <= 0:
+                    return
+                record = await self.wait(job_id, remaining, status)
+
+    def stats(self):
+        return {
+            "pending": len(self._tasks),
+            **self.counters,
+        }
+
+
+@metrics.register_collector
+def _collect():
+    yield (
+        "sixthsense_jobs_pending",
+        "gauge",
+        "Background jobs queued or running in this worker.",
+        [({"queue": q.name}, len(q._tasks)) for q in queues],
+    )
+    yield (
+        "sixthsense_jobs_total",
+        "counter",
+        "Background jobs by outcome.",
+        [({"queue": q.name, "outcome": outcome}, n) for q in queues for outcome, n in q.counters.items()],
+    )
@@ -0,0 +1,412 @@
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict, deque
+from contextvars import ContextVar
+import metrics
+import runtime
+from settings import (
+    LLM_MAX_CONCURRENCY,
+    LLM_INTERACTIVE_RESERVE,
+    LLM_INTERACTIVE_TOKEN_SHARE,
+    LLM_TIER_MODELS,
+    LLM_TIER_LIMITS,
+    LLM_MAX_QUEUE,
+    LLM_MAX_QUEUE_PER_CLIENT,
+    LLM_QUEUE_TIMEOUT,
+)
+
+logger = logging.getLogger("llm_scheduler")
+
+# Priority classes; lower runs first
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Who is asking (for fair queuing) and how urgent it is. Set by the request
+# handler / background job; values follow the work onto the runtime loop.
+current_client = runtime.propagate(ContextVar("llm_client", default="-"))
+current_priority = runtime.propagate(ContextVar("llm_priority", default=INTERACTIVE))
+# The shared call (singleflight) this work runs for, if any. Anything with a
+# `priority` and a `parent`; an interactive caller joining the call raises its
+# priority, and with it that of every LLM call made on its behalf.
+current_flight = runtime.propagate(ContextVar("llm_flight", default=None))
+
+
+def effective_priority(priority, flight):
+    """`priority`, raised to that of `flight` and the shared calls enclosing it."""
+    while flight is not None:
+        priority = min(priority, flight.priority)
+        flight = flight.parent
+    return priority
+
+
+class LLMOverloaded(Exception):
+    """Raised instead of queueing when the scheduler can't take more work.
+
+    `status` is 429 when a single client has too much queued, 503 otherwise.
+    """
+
+    def __init__(self, message, status=503, retry_after=5):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Continuous-refill bucket sized to a per-minute allowance; <= 0 means unlimited."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self):
+        return self.capacity <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, reserve=0.0):
+        """Seconds until `amount` can be taken leaving `reserve` behind.
+        Requests larger than the bucket wait for a full bucket."""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        needed = min(amount + reserve, self.capacity) - self.tokens
+        return 0.0 if needed <= 0 else needed / self.rate
+
+    def take(self, amount):
+        if not self.unlimited:
+            self._refill()
+            self.tokens -= amount
+
+    def give(self, amount):
+        """Return (or, with a negative amount, charge) tokens after the real usage is known."""
+        if not self.unlimited:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ModelBudget:
+    """The provider's per-model allowance: requests and tokens per minute, and any 429 back-off."""
+
+    def __init__(self, rpm=0, tpm=0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+
+    def wait_time(self, tokens, reserve_share=0.0):
+        return max(
+            self.paused_until - time.monotonic(),
+            self.requests.wait_time(1),
+            self.tokens.wait_time(tokens, self.tokens.capacity * reserve_share),
+        )
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "client", "priority", "model", "flight", "granted", "abandoned")
+
+    def __init__(self, future, tokens, client, priority, model, flight=None):
+        self.future = future
+        self.tokens = tokens
+        self.client = client
+        self.priority = priority
+        self.model = model
+        self.flight = flight
+        self.granted = False
+        self.abandoned = False
+
+
+class LLMScheduler:
+    """Admission control for every LLM call in the process.
+
+    Calls wait in per-priority queues; within a priority, clients are served
+    round-robin so one busy caller can't starve the rest. A call is admitted
+    when a concurrency slot is free and both the request-per-minute and
+    token-per-minute budgets of its model allow it. Each model has its own
+    budget (`model_limits`, else `rpm`/`tpm`), so a call waiting on a
+    throttled model doesn't hold up calls to another one. Background work can
+    never use the last `interactive_reserve` slots, nor the last
+    `interactive_token_share` of a model's token budget. A background call
+    that an interactive caller has since joined (see `current_flight`) is moved
+    up by `promote()`. When queues are full, or a call waits longer
+    than `queue_timeout`, LLMOverloaded is raised so the caller fails fast.
+    Only touched from the runtime loop.
+    """
+
+    def __init__(self, max_concurrency=8, interactive_reserve=2, rpm=0, tpm=0, model_limits=None,
+                 max_queue=100, max_queue_per_client=20, queue_timeout=30.0, interactive_token_share=0.0):
+        self.max_concurrency = max_concurrency
+        self.interactive_reserve = min(interactive_reserve, max(0, max_concurrency - 1))
+        self.interactive_token_share = min(max(interactive_token_share, 0.0), 1.0)
+        self.default_limits = (rpm, tpm)
+        self.model_limits = dict(model_limits or {})
+        self.budgets = {}
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = Counter()
+        self.counters = Counter()
+        self._queues = {INTERACTIVE: OrderedDict(), BACKGROUND: OrderedDict()}
+        self._per_client = Counter()
+        self._wakeup = None
+
+    def budget(self, model=None):
+        budget = self.budgets.get(model)
+        if budget is None:
+            budget = self.budgets[model] = ModelBudget(*self.model_limits.get(model, self.default_limits))
+        return budget
+
+    # --- queueing -----------------------------------------------------------
+
+    def _queue_limit(self, priority):
+        # Background work is shed first: it may only fill half the queue
+        return self.max_queue if priority == INTERACTIVE else self.max_queue // 2
+
+    async def acquire(self, tokens, priority=INTERACTIVE, client="-", model=None, flight=None):
+        priority = effective_priority(priority, flight)
+        if sum(self.queued.values()) >= self._queue_limit(priority):
+            self.counters["rejected"] += 1
+            raise LLMOverloaded("LLM queue is full", status=503)
+        if self._per_client[client] >= self.max_queue_per_client:
+            self.counters["rejected"] += 1
+            raise LLMOverloaded("Too many pending LLM requests for this client", status=429)
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), tokens, client, priority, model, flight)
+        self._queues[priority].setdefault(client, deque()).append(waiter)
+        self.queued[priority] += 1
+        self._per_client[client] += 1
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.granted:
+                self._abandon(waiter)
+                self.counters["timed_out"] += 1
+                raise LLMOverloaded("Timed out waiting for LLM capacity", status=503)
+        except asyncio.CancelledError:
+            if waiter.granted:
+                self.release(waiter)
+            else:
+                self._abandon(waiter)
+            raise
+        return waiter
+
+    def _abandon(self, waiter):
+        waiter.abandoned = True
+        self.queued[waiter.priority] -= 1
+        self._per_client[waiter.client] -= 1
+
+    def release(self, waiter, used_tokens=None):
+        self.active -= 1
+        if used_tokens is not None:
+            self.budget(waiter.model).tokens.give(waiter.tokens - used_tokens)
+            self.counters["tokens"] += used_tokens
+        self._dispatch()
+
+    def promote(self):
+        """Move queued background calls whose shared call an interactive caller
+        has joined to the interactive queue. Admitted calls keep running as they are."""
+        moved = 0
+        background = self._queues[BACKGROUND]
+        for client in list(background):
+            waiters = background[client]
+            for waiter in list(waiters):
+                if waiter.abandoned or effective_priority(waiter.priority, waiter.flight) != INTERACTIVE:
+                    continue
+                waiters.remove(waiter)
+                waiter.priority = INTERACTIVE
+                self._queues[INTERACTIVE].setdefault(client, deque()).append(waiter)
+                self.queued[BACKGROUND] -= 1
+                self.queued[INTERACTIVE] += 1
+                moved += 1
+            if not waiters:
+                del background[client]
+        if moved:
+            self.counters["promoted"] += moved
+            self._dispatch()
+
+    def _next_waiter(self):
+        """The next waiter whose model budget allows it now, and otherwise the
+        shortest wait until one does (None when nothing is eligible)."""
+        shortest = None
+        for priority in (INTERACTIVE, BACKGROUND):
+            if priority == BACKGROUND and self.active >= self.max_concurrency - self.interactive_reserve:
+                break
+            reserve_share = self.interactive_token_share if priority == BACKGROUND else 0.0
+            queue = self._queues[priority]
+            for client in list(queue):
+                waiters = queue[client]
+                while waiters and waiters[0].abandoned:
+                    waiters.popleft()
+                if not waiters:
+                    del queue[client]
+                    continue
+                # A client's calls go in order per model; one on a throttled model doesn't block another
+                blocked = set()
+                for waiter in waiters:
+                    if waiter.abandoned or waiter.model in blocked:
+                        continue
+                    delay = self.budget(waiter.model).wait_time(waiter.tokens, reserve_share)
+                    if delay <= 0:
+                        return waiter, 0.0
+                    blocked.add(waiter.model)
+                    shortest = delay if shortest is None else min(shortest, delay)
+        return None, shortest
+
+    def _dispatch(self):
+        while self.active < self.max_concurrency:
+            waiter, delay = self._next_waiter()
+            if waiter is None:
+                if delay is not None:
+                    self._wake_in(delay)
+                return
+
+            queue = self._queues[waiter.priority]
+            queue[waiter.client].remove(waiter)
+            # Rotate the client to the back so the others get the next turn
+            queue.move_to_end(waiter.client)
+            self.queued[waiter.priority] -= 1
+            self._per_client[waiter.client] -= 1
+
+            budget = self.budget(waiter.model)
+            budget.requests.take(1)
+            budget.tokens.take(waiter.tokens)
+            self.active += 1
+            waiter.granted = True
+            self.counters["admitted"] += 1
+            waiter.future.set_result(True)
+
+    def _wake_in(self, delay):
+        if self._wakeup is not None and not self._wakeup.cancelled():
+            self._wakeup.cancel()
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def note_error(self, exc, model=None):
+        """Back off from `model` when the provider itself says we're rate limited."""
+        if getattr(exc, "status_code", None) != 429:
+            return
+        retry_after = 5.0
+        response = getattr(exc, "response", None)
+        try:
+            retry_after = float(response.headers.get("retry-after", retry_after))
+        except (AttributeError, TypeError, ValueError):
+            pass
+        budget = self.budget(model)
+        budget.paused_until = max(budget.paused_until, time.monotonic() + retry_after)
+        self.counters["upstream_429"] += 1
+        logger.warning(f"LLM provider rate limited {model or 'us'}; pausing its calls for {retry_after:.1f}s")
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": {PRIORITY_NAMES[p]: n for p, n in self.queued.items()},
+            **self.counters,
+        }
+
+
+scheduler = LLMScheduler(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    interactive_reserve=LLM_INTERACTIVE_RESERVE,
+    model_limits={LLM_TIER_MODELS[tier]: limits for tier, limits in LLM_TIER_LIMITS.items()},
+    max_queue=LLM_MAX_QUEUE,
+    max_queue_per_client=LLM_MAX_QUEUE_PER_CLIENT,
+    queue_timeout=LLM_QUEUE_TIMEOUT,
+    interactive_token_share=LLM_INTERACTIVE_TOKEN_SHARE,
+)
+
+
+def _usage_tokens(message):
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("total_tokens")
+
+
+async def _invoke(chain, inputs, tokens, priority, client, model, flight, guard):
+    waiter = await scheduler.acquire(tokens, priority, client, model, flight)
+    used = None
+
+    async def attempt():
+        try:
+            return await chain.ainvoke(inputs)
+        except Exception as e:
+            scheduler.note_error(e, model)
+            raise
+
+    try:
+        result = await (guard(attempt) if guard is not None else attempt())
+        used = _usage_tokens(result)
+        return result
+    finally:
+        scheduler.release(waiter, used)
+
+
+async def ainvoke(chain, inputs, tokens, model=None, guard=None):
+    """Run `chain.ainvoke(inputs)` once the scheduler admits it. `tokens` is the
+    estimated prompt + completion size, charged against `model`'s TPM budget.
+    `guard(attempt)`, e.g. an upstream's breaker and retries, wraps only the
+    provider request, inside the admitted slot."""
+    return await runtime.run(
+        _invoke(chain, inputs, tokens, current_priority.get(), current_client.get(), model, current_flight.get(), guard)
+    )
+
+
+async def astream(chain, inputs, tokens, model=None):
+    """Like ainvoke, but yields the chain's stream chunks; holds one slot until done."""
+    waiter = await runtime.run(
+        scheduler.acquire(tokens, current_priority.get(), current_client.get(), model, current_flight.get())
+    )
+    used = 0
+    try:
+        async for chunk in chain.astream(inputs):
+            used += _usage_tokens(chunk) or 0
+            yield chunk
+    except Exception as e:
+        runtime.get_loop().call_soon_threadsafe(scheduler.note_error, e, model)
+        raise
+    finally:
+        runtime.get_loop().call_soon_threadsafe(scheduler.release, waiter, used or None)
+
+
+def stats():
+    return scheduler.stats()
+
+
+@metrics.register_collector
+def _collect():
+    counters = dict(scheduler.counters)
+    tokens = counters.pop("tokens", 0)
+    yield ("sixthsense_llm_active", "gauge", "LLM calls currently admitted.", [({}, scheduler.active)])
+    yield (
+        "sixthsense_llm_queued",
+        "gauge",
+        "LLM calls waiting for admission by priority.",
+        [({"priority": name}, scheduler.queued[p]) for p, name in PRIORITY_NAMES.items()],
+    )
+    yield (
+        "sixthsense_llm_scheduler_events_total",
+        "counter",
+        "Scheduler admissions, promotions, rejections, timeouts and provider 429s.",
+        [({"event": event}, n) for event, n in counters.items()],
+    )
+    yield (
+        "sixthsense_llm_scheduler_tokens_total",
+        "counter",
+        "Tokens the provider reported for calls admitted by the scheduler.",
+        [({}, tokens)],
+    )
+    yield (
+        "sixthsense_llm_budget_tokens",
+        "gauge",
+        "Tokens left in each model's per-minute budget (unlimited models are omitted).",
+        [
+            ({"model": model or "-"}, round(budget.tokens.tokens))
+            for model, budget in list(scheduler.budgets.items())
+            if not budget.tokens.unlimited
+        ],
+    )
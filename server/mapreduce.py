@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("mapreduce")
+
+
+async def map_chunks(chunks, map_fn, concurrency=4, deadline=None):
+    """Run `map_fn` over `chunks` with bounded concurrency.
+
+    Returns the successful results in chunk order. If `deadline` (seconds) passes,
+    unfinished chunks are cancelled and whatever finished is returned, as long as
+    at least one chunk is done; otherwise we keep waiting for the first result.
+    Failed chunks are skipped; if every chunk fails, the first error is raised.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index, chunk):
+        async with semaphore:
+            return index, await map_fn(chunk)
+
+    tasks = [asyncio.ensure_future(run(i, chunk)) for i, chunk in enumerate(chunks)]
+    results = {}
+    errors = []
+    started = time.monotonic()
+    pending = set(tasks)
+    try:
+        while pending:
+            timeout = None
+            if deadline and results:
+                timeout = max(0.0, deadline - (time.monotonic() - started))
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.info(f"Map deadline reached with {len(results)}/{len(chunks)} chunks done")
+                break
+            for task in done:
+                try:
+                    index, output = task.result()
+                except Exception as e:
+                    logger.exception("Map step failed")
+                    errors.append(e)
+                    continue
+                if output:
+                    results[index] = output
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    if not results and errors:
+        # Nothing usable: surface the failure instead of an empty result
+        raise errors[0]
+    return [results[i] for i in sorted(results)]
+
+
+async def reduce_tree(parts, reduce_fn, fanin=4):
+    """Merge `parts` with `reduce_fn` in groups of `fanin`, level by level, until one remains."""
+    parts = [p for p in parts if p]
+    fanin = max(2, fanin)
+    while len(parts) > 1:
+        groups = [parts[i:i + fanin] for i in range(0, len(parts), fanin)]
+        merged = await asyncio.gather(*[
+            reduce_fn(group) if len(group) > 1 else _identity(group[0])
+            for group in groups
+        ])
+        # Keep the originals of any group whose merge failed rather than losing them
+        next_parts = []
+        for group, output in zip(groups, merged):
+            if output:
+                next_parts.append(output)
+            else:
+                next_parts.append("\n\n".join(group))
+        parts = next_parts
+    return parts[0] if parts else None
+
+
+async def _identity(value):
+    return value
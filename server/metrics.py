@@ -0,0 +1,184 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+import runtime
+
+logger = logging.getLogger("metrics")
+
+# Route pattern of the request work is done for (set per request in app.py;
+# background work names itself). Follows the work onto the runtime loop.
+current_endpoint = runtime.propagate(ContextVar("metrics_endpoint", default="background"))
+
+# Seconds; spans cache hits through long comparator calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+_metrics = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = (("le", _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class StageHistogram(Histogram):
+    """Histogram whose `endpoint` label defaults to `current_endpoint`, so
+    stages deep in the pipeline are attributed to the request that ran them."""
+
+    def observe(self, value, **labels):
+        labels.setdefault("endpoint", current_endpoint.get())
+        super().observe(value, **labels)
+
+
+def register_collector(fn):
+    """Register `fn()` to be called at scrape time; it yields (name, type, help, samples)
+    where samples is a list of (labels dict, value). Keeps bookkeeping that modules
+    already do (cache stats, queue depths) off the request path."""
+    _collectors.append(fn)
+    return fn
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = list(collector())
+        except Exception:
+            logger.exception("Metrics collector failed")
+            continue
+        for name, metric_type, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Metrics shared across modules ---------------------------------------------
+
+request_seconds = Histogram(
+    "sixthsense_request_seconds",
+    "HTTP request latency by endpoint.",
+    ("endpoint", "method", "status"),
+)
+stage_seconds = StageHistogram(
+    "sixthsense_stage_seconds",
+    "Latency of pipeline stages (serpapi, page_fetch, html_extract, ...) by the endpoint they ran for.",
+    ("endpoint", "stage"),
+)
+llm_seconds = Histogram(
+    "sixthsense_llm_seconds",
+    "LLM call latency by task and model, including scheduler queueing.",
+    ("task", "model"),
+)
+llm_tokens = Counter(
+    "sixthsense_llm_tokens_total",
+    "LLM tokens reported by the provider.",
+    ("task", "model", "direction"),
+)
+upstream_requests = Counter(
+    "sixthsense_upstream_requests_total",
+    "Calls to upstream services by outcome.",
+    ("upstream", "outcome"),
+)
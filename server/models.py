@@ -0,0 +1,212 @@
+import logging
+import time
+from collections import defaultdict
+import llm_scheduler
+import metrics
+import resilience
+from llm_scheduler import LLMOverloaded
+from settings import (
+    LLM_TIER_MODELS,
+    LLM_TASK_TIERS,
+    LLM_FALLBACK_TIER,
+    LLM_MAX_RETRIES,
+    HEDGE_UPSTREAMS,
+)
+
+logger = logging.getLogger("models")
+
+_clients = {}
+_upstreams = {}
+
+# (task, model) -> {"calls", "fallbacks", "failures", "latency_ms", "input_tokens", "output_tokens"}
+usage = defaultdict(lambda: defaultdict(float))
+
+fallbacks = metrics.Counter(
+    "sixthsense_llm_fallbacks_total",
+    "LLM calls re-run on the fallback tier, by task, the tier they left and why.",
+    ("task", "tier", "reason"),
+)
+
+
+def tier_for(task):
+    return LLM_TASK_TIERS.get(task, LLM_FALLBACK_TIER)
+
+
+def model_for(task):
+    return LLM_TIER_MODELS[tier_for(task)]
+
+
+def get_llm(tier):
+    """Chat model for `tier`, built on first use and shared afterwards."""
+    llm = _clients.get(tier)
+    if llm is None:
+        # Imported here: langchain_groq alone costs ~0.5s of worker start-up
+        from langchain_groq import ChatGroq
+        llm = ChatGroq(
+            model=LLM_TIER_MODELS[tier],
+            temperature=0,
+            max_tokens=None,
+            timeout=60,
+            # Retries go through the upstream's retry budget instead
+            max_retries=0,
+        )
+        _clients[tier] = llm
+    return llm
+
+
+def upstream(tier):
+    """Breaker and retry policy for the model behind `tier`; one per model, so one can fail over to another."""
+    model = LLM_TIER_MODELS[tier]
+    up = _upstreams.get(model)
+    if up is None:
+        up = _upstreams[model] = resilience.Upstream(
+            f"groq/{model}",
+            max_retries=LLM_MAX_RETRIES,
+            hedge="groq" in HEDGE_UPSTREAMS,
+            # Our own scheduler shedding load says nothing about the provider's health
+            ignore=(LLMOverloaded,),
+        )
+    return up
+
+
+# Created up front so every model's breaker is exported from the start
+for _tier in LLM_TIER_MODELS:
+    upstream(_tier)
+
+
+def _chain(tier, template, inputs):
+    from langchain_core.prompts import PromptTemplate
+    prompt = PromptTemplate(input_variables=list(inputs), template=template)
+    return prompt | get_llm(tier)
+
+
+def warm_up():
+    """Import LangChain and build the client for every configured tier.
+
+    Blocking; call from a thread. Without it this happens on the first LLM call.
+    """
+    from langchain_core.prompts import PromptTemplate  # noqa: F401
+    for tier in set(LLM_TASK_TIERS.values()) | {LLM_FALLBACK_TIER}:
+        get_llm(tier)
+
+
+def _record(task, tier, started, message=None, failed=False, fallback=None):
+    """Account one call. `fallback` is (original tier, reason) for a call re-run on the fallback tier."""
+    model = LLM_TIER_MODELS[tier]
+    elapsed = time.perf_counter() - started
+    stats = usage[(task, model)]
+    stats["calls"] += 1
+    stats["latency_ms"] += elapsed * 1000
+    if failed:
+        stats["failures"] += 1
+    meta = getattr(message, "usage_metadata", None) or {}
+    stats["input_tokens"] += meta.get("input_tokens", 0)
+    stats["output_tokens"] += meta.get("output_tokens", 0)
+
+    if fallback is not None:
+        from_tier, reason = fallback
+        usage[(task, LLM_TIER_MODELS[from_tier])]["fallbacks"] += 1
+        fallbacks.inc(task=task, tier=from_tier, reason=reason)
+
+    metrics.llm_seconds.observe(elapsed, task=task, model=model)
+    metrics.upstream_requests.inc(upstream="groq", outcome="error" if failed else "ok")
+    for direction in ("input", "output"):
+        if meta.get(f"{direction}_tokens"):
+            metrics.llm_tokens.inc(meta[f"{direction}_tokens"], task=task, model=model, direction=direction)
+
+
+def _overloaded(e):
+    return LLMOverloaded(str(e), status=503, retry_after=e.retry_after)
+
+
+async def _invoke_tier(task, tier, template, inputs, tokens, fallback=None):
+    chain = _chain(tier, template, inputs)
+    up = upstream(tier)
+    started = time.perf_counter()
+    try:
+        # Don't queue for a tier that is down; the breaker, retries and hedging
+        # themselves apply after admission, so queueing doesn't count as latency
+        up.precheck()
+        result = await llm_scheduler.ainvoke(chain, inputs, tokens, LLM_TIER_MODELS[tier], guard=up.call)
+    except resilience.CircuitOpen:
+        raise
+    except Exception:
+        _record(task, tier, started, failed=True, fallback=fallback)
+        raise
+    _record(task, tier, started, result, fallback=fallback)
+    return result
+
+
+async def ainvoke(task, template, inputs, tokens, validate=None):
+    """Run `template` for `task` on the task's tier.
+
+    If `validate(text)` rejects the output of a smaller tier, or the tier's
+    circuit breaker is open, the call is made on LLM_FALLBACK_TIER instead.
+    When that is unavailable too, LLMOverloaded is raised so the request fails
+    fast with a 503.
+    """
+    tier = tier_for(task)
+    try:
+        result = await _invoke_tier(task, tier, template, inputs, tokens)
+    except resilience.CircuitOpen as e:
+        if tier == LLM_FALLBACK_TIER:
+            raise _overloaded(e) from e
+        logger.info(f"{task}: {e}; using {LLM_FALLBACK_TIER}")
+        try:
+            return await _invoke_tier(
+                task, LLM_FALLBACK_TIER, template, inputs, tokens, fallback=(tier, "circuit_open")
+            )
+        except resilience.CircuitOpen as e:
+            raise _overloaded(e) from e
+    if validate is None or tier == LLM_FALLBACK_TIER:
+        return result
+    if validate(getattr(result, "content", None) or ""):
+        return result
+
+    logger.info(f"{task} output from {LLM_TIER_MODELS[tier]} failed validation; retrying on {LLM_FALLBACK_TIER}")
+    try:
+        return await _invoke_tier(task, LLM_FALLBACK_TIER, template, inputs, tokens, fallback=(tier, "validation"))
+    except resilience.CircuitOpen:
+        # Better the unvalidated answer than none
+        return result
+
+
+async def astream(task, template, inputs, tokens):
+    """Stream `template` for `task` on the task's tier (no fallback: output is already sent)."""
+    tier = tier_for(task)
+    up = upstream(tier)
+    try:
+        up.check()
+    except resilience.CircuitOpen as e:
+        raise _overloaded(e) from e
+    started = time.perf_counter()
+    last = None
+    try:
+        async for chunk in llm_scheduler.astream(_chain(tier, template, inputs), inputs, tokens, LLM_TIER_MODELS[tier]):
+            if getattr(chunk, "usage_metadata", None):
+                last = chunk
+            yield chunk
+    except BaseException as e:
+        # Stream durations say nothing about time-to-answer; keep them out of the hedging threshold
+        up.record(None, e)
+        if isinstance(e, Exception):
+            _record(task, tier, started, failed=True)
+        raise
+    up.record(None)
+    _record(task, tier, started, last)
+
+
+def stats():
+    """Per task and model: calls, fallbacks, failures, mean latency and tokens since the worker started."""
+    report = {}
+    for (task, model), stats in usage.items():
+        calls = stats["calls"] or 1
+        report.setdefault(task, {})[model] = {
+            "calls": int(stats["calls"]),
+            "fallbacks": int(stats["fallbacks"]),
+            "failures": int(stats["failures"]),
+            "avg_latency_ms": round(stats["latency_ms"] / calls, 1),
+            "input_tokens": int(stats["input_tokens"]),
+            "output_tokens": int(stats["output_tokens"]),
+        }
+    return report
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict
+import metrics
+import runtime
+import llm_scheduler
+from services import warm_page
+from settings import (
+    PREFETCH_ENABLED,
+    PREFETCH_TOP_N,
+    PREFETCH_CONCURRENCY,
+    PREFETCH_TOKEN_BUDGET,
+    PREFETCH_SUMMARIZE,
+)
+
+logger = logging.getLogger("prefetch")
+
+# Lifetime counters: scheduled, completed, failed, cancelled, shed, used, tokens
+counters = Counter()
+
+_semaphore = None
+_batches = set()
+# URLs warmed by a prefetch and not yet requested by a user, oldest first
+_prefetched = OrderedDict()
+_MAX_TRACKED = 2048
+
+
+class _Budget:
+    """Token allowance shared by the prefetches of one search."""
+
+    def __init__(self, tokens):
+        self.remaining = tokens
+
+    def reserve(self, tokens):
+        if tokens > self.remaining:
+            return False
+        self.remaining -= tokens
+        counters["tokens"] += tokens
+        return True
+
+
+def _get_semaphore():
+    # Created lazily so it binds to the runtime loop
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+    return _semaphore
+
+
+def _remember(url):
+    _prefetched[url] = time.time()
+    _prefetched.move_to_end(url)
+    while len(_prefetched) > _MAX_TRACKED:
+        _prefetched.popitem(last=False)
+
+
+async def _prefetch_one(url, budget, exhausted, query):
+    async with _get_semaphore():
+        if exhausted.is_set():
+            counters["cancelled"] += 1
+            return
+
+        def reserve(tokens):
+            if budget.reserve(tokens):
+                return True
+            exhausted.set()
+            return False
+
+        try:
+            if await warm_page(url, summarize=PREFETCH_SUMMARIZE, reserve_tokens=reserve, query=query):
+                counters["completed"] += 1
+                _remember(url)
+            elif exhausted.is_set():
+                counters["cancelled"] += 1
+            else:
+                counters["failed"] += 1
+        except asyncio.CancelledError:
+            counters["cancelled"] += 1
+            raise
+        except llm_scheduler.LLMOverloaded:
+            counters["shed"] += 1
+        except Exception:
+            counters["failed"] += 1
+            logger.exception(f"Prefetch failed for {url}")
+
+
+async def _prefetch_batch(urls, query):
+    # Prefetch never competes with users for LLM capacity
+    llm_scheduler.current_priority.set(llm_scheduler.BACKGROUND)
+    metrics.current_endpoint.set("prefetch")
+    budget = _Budget(PREFETCH_TOKEN_BUDGET)
+    exhausted = asyncio.Event()
+    tasks = [asyncio.ensure_future(_prefetch_one(url, budget, exhausted, query)) for url in urls]
+    stopper = asyncio.ensure_future(exhausted.wait())
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending | {stopper}, return_when=asyncio.FIRST_COMPLETED)
+            pending.discard(stopper)
+            if stopper in done:
+                # Budget spent: drop whatever is still queued or running
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                logger.info("Prefetch token budget exhausted; cancelled remaining work")
+                break
+    finally:
+        stopper.cancel()
+
+
+def schedule(urls, query=None):
+    """Warm the caches for the top search result links in the background,
+    with summaries focused on the search `query` as the result cards ask for them."""
+    if not PREFETCH_ENABLED or PREFETCH_TOP_N <= 0:
+        return
+    urls = [u for u in dict.fromkeys(urls) if u][:PREFETCH_TOP_N]
+    if not urls:
+        return
+    counters["scheduled"] += len(urls)
+    future = runtime.submit(_prefetch_batch(urls, query))
+    _batches.add(future)
+    future.add_done_callback(_batches.discard)
+
+
+def note_request(url):
+    """Record that a user asked for `url`; counts as a hit if we prefetched it."""
+    if url and _prefetched.pop(url, None) is not None:
+        counters["used"] += 1
+
+
+def stats():
+    return dict(counters)
+
+
+@metrics.register_collector
+def _collect():
+    snapshot = dict(counters)
+    tokens = snapshot.pop("tokens", 0)
+    yield (
+        "sixthsense_prefetch_total",
+        "counter",
+        "Prefetched URLs by outcome.",
+        [({"outcome": outcome}, n) for outcome, n in snapshot.items()],
+    )
+    yield ("sixthsense_prefetch_tokens_total", "counter", "LLM tokens reserved by prefetch.", [({}, tokens)])
@@ -132,3 +132,69 @@ The absence of photosynthesis would lead to the collapse of ecosystems. ]
 
 Paragraph: {paragraph}"""
 
+
+merge_prompt = """
+You are given several cleaned excerpts taken, in order, from different parts of the same webpage.
+Merge them into a single clean, organized version of the page's main content:
+
+- Keep the original order of topics and the logical flow
+- Remove repetition between excerpts
+- Preserve technical accuracy, code examples, key data and statistics
+- Keep the length under 1000 words
+- Write in clear, professional language
+
+Excerpts:
+{content}
+
+Merged Content:
+"""
+
+
+site_analysis_prompt = """
+You are a professional website analyzer. Analyze the single website below on its own and extract its main characteristics.
+
+### Guidelines:
+- Focus on the **Key Points**, **Strengths**, **Limitations** and **Content Structure**.
+- Use concise yet informative statements grounded in the content.
+- Format the output **strictly** as valid JSON.
+
+### Website:
+{content}
+
+### **Provide the analysis in the following JSON format exactly and strictly:**
+
+{{
+    "key_points": ["Summarized key point 1", "Summarized key point 2",....],
+    "strengths": ["Notable strength 1", "Notable strength 2",....],
+    "limitations": ["Limitation 1", "Limitation 2",....],
+    "content_structure": {{
+        "introduction": "Brief summary of introduction",
+        "mainContent": "Brief summary of main content",
+        "conclusion": "Brief summary of conclusion"
+    }}
+}}
+
+Return only valid JSON without any extra explanations or formatting errors.
+"""
+
+multi_compare_prompt = """
+You are a professional website analyzer. Below are structured analyses of several websites, keyed by site id (site1, site2, ...).
+Compare the websites with each other using only these analyses.
+
+### Analyses:
+{content}
+
+### **Provide the comparison in the following JSON format exactly and strictly, with one entry per site id:**
+
+{{
+    "unique_features": {{
+        "site1": ["Feature only this site offers", ....],
+        "site2": ["Feature only this site offers", ....]
+    }},
+    "similarities": ["What the sites have in common", ....],
+    "differences": ["How the sites differ", ....],
+    "summary": "Two or three sentences on which site suits which reader"
+}}
+
+Return only valid JSON without any extra explanations or formatting errors.
+"""
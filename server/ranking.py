@@ -0,0 +1,218 @@
+"""Pick the parts of a page worth sending to the LLM.
+
+Page text is split into passages of about RANK_PASSAGE_CHARS along line and
+sentence boundaries. Repeated lines and passages are dropped. With a query,
+so are short lines that are mostly boilerplate (share and subscribe prompts,
+"skip to content", copyright notices), and the remaining passages are scored with BM25 against it and the best
+ones are packed into a token budget, then put back in page order so the LLM
+still reads them in context.
+
+Scoring runs as a few NumPy operations over the whole page, not a Python loop
+per passage and term.
+"""
+import itertools
+import logging
+import re
+import metrics
+from settings import RANK_PASSAGE_CHARS
+
+logger = logging.getLogger("ranking")
+
+# BM25 term-frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+# Lines this short are dropped when BOILERPLATE matches at least BOILERPLATE_MIN_SHARE of their
+# letters: "Subscribe to our newsletter" goes, "How to sign up for Medicare" stays
+BOILERPLATE_MAX_WORDS = 12
+BOILERPLATE_MIN_SHARE = 0.6
+# Repeats of lines at least this long are dropped; shorter ones (table cells, "Yes") repeat legitimately
+DUPLICATE_MIN_WORDS = 4
+
+BOILERPLATE = re.compile(
+    r"\b(?:cookies?|privacy policy|terms of (?:use|service)|all rights reserved|copyright|"
+    r"subscribe|newsletter|sign (?:in|up)|log ?in|create an account|share (?:on|this)|"
+    r"follow us|advertisement|sponsored|skip to (?:main )?content|back to top|"
+    r"related (?:articles|posts|stories)|read more|click here|accept all)\b",
+    re.IGNORECASE,
+)
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_NON_WORD = re.compile(r"[\W_]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be best by can do does for from how i in is it its of on or "
+    "the this to vs versus was what when where which who why will with".split()
+)
+
+tokens_total = metrics.Counter(
+    "sixthsense_rank_tokens_total",
+    "Estimated page tokens by passage selection outcome (kept, boilerplate, duplicate, over_budget).",
+    ("outcome",),
+)
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text; good enough for budgeting
+    return len(text) // 4 + 1 if text else 0
+
+
+def _fingerprint(text):
+    """Case and punctuation folded, so trivially different copies compare equal."""
+    return _NON_WORD.sub(" ", text.casefold()).strip()
+
+
+def _split_long(line, size):
+    """Break an over-long line at sentence ends (or hard, failing that) into pieces of about `size`."""
+    pieces, current = [], ""
+    for sentence in _SENTENCE_END.split(line):
+        while len(sentence) > size:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:size])
+            sentence = sentence[size:]
+        if current and len(current) + len(sentence) + 1 > size:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def is_boilerplate(line):
+    """True for a short line that is mostly site chrome rather than content."""
+    if len(line.split()) > BOILERPLATE_MAX_WORDS:
+        return False
+    matched = sum(len(_NON_WORD.sub("", m.group())) for m in BOILERPLATE.finditer(line))
+    return matched > 0 and matched >= BOILERPLATE_MIN_SHARE * len(_NON_WORD.sub("", line))
+
+
+def clean_lines(text, drop_boilerplate=True):
+    """Page lines without repeated lines (and boilerplate, if `drop_boilerplate`),
+    and the tokens each kind of drop saved."""
+    lines, seen = [], set()
+    dropped = {"boilerplate": 0, "duplicate": 0}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        words = len(line.split())
+        if drop_boilerplate and is_boilerplate(line):
+            dropped["boilerplate"] += estimate_tokens(line)
+            continue
+        if words >= DUPLICATE_MIN_WORDS:
+            fingerprint = _fingerprint(line)
+            if fingerprint in seen:
+                dropped["duplicate"] += estimate_tokens(line)
+                continue
+            seen.add(fingerprint)
+        lines.append(line)
+    return lines, dropped
+
+
+def split_passages(lines, size=RANK_PASSAGE_CHARS):
+    """Group consecutive lines into passages of about `size` characters."""
+    passages, current, length = [], [], 0
+    for line in lines:
+        for piece in ([line] if len(line) <= size else _split_long(line, size)):
+            if current and length + len(piece) > size:
+                passages.append("\n".join(current))
+                current, length = [], 0
+            current.append(piece)
+            length += len(piece) + 1
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+
+def _query_terms(query):
+    terms = list(dict.fromkeys(_WORD.findall(query.casefold())))
+    # A query of nothing but stopwords still has to match something
+    return [t for t in terms if t not in STOPWORDS] or terms
+
+
+def bm25(passages, query):
+    """BM25 score of every passage against `query`, as a NumPy array."""
+    # Deferred: NumPy adds ~80ms to worker start-up
+    import numpy as np
+
+    terms = _query_terms(query)
+    scores = np.zeros(len(passages))
+    if not terms or not passages:
+        return scores
+    tokens = [_WORD.findall(p.casefold()) for p in passages]
+    lengths = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+    if not lengths.sum():
+        return scores
+    # Page words as query-term ids (-1: not a query term). Integer ids, not a
+    # unicode array, so one very long token can't blow up the array's width
+    term_ids = {term: i for i, term in enumerate(terms)}
+    ids = np.fromiter(
+        (term_ids.get(word, -1) for word in itertools.chain.from_iterable(tokens)),
+        dtype=np.int64,
+        count=int(lengths.sum()),
+    )
+    doc = np.repeat(np.arange(len(passages)), lengths)
+
+    hit = ids >= 0
+    n_docs, n_terms = len(passages), len(terms)
+    tf = np.bincount(
+        doc[hit] * n_terms + ids[hit], minlength=n_docs * n_terms
+    ).reshape(n_docs, n_terms).astype(np.float64)
+
+    df = (tf > 0).sum(axis=0)
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+    norm = K1 * (1 - B + B * lengths / lengths.mean())
+    return (idf * tf * (K1 + 1) / (tf + norm[:, None])).sum(axis=1)
+
+
+def pack(passages, scores, budget):
+    """Indexes of the passages to keep, in page order: highest scores first while
+    they fit `budget` tokens, earlier passages winning ties. The first passage
+    (usually the title and lede) is kept whenever it fits."""
+    import numpy as np
+
+    costs = [estimate_tokens(p) for p in passages]
+    ranked = np.lexsort((np.arange(len(passages)), -np.asarray(scores)))
+    chosen, spent = [], 0
+    for i in [0, *(int(i) for i in ranked if i != 0)]:
+        if spent + costs[i] > budget:
+            continue
+        chosen.append(i)
+        spent += costs[i]
+    return sorted(chosen)
+
+
+def select(text, query=None, budget=None):
+    """The text worth summarizing from `text`.
+
+    Duplicates are always removed. With a `query`, so is boilerplate, and with
+    a token `budget` too only the passages that best match the query and fit
+    the budget are kept. Blocking (CPU-bound on big pages); call from a thread.
+    """
+    lines, dropped = clean_lines(text or "", drop_boilerplate=bool(query))
+    for outcome, tokens in dropped.items():
+        tokens_total.inc(tokens, outcome=outcome)
+    passages = split_passages(lines)
+
+    unique, seen = [], set()
+    for passage in passages:
+        fingerprint = _fingerprint(passage)
+        if fingerprint in seen:
+            tokens_total.inc(estimate_tokens(passage), outcome="duplicate")
+            continue
+        seen.add(fingerprint)
+        unique.append(passage)
+    passages = unique
+
+    if query and budget and sum(estimate_tokens(p) for p in passages) > budget:
+        keep = set(pack(passages, bm25(passages, query), budget))
+        over = [p for i, p in enumerate(passages) if i not in keep]
+        tokens_total.inc(sum(estimate_tokens(p) for p in over), outcome="over_budget")
+        logger.info(f"Kept {len(keep)}/{len(passages)} passages for query {query!r}")
+        passages = [p for i, p in enumerate(passages) if i in keep]
+
+    selected = "\n\n".join(passages)
+    tokens_total.inc(estimate_tokens(selected), outcome="kept")
+    return selected
@@ -0,0 +1,223 @@
+"""Shared storage for Flask-Limiter counters.
+
+Importing this module registers two storage schemes with `limits`:
+
+- ``sqlite:///path/to/file.db``: fixed-window counters in a SQLite file, shared
+  by every worker process on one host.
+- ``batched+<scheme>://...``: wraps any other storage (``batched+sqlite``,
+  ``batched+redis``, ...) and reserves tokens from it in batches, so most hits
+  are counted locally without a round trip.
+
+For a cluster use the built-in ``redis://`` storage (any Redis-protocol server:
+Redis, Valkey, KeyDB, ...), which needs the `redis` package.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from limits.storage import Storage, storage_from_string
+from settings import (
+    RATELIMIT_STORAGE_URI,
+    RATELIMIT_BATCH,
+    RATELIMIT_COSTS,
+)
+
+logger = logging.getLogger("ratelimit")
+
+# Expired rows are purged every this many increments
+_PURGE_EVERY = 1000
+# Local reservations are pruned once there are more than this many keys
+_MAX_RESERVATIONS = 10000
+
+
+class SQLiteStorage(Storage):
+    """Fixed-window counters in one SQLite table.
+
+    Each increment is a single upsert, so it is atomic across processes without
+    an explicit transaction. Connections are opened per process on first use,
+    which keeps the storage safe to create before gunicorn forks.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        # Same convention as the cache backends: sqlite:///relative.db, sqlite:////absolute.db
+        self.path = uri[len("sqlite:///"):]
+        self.table = "ratelimit"
+        self._local = threading.local()
+        self._pid = None
+        self._increments = 0
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._local = threading.local()
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        conn = self._conn()
+        # A window that has expired starts over at `amount`
+        count = conn.execute(
+            f"INSERT INTO {self.table} (key, count, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END, "
+            "expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END "
+            "RETURNING count",
+            (key, amount, now + expiry, now, now),
+        ).fetchone()[0]
+        self._increments += 1
+        if self._increments % _PURGE_EVERY == 0:
+            conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+        return count
+
+    def get(self, key):
+        row = self._conn().execute(
+            f"SELECT count FROM {self.table} WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._conn().execute(
+            f"SELECT expires_at FROM {self.table} WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self):
+        try:
+            self._conn().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._conn().execute(f"DELETE FROM {self.table}").rowcount
+
+    def clear(self, key):
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+
+def _limit_amount(key):
+    """The limit's amount from a `limits` key ("LIMITER/.../<amount>/<multiples>/<granularity>")."""
+    try:
+        return int(key.split("/")[-3])
+    except (IndexError, ValueError):
+        return None
+
+
+class _Reservation:
+    __slots__ = ("next", "last", "window_end")
+
+    def __init__(self, next, last, window_end):
+        self.next = next
+        self.last = last
+        self.window_end = window_end
+
+
+class BatchedStorage(Storage):
+    """Counts hits locally against tokens reserved from a shared storage.
+
+    When a key's local tokens run out, `batch_size` more are taken with one
+    increment of the shared counter. Up to a tenth of the limit is reserved at
+    a time (at most RATELIMIT_BATCH), so a worker can over-reserve by no more
+    than that: limits are enforced slightly early, never late. Small limits
+    (under 20) are not batched.
+    """
+
+    STORAGE_SCHEME = [
+        f"batched+{scheme}"
+        for scheme in (
+            "sqlite", "memory", "memcached",
+            "redis", "rediss", "redis+unix", "redis+cluster", "redis+sentinel",
+            "valkey", "valkeys", "valkey+unix", "valkey+cluster", "valkey+sentinel",
+        )
+    ]
+
+    def __init__(self, uri=None, wrap_exceptions=False, batch=RATELIMIT_BATCH, **options):
+        self.inner = storage_from_string(uri[len("batched+"):], wrap_exceptions=wrap_exceptions, **options)
+        self.batch = batch
+        self._reserved = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return self.inner.base_exceptions
+
+    def batch_size(self, key):
+        amount = _limit_amount(key)
+        if amount is None:
+            return 1
+        return max(1, min(self.batch, amount // 10))
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the parent's reservations aren't ours to spend
+                self._pid = os.getpid()
+                self._reserved.clear()
+            reservation = self._reserved.get(key)
+            if reservation is not None and reservation.window_end > now and reservation.next + amount - 1 <= reservation.last:
+                position = reservation.next + amount - 1
+                reservation.next += amount
+                return position
+
+        size = max(amount, self.batch_size(key))
+        count = self.inner.incr(key, expiry, amount=size)
+        if size > amount:
+            window_end = min(self.inner.get_expiry(key), now + expiry)
+            with self._lock:
+                if len(self._reserved) >= _MAX_RESERVATIONS:
+                    self._reserved = {k: r for k, r in self._reserved.items() if r.window_end > now}
+                self._reserved[key] = _Reservation(count - size + amount + 1, count, window_end)
+        return count - size + amount
+
+    def get(self, key):
+        return self.inner.get(key)
+
+    def get_expiry(self, key):
+        return self.inner.get_expiry(key)
+
+    def check(self):
+        return self.inner.check()
+
+    def reset(self):
+        with self._lock:
+            self._reserved.clear()
+        return self.inner.reset()
+
+    def clear(self, key):
+        with self._lock:
+            self._reserved.pop(key, None)
+        self.inner.clear(key)
+
+
+def storage_uri(uri=RATELIMIT_STORAGE_URI, batch=RATELIMIT_BATCH):
+    """The Flask-Limiter storage URI, wrapped for batching unless counters are in-process anyway."""
+    if batch > 1 and not uri.startswith(("memory:", "batched+")):
+        return "batched+" + uri
+    return uri
+
+
+def cost(rule):
+    """Quota units one request to the route `rule` (e.g. "/compare-results") spends."""
+    return RATELIMIT_COSTS.get(rule.strip("/"), 1)
@@ -0,0 +1,314 @@
+import asyncio
+import aiohttp
+import logging
+import random
+import threading
+import time
+from collections import Counter, deque
+import metrics
+from settings import (
+    BREAKER_FAILURES,
+    BREAKER_RESET,
+    RETRY_BUDGET_RATIO,
+    RETRY_BUDGET_MIN,
+    RETRY_BACKOFF,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_DELAY,
+)
+
+logger = logging.getLogger("resilience")
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Latency samples needed before hedging kicks in
+HEDGE_MIN_SAMPLES = 20
+
+upstreams = {}
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def error_status(exc):
+    """HTTP status carried by an aiohttp or SDK error, if any."""
+    return getattr(exc, "status_code", None) or getattr(exc, "status", None)
+
+
+def is_transient(exc):
+    """Timeouts, connection errors, 429 and 5xx are worth retrying; other errors are the request's fault."""
+    status = error_status(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(exc, (asyncio.TimeoutError, OSError, aiohttp.ClientError)):
+        return True
+    # SDK errors (e.g. groq.APITimeoutError, APIConnectionError) carry no status
+    name = type(exc).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def is_upstream_fault(exc):
+    """Errors that count against a breaker: transient ones except 429, which means we're busy, not that it's down."""
+    return is_transient(exc) and error_status(exc) != 429
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker.
+
+    After `failures` upstream faults in a row the breaker opens and calls fail
+    fast with CircuitOpen for `reset_timeout` seconds. Then one probe call is
+    let through (half-open): success closes the breaker, failure reopens it.
+    """
+
+    def __init__(self, name, failures=5, reset_timeout=30.0):
+        self.name = name
+        self.threshold = failures
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.transitions = Counter()
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        if state != self.state:
+            logger.warning(f"{self.name} circuit {self.state} -> {state}")
+            self.state = state
+            self.transitions[state] += 1
+
+    def retry_after(self):
+        return max(1.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def current_state(self):
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self.state
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go ahead now."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpen(f"{self.name} is unavailable; failing fast", self.retry_after())
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpen(f"{self.name} is recovering; failing fast", self.reset_timeout)
+                self._probing = True
+
+    def on_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._set_state(CLOSED)
+
+    def on_failure(self, exc):
+        """Count `exc` if it is the upstream's fault; None just ends a probe."""
+        with self._lock:
+            self._probing = False
+            if exc is None or not is_upstream_fault(exc):
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+
+class RetryBudget:
+    """Retries (and hedges) allowed: `ratio` of the calls in the last `window`
+    seconds, plus `minimum`. Keeps a struggling upstream from being hit by a
+    retry storm on top of its normal load."""
+
+    def __init__(self, ratio=0.2, minimum=3, window=10.0):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+        self._calls = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        for events in (self._calls, self._retries):
+            while events and events[0] < now - self.window:
+                events.popleft()
+
+    def record_call(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._calls.append(now)
+
+    def try_spend(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= self.minimum + self.ratio * len(self._calls):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for the hedging threshold."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+
+    def observe(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, q):
+        if len(self._samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+class Upstream:
+    """Breaker, retry budget and optional hedging around calls to one upstream.
+
+    `call(attempt)` runs `attempt()` (a coroutine factory). Transient failures
+    are retried up to `max_retries` times with jittered backoff while the retry
+    budget allows. With hedging on, a second attempt is started once the first
+    has taken longer than the recent `HEDGE_PERCENTILE` latency, and whichever
+    finishes first wins. Exceptions in `ignore` (our own load shedding) pass
+    straight through without touching the breaker.
+    """
+
+    def __init__(self, name, max_retries=1, hedge=False, ignore=()):
+        self.name = name
+        self.max_retries = max_retries
+        self.ignore = ignore
+        self.hedge = hedge
+        self.breaker = CircuitBreaker(name, failures=BREAKER_FAILURES, reset_timeout=BREAKER_RESET)
+        self.budget = RetryBudget(ratio=RETRY_BUDGET_RATIO, minimum=RETRY_BUDGET_MIN)
+        self.latency = LatencyTracker()
+        self.counters = Counter()
+        upstreams[name] = self
+
+    def precheck(self):
+        """Fail fast if the breaker is open, without taking the half-open probe;
+        for callers that queue (e.g. for LLM capacity) before `call`."""
+        if self.breaker.current_state() == OPEN:
+            self.check()
+
+    def check(self):
+        """Fail fast if the breaker is open. For calls that can't go through `call` (streams)."""
+        try:
+            self.breaker.before_call()
+        except CircuitOpen:
+            self.counters["short_circuited"] += 1
+            raise
+
+    def record(self, started, exc=None):
+        """Report an outcome to the breaker; `started` (monotonic) feeds the hedging threshold, None skips it."""
+        if exc is None:
+            if started is not None:
+                self.latency.observe(time.monotonic() - started)
+            self.breaker.on_success()
+        elif isinstance(exc, self.ignore) or not isinstance(exc, Exception):
+            # Not the upstream's doing (shed locally, or cancelled); just free a half-open probe
+            self.breaker.on_failure(None)
+        else:
+            self.breaker.on_failure(exc)
+
+    async def call(self, attempt):
+        self.check()
+        self.budget.record_call()
+        retries = 0
+        while True:
+            started = time.monotonic()
+            try:
+                result = await self._attempt(attempt)
+            except BaseException as e:
+                self.record(started, e)
+                if isinstance(e, self.ignore) or not isinstance(e, Exception):
+                    raise
+                if not is_transient(e) or retries >= self.max_retries:
+                    raise
+                if not self.budget.try_spend():
+                    self.counters["retries_denied"] += 1
+                    raise
+                retries += 1
+                self.counters["retries"] += 1
+                await asyncio.sleep(RETRY_BACKOFF * (2 ** (retries - 1)) * random.uniform(0.5, 1.5))
+                # The breaker may have opened while we slept
+                self.check()
+                continue
+            self.record(started)
+            return result
+
+    async def _attempt(self, attempt):
+        delay = self.latency.percentile(HEDGE_PERCENTILE) if self.hedge else None
+        if delay is None:
+            return await attempt()
+
+        first = asyncio.ensure_future(attempt())
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=max(delay, HEDGE_MIN_DELAY))
+            if done or not self.budget.try_spend():
+                return await first
+
+            self.counters["hedges"] += 1
+            second = asyncio.ensure_future(attempt())
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                if winners:
+                    if winners[0] is second:
+                        self.counters["hedge_wins"] += 1
+                    return winners[0].result()
+                if not pending:
+                    # Both failed: report the original attempt's error
+                    raise first.exception()
+        finally:
+            # Also reached when our caller is cancelled mid-wait
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        return {
+            "state": self.breaker.current_state(),
+            "consecutive_failures": self.breaker.failures,
+            "hedging": self.hedge,
+            "hedge_after_ms": None if not self.hedge or self.latency.percentile(HEDGE_PERCENTILE) is None
+            else round(max(self.latency.percentile(HEDGE_PERCENTILE), HEDGE_MIN_DELAY) * 1000),
+            **self.counters,
+        }
+
+
+def stats():
+    return {name: upstream.stats() for name, upstream in upstreams.items()}
+
+
+@metrics.register_collector
+def _collect():
+    yield (
+        "sixthsense_breaker_state",
+        "gauge",
+        "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open).",
+        [({"upstream": name}, STATE_VALUES[u.breaker.current_state()]) for name, u in upstreams.items()],
+    )
+    yield (
+        "sixthsense_breaker_transitions_total",
+        "counter",
+        "Circuit breaker state changes per upstream.",
+        [({"upstream": name, "state": state}, n) for name, u in upstreams.items() for state, n in u.breaker.transitions.items()],
+    )
+    yield (
+        "sixthsense_resilience_events_total",
+        "counter",
+        "Retries, retries denied by the budget, hedges, hedge wins, short-circuited calls and stale fallbacks.",
+        [({"upstream": name, "event": event}, n) for name, u in upstreams.items() for event, n in u.counters.items()],
+    )
@@ -0,0 +1,161 @@
+import asyncio
+import atexit
+import concurrent.futures
+import contextvars
+import logging
+import sys
+import threading
+
+# run_in_context needs loop.create_task(..., context=...), added in 3.11
+if sys.version_info < (3, 11):
+    raise RuntimeError("SixthSense's server needs Python 3.11 or newer")
+
+logger = logging.getLogger("runtime")
+
+# A single long-lived event loop per worker process. Async views, outbound
+# connections, shared futures and background work all run on it, so anything
+# pooled survives across requests.
+_loop = None
+_thread = None
+_lock = threading.Lock()
+_startup_hooks = []
+_shutdown_hooks = []
+# Context variables whose values follow a coroutine onto the runtime loop
+_propagated = []
+
+
+def _run_loop(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def start():
+    """Start the background loop if it is not running yet and return it."""
+    global _loop, _thread
+    with _lock:
+        if _loop is not None and _thread is not None and _thread.is_alive():
+            return _loop
+        _loop = asyncio.new_event_loop()
+        _thread = threading.Thread(target=_run_loop, args=(_loop,), name="runtime-loop", daemon=True)
+        _thread.start()
+        logger.info("Runtime event loop started")
+        loop = _loop
+    for hook in _startup_hooks:
+        asyncio.run_coroutine_threadsafe(_run_hook(hook), loop)
+    return loop
+
+
+async def _run_hook(hook):
+    try:
+        await hook()
+    except Exception:
+        logger.exception("Runtime hook failed")
+
+
+def get_loop():
+    return start()
+
+
+def on_startup(hook):
+    """Register an async callable to run on the runtime loop once it starts."""
+    _startup_hooks.append(hook)
+    if _loop is not None:
+        asyncio.run_coroutine_threadsafe(_run_hook(hook), _loop)
+    return hook
+
+
+def on_shutdown(hook):
+    """Register an async callable to run on the runtime loop at shutdown."""
+    _shutdown_hooks.append(hook)
+    return hook
+
+
+def propagate(var: contextvars.ContextVar):
+    """Carry `var`'s current value along whenever work is handed to the runtime loop."""
+    _propagated.append(var)
+    return var
+
+
+async def _with_context(coro, values):
+    for var, value in values:
+        var.set(value)
+    return await coro
+
+
+def submit(coro):
+    """Schedule `coro` on the runtime loop from any thread; returns a concurrent Future."""
+    values = []
+    for var in _propagated:
+        try:
+            values.append((var, var.get()))
+        except LookupError:
+            pass
+    return asyncio.run_coroutine_threadsafe(_with_context(coro, values), get_loop())
+
+
+async def run(coro):
+    """Await `coro` on the runtime loop from any event loop."""
+    loop = get_loop()
+    try:
+        current = asyncio.get_running_loop()
+    except RuntimeError:
+        current = None
+    if current is loop:
+        return await coro
+    return await asyncio.wrap_future(submit(coro))
+
+
+def run_sync(coro, timeout=None):
+    """Block the calling (non-loop) thread until `coro` finishes on the runtime loop."""
+    return submit(coro).result(timeout)
+
+
+def run_in_context(coro, context=None):
+    """Run `coro` on the runtime loop inside `context` (default: a copy of the
+    caller's) and block until it finishes. Used to serve async views, which
+    need Flask's request context."""
+    loop = get_loop()
+    context = context if context is not None else contextvars.copy_context()
+    result = concurrent.futures.Future()
+
+    def _start():
+        task = loop.create_task(coro, context=context)
+
+        def _done(t):
+            if t.cancelled():
+                result.cancel()
+            elif t.exception() is not None:
+                result.set_exception(t.exception())
+            else:
+                result.set_result(t.result())
+
+        task.add_done_callback(_done)
+
+    loop.call_soon_threadsafe(_start)
+    return result.result()
+
+
+def shutdown(timeout=10):
+    global _loop, _thread
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop, _thread = None, None
+    if loop is None:
+        return
+
+    async def _close():
+        for hook in reversed(_shutdown_hooks):
+            await _run_hook(hook)
+
+    try:
+        asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout)
+    except Exception:
+        logger.exception("Runtime shutdown did not complete cleanly")
+    loop.call_soon_threadsafe(loop.stop)
+    if thread is not None:
+        thread.join(timeout)
+    loop.close()
+    logger.info("Runtime event loop stopped")
+
+
+atexit.register(shutdown)
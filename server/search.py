@@ -1,66 +1,139 @@
-import aiohttp
-import pandas as pd
 import logging
-from settings import SERPAPI_KEY
+import time
+import unicodedata
+import http_client
+import metrics
+import resilience
+import singleflight
+from cache import TTLCache
+from settings import (
+    SERPAPI_KEY,
+    SERPAPI_URL,
+    SEARCH_GL,
+    SEARCH_HL,
+    SEARCH_CACHE_BACKEND,
+    SEARCH_CACHE_TTL,
+    SEARCH_CACHE_SIZE,
+    SEARCH_STALE_TTL,
+    SERPAPI_MAX_RETRIES,
+    HEDGE_UPSTREAMS,
+)
 
 logger = logging.getLogger("search")
 
-async def search_api(query, max_results=10):
+COLUMNS = ("link", "rank", "snippet", "title")
+
+
+class SearchResult:
+    """One organic search result. Serializes to the same record shape the API has always returned."""
+
+    __slots__ = COLUMNS
+
+    def __init__(self, link=None, rank=None, snippet=None, title=None):
+        self.link = link
+        self.rank = rank
+        self.snippet = snippet
+        self.title = title
+
+    def to_dict(self):
+        return {"link": self.link, "rank": self.rank, "snippet": self.snippet, "title": self.title}
+
+    def __repr__(self):
+        return f"SearchResult(rank={self.rank!r}, link={self.link!r})"
+
+
+# Entries are {"results": [...], "fresh_until": ts}, kept SEARCH_STALE_TTL past
+# freshness so they can stand in while SerpApi is down
+search_cache = TTLCache(
+    "search",
+    ttl=SEARCH_CACHE_TTL + SEARCH_STALE_TTL,
+    max_entries=SEARCH_CACHE_SIZE,
+    backend=SEARCH_CACHE_BACKEND,
+)
+
+serpapi = resilience.Upstream("serpapi", max_retries=SERPAPI_MAX_RETRIES, hedge="serpapi" in HEDGE_UPSTREAMS)
+
+def normalize_query(query):
+    """Fold case, unicode forms and whitespace so equivalent queries share a cache entry."""
+    return " ".join(unicodedata.normalize("NFKC", query or "").casefold().split())
+
+def _cache_key(query, gl, hl):
+    return f"{(gl or '').lower()}:{(hl or '').lower()}:{normalize_query(query)}"
+
+async def search_api(query, max_results=10, gl=SEARCH_GL, hl=SEARCH_HL):
     if not query:
-        return pd.DataFrame()
+        return []
     
     if not SERPAPI_KEY:
         logger.error("SERPAPI_KEY is missing in settings")
-        return pd.DataFrame(columns=["link", "rank", "snippet", "title"])
+        return []
 
     params = {
         "engine": "google",
         "q": query,
         "api_key": SERPAPI_KEY,
         "num": max_results,
-        "gl": "in", # India
-        "hl": "en"  # English
+        "gl": gl,
+        "hl": hl
     }
     
-    url = "https://serpapi.com/search.json"
-    
     results = []
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params, timeout=10) as response:
-                response.raise_for_status()
-                data = await response.json()
-                
-                # SerpApi puts organic results in 'organic_results'
-                organic_results = data.get("organic_results", [])
-                for result in organic_results:
-                    results.append({
-                        "link": result.get("link"),
-                        "title": result.get("title"),
-                        "snippet": result.get("snippet") or result.get("description", ""),
-                        "rank": result.get("position")
-                    })
+        with metrics.stage_seconds.time(stage="serpapi"):
+            data = await serpapi.call(lambda: http_client.get_json(SERPAPI_URL, params=params, timeout=10))
+        metrics.upstream_requests.inc(upstream="serpapi", outcome="ok")
+
+        # SerpApi puts organic results in 'organic_results'
+        organic_results = data.get("organic_results", [])
+        for result in organic_results:
+            results.append(SearchResult(
+                link=result.get("link"),
+                title=result.get("title"),
+                snippet=result.get("snippet") or result.get("description", ""),
+                rank=result.get("position"),
+            ))
+    except resilience.CircuitOpen as e:
+        metrics.upstream_requests.inc(upstream="serpapi", outcome="short_circuit")
+        logger.info(str(e))
+        return []
     except Exception as e:
+        metrics.upstream_requests.inc(upstream="serpapi", outcome="error")
         logger.warning(f"SerpApi search failed: {e}")
-        return pd.DataFrame(columns=["link", "rank", "snippet", "title"])
+        return []
 
-    if not results:
-        return pd.DataFrame(columns=["link", "rank", "snippet", "title"])
-        
-    res_df = pd.DataFrame(results)
-    
     # Ensure rank is sequential if position is missing or inconsistent
-    if "rank" not in res_df.columns or res_df["rank"].isnull().any():
-        res_df["rank"] = list(range(1, res_df.shape[0] + 1))
-    
-    # Ensure all required columns exist
-    for col in ["link", "rank", "snippet", "title"]:
-        if col not in res_df.columns:
-            res_df[col] = "" 
-            
-    res_df = res_df[["link", "rank", "snippet", "title"]]
-    
-    return res_df
+    if any(r.rank is None for r in results):
+        for rank, result in enumerate(results, start=1):
+            result.rank = rank
+
+    return results
+
+async def _search_records(query, key, gl, hl, stale=None):
+    results = await search_api(query, gl=gl, hl=hl)
+    records = [r.to_dict() for r in results]
+    # Empty results are usually upstream failures; don't pin them in the cache
+    if records:
+        await search_cache.aset(key, {"results": records, "fresh_until": time.time() + SEARCH_CACHE_TTL})
+    elif stale is not None:
+        logger.info("SerpApi returned nothing; serving stale results")
+        serpapi.counters["served_stale"] += 1
+        return stale["results"]
+    return records
+
+async def search(query, gl=SEARCH_GL, hl=SEARCH_HL):
+    """Ranked SearchResults for `query`, from the cache when possible.
+
+    Expired results are still returned when SerpApi fails or its breaker is open.
+    """
+    key = _cache_key(query, gl, hl)
+    entry = await search_cache.aget(key)
+    if entry is not None and entry["fresh_until"] > time.time():
+        records = entry["results"]
+    else:
+        # Concurrent searches for the same query share one SerpApi call
+        records = await singleflight.do("search", key, lambda: _search_records(query, key, gl, hl, entry))
+    return [SearchResult(**record) for record in records]
 
-async def search(query):
-    return await search_api(query)
\ No newline at end of file
+def snippets_text(results, n=3):
+    """The first `n` snippets joined into one paragraph for the snippet summary."""
+    return '. '.join(r.snippet or '' for r in results[:n])
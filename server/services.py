@@ -1,6 +1,3 @@
-from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 import json
 import os
 import logging
@@ -8,8 +5,30 @@ from prompts import *
 from dotenv import load_dotenv
 from urllib.parse import urlparse
 import asyncio
-import aiohttp
-from bs4 import BeautifulSoup
+import time
+import fetch_scheduler
+import extract
+import metrics
+import content_cache
+import singleflight
+import models
+import ranking
+from llm_scheduler import LLMOverloaded
+from mapreduce import map_chunks, reduce_tree
+from ranking import estimate_tokens
+from settings import (
+    SUMMARY_CHUNK_SIZE,
+    SUMMARY_MAX_CHUNKS,
+    SUMMARY_TOKEN_BUDGET,
+    SUMMARY_MAP_CONCURRENCY,
+    SUMMARY_MAP_DEADLINE,
+    SUMMARY_REDUCE_FANIN,
+    SUMMARY_QUERY_TOKEN_BUDGET,
+    SUMMARY_BATCH_CONCURRENCY,
+    FETCH_MAX_BYTES,
+    FETCH_TIMEOUT,
+    LLM_OUTPUT_TOKEN_ESTIMATE,
+)
 
 load_dotenv()
 
@@ -17,25 +36,8 @@ load_dotenv()
 if not os.getenv("GROQ_API_KEY"):
     pass # Let it fail if accessed or expect it set in env
 
-# Initialize the LLM
 logger = logging.getLogger("services")
 
-llm_8b = ChatGroq(
-    model="llama-3.3-70b-versatile",
-    temperature=0,
-    max_tokens=None,
-    timeout=60,
-    max_retries=2,
-)
-
-llm_70b = ChatGroq(
-    model="llama-3.3-70b-versatile",
-    temperature=0,
-    max_tokens=None,
-    timeout=60,
-    max_retries=2,
-)
-
 def _is_valid_url(url: str) -> bool:
     try:
         parsed = urlparse(url)
@@ -48,51 +50,274 @@ async def _fetch_url_text(url: str) -> str:
         return None
     
     headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.5",
     }
     
+    cached = await content_cache.get_page(url)
+    if cached is not None and content_cache.is_fresh(cached):
+        return cached["text"]
+
+    # Missing or stale: fetch, conditionally if we have validators
+    return await singleflight.do("fetch", url, lambda: _download_url_text(url, headers, cached))
+
+async def _download_url_text(url, headers, cached=None):
+    if cached is not None:
+        headers = {**headers, **content_cache.conditional_headers(cached)}
     try:
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.get(url, timeout=15) as response:
-                response.raise_for_status()
-                html = await response.text()
-                # Basic text extraction
-                soup = BeautifulSoup(html, 'html.parser')
-                # Remove script and style elements
-                for script in soup(["script", "style"]):
-                    script.extract()
-                return soup.get_text()
+        with metrics.stage_seconds.time(stage="page_fetch"):
+            # Per-host politeness, global fetch limit and slow-host timeouts
+            body, response_headers = await fetch_scheduler.fetch(
+                url,
+                headers=headers,
+                timeout=FETCH_TIMEOUT,
+                max_bytes=FETCH_MAX_BYTES,
+                check_headers=lambda h: extract.check_content_type(h.get("Content-Type")),
+            )
+        metrics.upstream_requests.inc(upstream="page", outcome="ok")
+    except extract.UnsupportedContent as e:
+        metrics.upstream_requests.inc(upstream="page", outcome="unsupported")
+        logger.warning(f"Failed to fetch/parse {url}: {e}")
+        return None
+    except fetch_scheduler.FetchBlocked as e:
+        metrics.upstream_requests.inc(upstream="page", outcome="robots")
+        logger.info(str(e))
+        return None
     except Exception as e:
+        metrics.upstream_requests.inc(upstream="page", outcome="error")
+        if cached is not None:
+            # Better a stale copy than nothing while the site is unreachable
+            content_cache.revalidations.inc(outcome="stale_on_error")
+            logger.warning(f"Revalidating {url} failed ({e}); serving the cached copy")
+            return cached["text"]
         logger.warning(f"Failed to fetch/parse {url}: {e}")
         return None
 
-async def clean_webpage_content(url):
-    """First get and summarize webpage content to reduce tokens"""
-    raw_text = await _fetch_url_text(url)
-    if not raw_text:
-        logger.info(f"No content loaded for url: {url}")
+    if cached is not None:
+        digest = None if body is None else content_cache.body_hash(body)
+        if body is None or digest == cached.get("digest"):
+            # 304, or the same bytes again: the extracted text (and every LLM
+            # output keyed on it) is still valid
+            content_cache.revalidations.inc(outcome="not_modified" if body is None else "unchanged")
+            await content_cache.put_page(url, cached["text"], response_headers, previous=cached)
+            return cached["text"]
+        content_cache.revalidations.inc(outcome="changed")
+    elif body is None:
+        return None
+
+    try:
+        # Parsing is CPU-bound; keep it off the event loop
+        with metrics.stage_seconds.time(stage="html_extract"):
+            text = await extract.extract_async(body, response_headers.get("Content-Type"))
+    except Exception as e:
+        logger.warning(f"Failed to fetch/parse {url}: {e}")
+        return None
+
+    if text:
+        await content_cache.put_page(url, text, response_headers, digest=content_cache.body_hash(body))
+    return text
+
+def _prompt_tokens(template, inputs):
+    return (
+        estimate_tokens(template)
+        + sum(estimate_tokens(str(v)) for v in inputs.values())
+        + LLM_OUTPUT_TOKEN_ESTIMATE
+    )
+
+async def _ainvoke(task, template, inputs, validate=None):
+    """Fill `template` with `inputs` and run it on the model tier routed for `task`."""
+    return await models.ainvoke(task, template, inputs, _prompt_tokens(template, inputs), validate=validate)
+
+def _llm_key(task, template, content):
+    return content_cache.llm_key(task, template, content, models.model_for(task))
+
+# Output checks; a failing small-model answer is retried on the fallback tier
+def _valid_text(text):
+    return len(text.strip()) >= 40
+
+def _valid_summary(text):
+    return _valid_text(text) and len([l for l in text.splitlines() if l.strip()]) <= 8
+
+def _valid_bullets(text):
+    return '|' in text and any(s.strip(' []\n') for s in text.split('|'))
+
+def _json_object(text):
+    try:
+        data = json.loads(text[text.index('{'):text.rindex('}') + 1])
+    except ValueError:
         return None
+    return data if isinstance(data, dict) else None
 
+def _valid_comparison(text):
+    data = _json_object(text)
+    return data is not None and all(
+        isinstance(data.get(key), dict) and {"web1", "web2"} <= set(data[key])
+        for key in ("key_information", "unique_features", "content_structure", "strengths", "limitations")
+    )
+
+def _valid_analysis(text):
+    data = _json_object(text)
+    return data is not None and isinstance(data.get("key_points"), list) and bool(data["key_points"])
+
+def _valid_multi_comparison(text):
+    data = _json_object(text)
+    return data is not None and isinstance(data.get("unique_features"), dict)
+
+VALIDATORS = {
+    "clean": _valid_text,
+    "merge": _valid_text,
+    "summary": _valid_summary,
+    "analysis": _valid_analysis,
+    "multi_compare": _valid_multi_comparison,
+}
+
+def _split_chunks(raw_text):
+    # Deferred: the splitter pulls in most of langchain_core
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=20000,
+        chunk_size=SUMMARY_CHUNK_SIZE,
         chunk_overlap=0,
         length_function=len
     )
-    chunks = text_splitter.split_text(raw_text)
+    return text_splitter.split_text(raw_text)
+
+def _budget_chunks(chunks):
+    """Keep the leading chunks that fit the per-page token budget (always at least one)."""
+    selected, spent = [], 0
+    for chunk in chunks[:SUMMARY_MAX_CHUNKS]:
+        cost = estimate_tokens(chunk)
+        if selected and spent + cost > SUMMARY_TOKEN_BUDGET:
+            break
+        selected.append(chunk)
+        spent += cost
+    return selected
+
+async def _clean_document(raw_text, reserve_tokens=None, query=None):
+    """Clean a whole page: clean its chunks concurrently, then merge the cleaned
+    parts hierarchically. A one-chunk page costs exactly one cleaning call.
+
+    Boilerplate and duplicate passages are dropped first; with a `query`, only
+    the passages most relevant to it (up to SUMMARY_QUERY_TOKEN_BUDGET, within
+    the per-page SUMMARY_TOKEN_BUDGET) are kept, and all of them are cleaned.
+    """
+    budget = min(SUMMARY_QUERY_TOKEN_BUDGET, SUMMARY_TOKEN_BUDGET)
+    with metrics.stage_seconds.time(stage="rank"):
+        # CPU-bound on big pages; keep it off the event loop
+        text = await asyncio.to_thread(ranking.select, raw_text, query, budget)
+    if not text:
+        chunks = []
+    elif query:
+        # Already packed to the budget; re-budgeting by chunk could drop ranked passages
+        chunks = _split_chunks(text)[:SUMMARY_MAX_CHUNKS]
+    else:
+        chunks = _budget_chunks(_split_chunks(text))
     if not chunks:
-        logger.info(f"No chunks produced for url: {url}")
+        return None
+
+    async def run(kind, template, content):
+        if reserve_tokens is not None:
+            key = _llm_key(kind, template, content)
+            if not await content_cache.llm_cache.acontains(key) and not reserve_tokens(estimate_tokens(content)):
+                return None
+        return await _run_content_prompt(kind, template, content)
+
+    async def clean_chunk(chunk):
+        return await run("clean", cleaning_prompt, chunk)
+
+    async def merge(parts):
+        try:
+            return await run("merge", merge_prompt, "\n\n---\n\n".join(parts))
+        except LLMOverloaded:
+            raise
+        except Exception:
+            logger.exception("Failed to merge cleaned chunks")
+            return None
+
+    parts = await map_chunks(
+        chunks,
+        clean_chunk,
+        concurrency=SUMMARY_MAP_CONCURRENCY,
+        deadline=SUMMARY_MAP_DEADLINE or None,
+    )
+    if len(parts) < len(chunks):
+        logger.info(f"Cleaned {len(parts)}/{len(chunks)} chunks")
+    return await reduce_tree(parts, merge, fanin=SUMMARY_REDUCE_FANIN)
+
+async def _run_content_prompt(kind, template, content):
+    """Run a single-input {content} prompt, memoized on (prompt version, content hash)."""
+    key = _llm_key(kind, template, content)
+    cached = await content_cache.llm_cache.aget(key)
+    if cached is not None:
+        return cached
+    return await singleflight.do(kind, key, lambda: _invoke_content_prompt(kind, key, template, content))
+
+async def _invoke_content_prompt(kind, key, template, content):
+    result = await _ainvoke(kind, template, {"content": content}, validate=VALIDATORS.get(kind))
+    output = getattr(result, 'content', None)
+    if output:
+        await content_cache.llm_cache.aset(key, output)
+    return output
+
+async def clean_webpage_content(url):
+    """First get and summarize webpage content to reduce tokens"""
+    raw_text = await _fetch_url_text(url)
+    if not raw_text:
+        logger.info(f"No content loaded for url: {url}")
         return None
 
     try:
-        prompt = PromptTemplate(input_variables=["content"], template=cleaning_prompt)
-        summary_chain = prompt | llm_70b
-        # Async invoke
-        result = await summary_chain.ainvoke({"content": chunks[0]})
-        return getattr(result, 'content', None)
+        cleaned_text = await _clean_document(raw_text)
+        if not cleaned_text:
+            logger.info(f"No cleaned content produced for url: {url}")
+        return cleaned_text
+    except LLMOverloaded:
+        raise
     except Exception as e:
         logger.exception(f"Error processing {url}: {str(e)}")
         return None
 
+def _load_llm_stack():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter  # noqa: F401
+    models.warm_up()
+
+async def warm_up():
+    """Import the lazily loaded LLM stack and build the model clients ahead of the first request."""
+    started = time.perf_counter()
+    # Imports are blocking; keep them off the event loop
+    await asyncio.to_thread(_load_llm_stack)
+    logger.info(f"Warm-up finished in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+async def warm_page(url, summarize=True, reserve_tokens=None, query=None):
+    """Fetch, clean and optionally summarize `url` so later requests hit the caches.
+
+    With the search `query`, the focused summary a click on that result asks
+    for is warmed, as in get_summary. `reserve_tokens(n)` is called before each
+    LLM call that is not already cached; if it returns False the work stops
+    there. Returns True when every requested stage ended up cached.
+    """
+    raw_text = await _fetch_url_text(url)
+    if not raw_text:
+        return False
+
+    refused = []
+
+    def reserve(tokens):
+        if reserve_tokens is None or reserve_tokens(tokens):
+            return True
+        refused.append(tokens)
+        return False
+
+    cleaned_text = await _clean_document(raw_text, reserve_tokens=reserve, query=query)
+    if not cleaned_text or refused:
+        return False
+    if not summarize:
+        return True
+
+    key = _llm_key("summary", summary_template, cleaned_text)
+    if not await content_cache.llm_cache.acontains(key) and not reserve(estimate_tokens(cleaned_text)):
+        return False
+    return bool(await _run_content_prompt("summary", summary_template, cleaned_text))
+
 async def compare_websites(url1, url2):
     """Compare two websites using their summarized content"""
     if not _is_valid_url(url1) or not _is_valid_url(url2):
@@ -109,12 +334,85 @@ async def compare_websites(url1, url2):
         logger.info("One or both summaries are empty; cannot compare")
         return None
     
-    prompt = PromptTemplate(input_variables=["doc1", "doc2"], template=comparator_prompt)
-    result = prompt | llm_70b
-    response = await result.ainvoke({"doc1": summary1, "doc2": summary2})
-    
+    key = _comparison_key(summary1, summary2)
+    output = await content_cache.llm_cache.aget(key)
+    if output is None:
+        output = await singleflight.do("compare", key, lambda: _invoke_comparison(key, summary1, summary2))
+
+    return _parse_json_object(output or '')
+
+def _comparison_key(doc1, doc2):
+    return _llm_key("compare", comparator_prompt, json.dumps([doc1, doc2]))
+
+async def _invoke_comparison(key, doc1, doc2):
+    response = await _ainvoke("compare", comparator_prompt, {"doc1": doc1, "doc2": doc2}, validate=_valid_comparison)
+    output = getattr(response, 'content', None)
+    # Only a well-formed comparison is worth serving again
+    if output and _valid_comparison(output):
+        await content_cache.llm_cache.aset(key, output)
+    return output
+
+async def analyze_site(url):
+    """Structured analysis of one site (key points, strengths, limitations,
+    structure). Cleaning and analysis are each cached on the page content, so a
+    site costs this once no matter how many comparisons it appears in."""
+    try:
+        cleaned = await clean_webpage_content(url)
+        if not cleaned:
+            return None
+        output = await _run_content_prompt("analysis", site_analysis_prompt, cleaned)
+        return _json_object(output or '')
+    except LLMOverloaded:
+        raise
+    except Exception:
+        logger.exception(f"Error analyzing {url}")
+        return None
+
+async def compare_many(urls):
+    """Compare any number of sites.
+
+    Per-site analyses run in parallel (and usually come from cache); only the
+    final merge sees all sites, and it is given just their analyses. Sites are
+    labelled in URL order so the same set of sites hits the same cached merge.
+    Returns {"sites": {url: analysis or None}, "comparison": dict or None}.
+    """
+    urls = list(dict.fromkeys(u for u in urls if _is_valid_url(u)))
+    analyses = await asyncio.gather(*(analyze_site(url) for url in urls))
+    sites = dict(zip(urls, analyses))
+
+    analyzed = sorted(url for url, analysis in sites.items() if analysis)
+    if len(analyzed) < 2:
+        logger.info("Fewer than two sites analyzed; skipping cross-site comparison")
+        return {"sites": sites, "comparison": None}
+
+    labels = {f"site{i}": url for i, url in enumerate(analyzed, start=1)}
+    content = json.dumps(
+        {label: {"url": url, **sites[url]} for label, url in labels.items()},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    try:
+        output = await _run_content_prompt("multi_compare", multi_compare_prompt, content)
+    except LLMOverloaded:
+        raise
+    except Exception:
+        logger.exception("Error merging site analyses")
+        return {"sites": sites, "comparison": None}
+
+    merged = _json_object(output or '')
+    if not merged:
+        return {"sites": sites, "comparison": None}
+    unique = merged.get("unique_features") if isinstance(merged.get("unique_features"), dict) else {}
+    comparison = {
+        "unique_features": {url: unique.get(label, []) for label, url in labels.items()},
+        "similarities": merged.get("similarities", []),
+        "differences": merged.get("differences", []),
+        "summary": merged.get("summary", ""),
+    }
+    return {"sites": sites, "comparison": comparison}
+
+def _parse_json_object(json_str):
     try:
-        json_str = getattr(response, 'content', '') or ''
         start_idx = json_str.find('{')
         end_idx = json_str.rindex('}') + 1
         if start_idx == -1 or end_idx <= 0:
@@ -126,44 +424,222 @@ async def compare_websites(url1, url2):
         logger.exception(f"Error parsing JSON: {e}")
         return None
 
-async def get_summary(url):
+async def get_summary(url, query=None):
+    """Summary of the page at `url`; focused on the passages relevant to `query` when given."""
     raw_text = await _fetch_url_text(url)
     if not raw_text:
         return None
         
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=20000,
-        chunk_overlap=0,
-        length_function=len
-    )
-    chunks = text_splitter.split_text(raw_text)
-    if not chunks:
-        return None
-
     try:
-        prompt = PromptTemplate(input_variables=["content"], template=cleaning_prompt)
-        clean_chain = prompt | llm_70b
-        cleaned = await clean_chain.ainvoke({"content": chunks[0]})
-        cleaned_text = getattr(cleaned, 'content', '')
+        cleaned_text = await _clean_document(raw_text, query=query)
         if not cleaned_text:
             return None
 
-        prompt = PromptTemplate(input_variables=["content"], template=summary_template)
-        summary_chain = prompt | llm_70b
-        final = await summary_chain.ainvoke({"content": cleaned_text})
-        return getattr(final, 'content', None)
+        return await _run_content_prompt("summary", summary_template, cleaned_text)
+    except LLMOverloaded:
+        raise
     except Exception:
         logger.exception("Error in get_summary")
         return None
 
+async def summarize_many(urls, concurrency=SUMMARY_BATCH_CONCURRENCY, query=None):
+    """Summarize several pages, yielding {"url", "summary"} or {"url", "error"}
+    for each as soon as it finishes. `query` focuses every summary as in get_summary.
+
+    Repeated URLs are summarized once. At most `concurrency` pages are in
+    progress at a time; the fetch and LLM schedulers still apply on top.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def summarize(url):
+        if not _is_valid_url(url):
+            return {"url": url, "error": "Invalid URL"}
+        async with semaphore:
+            try:
+                summary = await get_summary(url, query)
+            except LLMOverloaded as e:
+                # One page not getting LLM capacity shouldn't sink the others
+                return {"url": url, "error": str(e), "retry_after": e.retry_after}
+            except Exception as e:
+                logger.exception(f"Error summarizing {url}")
+                return {"url": url, "error": str(e)}
+        if not summary:
+            return {"url": url, "error": "Failed to process the webpage"}
+        return {"url": url, "summary": summary}
+
+    tasks = [asyncio.ensure_future(summarize(url)) for url in dict.fromkeys(urls)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The consumer went away (e.g. the client disconnected mid-stream)
+        for task in tasks:
+            task.cancel()
+
 async def get_summerized_results(snippets):
     if not snippets or not isinstance(snippets, str):
         return None
     try:
-        prompt = PromptTemplate(input_variables=["paragraph"], template=summarized_template)
-        summary_chain = prompt | llm_70b
-        res = await summary_chain.ainvoke({"paragraph": snippets})
-        return getattr(res, 'content', None)
+        key = _llm_key("snippet_summary", summarized_template, snippets)
+        cached = await content_cache.llm_cache.aget(key)
+        if cached is not None:
+            return cached
+        return await singleflight.do("snippet_summary", key, lambda: _invoke_snippet_summary(key, snippets))
+    except LLMOverloaded:
+        raise
     except Exception:
         logger.exception("Error in get_summerized_results")
         return None
+
+async def _invoke_snippet_summary(key, snippets):
+    res = await _ainvoke("snippet_summary", summarized_template, {"paragraph": snippets}, validate=_valid_bullets)
+    output = getattr(res, 'content', None)
+    if output:
+        await content_cache.llm_cache.aset(key, output)
+    return output
+
+# --- Streaming variants -------------------------------------------------------
+# These yield output as the LLM produces it and raise on failure instead of
+# returning None, so the caller can report the error in-stream.
+
+async def _astream_prompt(task, template, inputs):
+    async for chunk in models.astream(task, template, inputs, _prompt_tokens(template, inputs)):
+        text = getattr(chunk, 'content', '')
+        if text:
+            yield text
+
+async def stream_summerized_results(snippets):
+    """Yield the snippet summary as text deltas. A cached summary, or one
+    another request is already producing, comes as a single delta."""
+    key = _llm_key("snippet_summary", summarized_template, snippets)
+    cached = await content_cache.llm_cache.aget(key)
+    if cached is None and singleflight.in_flight("snippet_summary", key):
+        cached = await singleflight.do("snippet_summary", key, lambda: _invoke_snippet_summary(key, snippets))
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    async for delta in _astream_prompt("snippet_summary", summarized_template, {"paragraph": snippets}):
+        parts.append(delta)
+        yield delta
+    output = ''.join(parts)
+    if _valid_bullets(output):
+        await content_cache.llm_cache.aset(key, output)
+
+async def _clean_for_stream(url, query=None):
+    raw_text = await _fetch_url_text(url)
+    if not raw_text:
+        raise ValueError(f"Failed to load content from {url}")
+    cleaned_text = await _clean_document(raw_text, query=query)
+    if not cleaned_text:
+        raise ValueError(f"Failed to clean content from {url}")
+    return cleaned_text
+
+async def stream_summary(url, query=None):
+    """Yield the page summary as text deltas; cleaning runs (or hits the cache) first."""
+    cleaned_text = await _clean_for_stream(url, query)
+    key = _llm_key("summary", summary_template, cleaned_text)
+    cached = await content_cache.llm_cache.aget(key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    async for delta in _astream_prompt("summary", summary_template, {"content": cleaned_text}):
+        parts.append(delta)
+        yield delta
+    output = ''.join(parts)
+    if output:
+        await content_cache.llm_cache.aset(key, output)
+
+class _JsonSectionScanner:
+    """Incrementally pick complete top-level members out of a streamed JSON object."""
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.member_start = None
+
+    def feed(self, text):
+        self.buffer += text
+        sections = []
+        while self.pos < len(self.buffer):
+            ch = self.buffer[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == '\\':
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in '{[':
+                self.depth += 1
+                if self.depth == 1 and ch == '{':
+                    self.member_start = self.pos + 1
+            elif ch in '}]':
+                if self.depth == 1 and self.member_start is not None:
+                    sections.extend(self._close_member())
+                self.depth -= 1
+            elif ch == ',' and self.depth == 1 and self.member_start is not None:
+                sections.extend(self._close_member())
+                self.member_start = self.pos + 1
+            self.pos += 1
+        return sections
+
+    def _close_member(self):
+        member = self.buffer[self.member_start:self.pos].strip()
+        if not member:
+            return []
+        try:
+            return list(json.loads('{' + member + '}').items())
+        except ValueError:
+            return []
+
+async def stream_compare(url1, url2):
+    """Yield (event, data) pairs: cleaning progress, each comparison section as
+    soon as the model finishes it, and finally the full parsed comparison."""
+    if not _is_valid_url(url1) or not _is_valid_url(url2):
+        raise ValueError("compare received invalid urls")
+
+    async def clean(url):
+        cleaned = await _clean_for_stream(url)
+        return url, cleaned
+
+    cleaned = {}
+    tasks = [asyncio.ensure_future(clean(url)) for url in (url1, url2)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            url, text = await next_done
+            cleaned[url] = text
+            yield "status", {"stage": "cleaned", "url": url}
+    finally:
+        # One page failed or the client went away: stop spending LLM quota on the other
+        for task in tasks:
+            task.cancel()
+
+    scanner = _JsonSectionScanner()
+    key = _comparison_key(cleaned[url1], cleaned[url2])
+    output = await content_cache.llm_cache.aget(key)
+    if output is not None:
+        for name, data in scanner.feed(output):
+            yield "section", {"name": name, "data": data}
+    else:
+        parts = []
+        async for delta in _astream_prompt("compare", comparator_prompt, {"doc1": cleaned[url1], "doc2": cleaned[url2]}):
+            parts.append(delta)
+            for name, data in scanner.feed(delta):
+                yield "section", {"name": name, "data": data}
+        output = ''.join(parts)
+        if _valid_comparison(output):
+            await content_cache.llm_cache.aset(key, output)
+
+    result = _parse_json_object(output)
+    if not result:
+        raise ValueError("Failed to parse comparison")
+    yield "result", result
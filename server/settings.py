@@ -1,4 +1,189 @@
 import os
+from dotenv import load_dotenv
+
+load_dotenv()
 
 SERPAPI_KEY = os.getenv("SERPAPI_KEY")
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search.json")
+
+# Load LangChain and build LLM clients in the background as soon as a worker starts,
+# instead of on the first request that needs them
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "false").lower() in ("1", "true", "yes")
+
+# Per-client request limits; only switched off for load tests
+RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Where limit counters live: sqlite:///file.db shares them between the workers on
+# one host, redis://host:6379 (needs the `redis` package) across hosts, memory://
+# keeps them per process
+RATELIMIT_STORAGE_URI = os.getenv(
+    "RATELIMIT_STORAGE_URI",
+    "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "ratelimit.db"),
+)
+RATELIMIT_BATCH = int(os.getenv("RATELIMIT_BATCH", "10"))  # max tokens reserved per shared-store round trip, 1 = off
+# Quota shared by the LLM-backed endpoints; each request spends its route's cost
+RATELIMIT_QUOTA = os.getenv("RATELIMIT_QUOTA", "300 per hour")
+# "route=cost" pairs; routes not listed cost 1
+RATELIMIT_COSTS = {
+    route: int(cost)
+    for route, _, cost in (
+        pair.partition("=")
+        for pair in os.getenv(
+            "RATELIMIT_COSTS",
+            "search=1,query-summary=1,summary=2,compare-results=5,compare-jobs=5,compare-multi=10",
+        ).replace(" ", "").split(",")
+        if "=" in pair
+    )
+}
+
+# Shared outbound HTTP pool
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10"))
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", "300"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+
+# Resilience for SerpApi and the LLM provider: after BREAKER_FAILURES upstream
+# errors in a row calls fail fast for BREAKER_RESET seconds, then one probe is
+# let through. Retries (and hedges) are capped at RETRY_BUDGET_RATIO of recent
+# calls plus RETRY_BUDGET_MIN per 10s.
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN = int(os.getenv("RETRY_BUDGET_MIN", "3"))
+RETRY_BACKOFF = float(os.getenv("RETRY_BACKOFF", "0.5"))  # seconds before the first retry, doubled after
+SERPAPI_MAX_RETRIES = int(os.getenv("SERPAPI_MAX_RETRIES", "1"))
+# Upstreams ("serpapi", "groq") that get a duplicate request once a call is
+# slower than the recent HEDGE_PERCENTILE latency; off by default
+HEDGE_UPSTREAMS = {u for u in os.getenv("HEDGE_UPSTREAMS", "").replace(" ", "").split(",") if u}
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.25"))  # seconds
+
+# SerpApi locale
+SEARCH_GL = os.getenv("SEARCH_GL", "in")  # India
+SEARCH_HL = os.getenv("SEARCH_HL", "en")  # English
+
+# Page text and LLM output cache, shared by worker processes on one host
+CONTENT_CACHE_BACKEND = os.getenv(
+    "CONTENT_CACHE_BACKEND",
+    "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "content.db"),
+)
+CONTENT_CACHE_MAX_BYTES = int(os.getenv("CONTENT_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+# Pages are kept for PAGE_CACHE_TTL but only served without revalidation while
+# fresh: for the server's max-age/Expires, or PAGE_FRESH_TTL if it sends neither.
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", str(7 * 24 * 3600)))
+PAGE_FRESH_TTL = int(os.getenv("PAGE_FRESH_TTL", str(6 * 3600)))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+# SQLite caches: bytes of the file memory-mapped for reads, and how often one
+# worker purges expired rows, enforces size caps and reclaims space (0 = never)
+CACHE_MMAP_SIZE = int(os.getenv("CACHE_MMAP_SIZE", str(256 * 1024 * 1024)))
+CACHE_COMPACT_INTERVAL = int(os.getenv("CACHE_COMPACT_INTERVAL", "600"))
+# Threads per worker that run SQLite cache reads and writes for async code
+CACHE_IO_WORKERS = int(os.getenv("CACHE_IO_WORKERS", "4"))
+
+# Search result cache; persisted with pages so restarts and cache warming carry over
+SEARCH_CACHE_BACKEND = os.getenv("SEARCH_CACHE_BACKEND", CONTENT_CACHE_BACKEND)
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))  # entries, with either backend
+# Expired results are kept this much longer and served while SerpApi is failing
+SEARCH_STALE_TTL = int(os.getenv("SEARCH_STALE_TTL", "86400"))
+
+# Background prefetch of top search results
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "3"))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+PREFETCH_TOKEN_BUDGET = int(os.getenv("PREFETCH_TOKEN_BUDGET", "15000"))  # per search
+PREFETCH_SUMMARIZE = os.getenv("PREFETCH_SUMMARIZE", "true").lower() in ("1", "true", "yes")
+
+# Map-reduce cleaning of long pages
+SUMMARY_MAX_CHUNKS = int(os.getenv("SUMMARY_MAX_CHUNKS", "8"))
+# SUMMARY_TOKEN_BUDGET (map input tokens per page) and SUMMARY_CHUNK_SIZE follow the model tiers below
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+SUMMARY_MAP_DEADLINE = float(os.getenv("SUMMARY_MAP_DEADLINE", "20"))  # seconds, 0 disables
+SUMMARY_REDUCE_FANIN = int(os.getenv("SUMMARY_REDUCE_FANIN", "4"))
+# Pages are split into passages of about this many characters to drop
+# boilerplate and duplicates and, given a query, to rank them
+RANK_PASSAGE_CHARS = int(os.getenv("RANK_PASSAGE_CHARS", "800"))
+# With a query, only the best-matching passages up to this many tokens are summarized
+SUMMARY_QUERY_TOKEN_BUDGET = int(os.getenv("SUMMARY_QUERY_TOKEN_BUDGET", "4000"))
+
+# /summary/batch: most URLs per request, and pages summarized at once per request
+SUMMARY_BATCH_MAX_URLS = int(os.getenv("SUMMARY_BATCH_MAX_URLS", "20"))
+SUMMARY_BATCH_CONCURRENCY = int(os.getenv("SUMMARY_BATCH_CONCURRENCY", "4"))
+
+# Page download and text extraction
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "15"))
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+EXTRACT_EXECUTOR = os.getenv("EXTRACT_EXECUTOR", "thread")  # "thread" or "process"
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "2"))
+
+# Fetch scheduler: politeness towards the sites we download, per worker
+FETCH_MAX_CONCURRENCY = int(os.getenv("FETCH_MAX_CONCURRENCY", "32"))  # page fetches in flight overall
+FETCH_PER_HOST = int(os.getenv("FETCH_PER_HOST", "2"))  # concurrent fetches per host
+FETCH_HOST_INTERVAL = float(os.getenv("FETCH_HOST_INTERVAL", "0.5"))  # min seconds between starts per host
+FETCH_RESPECT_ROBOTS = os.getenv("FETCH_RESPECT_ROBOTS", "false").lower() in ("1", "true", "yes")
+FETCH_ROBOTS_AGENT = os.getenv("FETCH_ROBOTS_AGENT", "SixthSense")
+FETCH_ROBOTS_TTL = int(os.getenv("FETCH_ROBOTS_TTL", "3600"))
+# A host whose fetches time out or take over FETCH_SLOW_THRESHOLD seconds
+# FETCH_SLOW_STRIKES times in a row gets FETCH_SLOW_TIMEOUT for FETCH_SLOW_PENALTY seconds
+FETCH_SLOW_THRESHOLD = float(os.getenv("FETCH_SLOW_THRESHOLD", "5"))
+FETCH_SLOW_STRIKES = int(os.getenv("FETCH_SLOW_STRIKES", "3"))
+FETCH_SLOW_TIMEOUT = float(os.getenv("FETCH_SLOW_TIMEOUT", "5"))
+FETCH_SLOW_PENALTY = float(os.getenv("FETCH_SLOW_PENALTY", "300"))
+
+# LLM scheduler: concurrency, budgets and backpressure for all LLM calls.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_INTERACTIVE_RESERVE = int(os.getenv("LLM_INTERACTIVE_RESERVE", "2"))  # slots background work can't use
+LLM_INTERACTIVE_TOKEN_SHARE = float(os.getenv("LLM_INTERACTIVE_TOKEN_SHARE", "0.5"))  # share of each TPM budget likewise
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "100"))
+LLM_MAX_QUEUE_PER_CLIENT = int(os.getenv("LLM_MAX_QUEUE_PER_CLIENT", "20"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))  # seconds
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))  # per call, within the retry budget
+LLM_OUTPUT_TOKEN_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKEN_ESTIMATE", "1024"))
+
+# Model tiering: which model serves each LLM task
+LLM_TIER_MODELS = {
+    "small": os.getenv("LLM_SMALL_MODEL", "llama-3.1-8b-instant"),
+    "large": os.getenv("LLM_LARGE_MODEL", "llama-3.3-70b-versatile"),
+}
+# "task=tier" pairs; tasks: snippet_summary, clean, merge, summary, compare, analysis, multi_compare
+LLM_TASK_TIERS = dict(
+    pair.split("=", 1)
+    for pair in os.getenv(
+        "LLM_TASK_TIERS",
+        "snippet_summary=small,clean=small,merge=small,summary=small,compare=large,"
+        "analysis=small,multi_compare=large",
+    ).replace(" ", "").split(",")
+    if "=" in pair
+)
+LLM_FALLBACK_TIER = os.getenv("LLM_FALLBACK_TIER", "large")  # retried here when validation fails
+
+# Requests and tokens per minute per tier, 0 = unlimited. The provider limits
+# each model separately, so each tier's model gets its own budget. Defaults
+# match Groq's free tier for the default models; raise them on paid plans.
+# LLM_RPM / LLM_TPM, if set, replace the defaults for every tier.
+LLM_TIER_LIMITS = {
+    tier: (
+        int(os.getenv(f"LLM_{tier.upper()}_RPM", os.getenv("LLM_RPM", rpm))),
+        int(os.getenv(f"LLM_{tier.upper()}_TPM", os.getenv("LLM_TPM", tpm))),
+    )
+    for tier, rpm, tpm in (("small", "30", "6000"), ("large", "30", "12000"))
+}
+
+# Map input tokens per page. Defaults to a minute of the cleaning tier's TPM
+# (about 24k characters, a little over what a single call used to clean), so
+# one page can't take more than its share of the provider budget. Chunks are
+# capped at a third of it (at ~4 characters per token), so several of them
+# fit and are cleaned in parallel.
+_CLEAN_TPM = LLM_TIER_LIMITS.get(LLM_TASK_TIERS.get("clean", LLM_FALLBACK_TIER), (0, 0))[1]
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", str(_CLEAN_TPM or 24000)))
+SUMMARY_CHUNK_SIZE = int(os.getenv("SUMMARY_CHUNK_SIZE", str(min(12000, (SUMMARY_TOKEN_BUDGET // 3 - 1) * 4))))  # characters
+
+# Background /compare-jobs: bounded executor and result storage. With the SQLite
+# backend any worker on the host can answer polls for a job another one runs.
+COMPARE_JOB_WORKERS = int(os.getenv("COMPARE_JOB_WORKERS", "4"))  # jobs running at once per worker
+COMPARE_JOB_MAX_QUEUE = int(os.getenv("COMPARE_JOB_MAX_QUEUE", "32"))  # waiting jobs before 503
+COMPARE_JOB_TTL = int(os.getenv("COMPARE_JOB_TTL", "3600"))  # seconds a finished result is kept
+COMPARE_JOB_TIMEOUT = float(os.getenv("COMPARE_JOB_TIMEOUT", "300"))  # seconds from submit to give up
+COMPARE_JOB_BACKEND = os.getenv("COMPARE_JOB_BACKEND", CONTENT_CACHE_BACKEND)
 
+# Most sites accepted by one /compare-multi request
+COMPARE_MAX_SITES = int(os.getenv("COMPARE_MAX_SITES", "6"))
@@ -0,0 +1,119 @@
+import asyncio
+import contextvars
+import logging
+from collections import Counter
+import llm_scheduler
+import metrics
+import runtime
+
+logger = logging.getLogger("singleflight")
+
+
+class _Call:
+    __slots__ = ("task", "priority", "parent", "waiters")
+
+    def __init__(self, priority, parent):
+        self.task = None
+        self.priority = priority
+        # The shared call this one was started from, if any
+        self.parent = parent
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent identical work into one shared task.
+
+    Calls are keyed by (operation, key). The first caller starts `fn()`; callers
+    that arrive while it is still running await the same result instead of
+    starting their own. A caller that is cancelled only detaches itself: the
+    shared task keeps running for the others and is cancelled once nobody is
+    waiting on it any more. All bookkeeping happens on the runtime loop, so it
+    is shared across requests.
+
+    The shared task runs in its first caller's context, LLM priority included.
+    When an interactive caller joins a call started at background priority
+    (e.g. by prefetch), the call is promoted rather than started again: its
+    LLM calls that are still queued move to the interactive queue and later
+    ones are made at interactive priority, while any already running go on.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.started = Counter()
+        self.coalesced = Counter()
+        self.promoted = Counter()
+
+    async def do(self, operation, key, fn):
+        return await runtime.run(self._do((operation, key), fn))
+
+    async def _do(self, call_key, fn):
+        operation = call_key[0]
+        parent = llm_scheduler.current_flight.get()
+        priority = llm_scheduler.effective_priority(llm_scheduler.current_priority.get(), parent)
+        call = self._calls.get(call_key)
+        if call is None:
+            call = _Call(priority, parent)
+            context = contextvars.copy_context()
+            context.run(llm_scheduler.current_flight.set, call)
+            call.task = asyncio.get_running_loop().create_task(fn(), context=context)
+            self._calls[call_key] = call
+            call.task.add_done_callback(lambda _t: self._forget(call_key, call))
+            self.started[operation] += 1
+        else:
+            self.coalesced[operation] += 1
+            logger.debug(f"Coalesced {operation} call")
+            if priority < call.priority:
+                call.priority = priority
+                self.promoted[operation] += 1
+                llm_scheduler.scheduler.promote()
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _forget(self, call_key, call):
+        if self._calls.get(call_key) is call:
+            del self._calls[call_key]
+
+    def stats(self):
+        return {
+            operation: {
+                "started": self.started[operation],
+                "coalesced": self.coalesced[operation],
+                "promoted": self.promoted[operation],
+            }
+            for operation in set(self.started) | set(self.coalesced)
+        }
+
+
+flights = SingleFlight()
+
+
+async def do(operation, key, fn):
+    """Run `fn()` once for all concurrent callers sharing (operation, key)."""
+    return await flights.do(operation, key, fn)
+
+
+def in_flight(operation, key):
+    """Whether a call for (operation, key) is running, so `do` would join it."""
+    return (operation, key) in flights._calls
+
+
+def stats():
+    return flights.stats()
+
+
+@metrics.register_collector
+def _collect():
+    yield (
+        "sixthsense_singleflight_calls_total",
+        "counter",
+        "Calls that started shared work vs. joined an in-flight call (promoted: joined a lower-priority one and raised it).",
+        [({"operation": op, "outcome": outcome}, n)
+         for op, counts in flights.stats().items()
+         for outcome, n in counts.items()],
+    )
@@ -0,0 +1,60 @@
+import asyncio
+import json
+import logging
+import queue
+from flask import Response
+import runtime
+
+logger = logging.getLogger("streaming")
+
+_END = object()
+
+
+def wants_stream(request) -> bool:
+    """Streaming is opt-in via ?stream=1 or an `Accept: text/event-stream` header."""
+    if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+        return True
+    return "text/event-stream" in (request.headers.get("Accept") or "")
+
+
+def sse(event, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events, request_id="-"):
+    """Stream an async iterator of pre-formatted SSE strings as a Flask response.
+
+    The iterator is driven by one task on the runtime loop and handed to the
+    WSGI thread through a queue; if the client disconnects the task is cancelled.
+    """
+    pending = queue.Queue()
+
+    async def pump():
+        try:
+            async for chunk in events:
+                pending.put(chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Error while streaming response", extra={"request_id": request_id})
+            pending.put(sse("error", {"error": str(e), "request_id": request_id}))
+        finally:
+            pending.put(_END)
+
+    future = runtime.submit(pump())
+
+    def generate():
+        try:
+            while True:
+                chunk = pending.get()
+                if chunk is _END:
+                    break
+                yield chunk
+        finally:
+            future.cancel()
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,13 @@
+import os
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+# Keep tests off the on-disk caches and background work; set before `settings` is imported
+os.environ["CONTENT_CACHE_BACKEND"] = "memory"
+os.environ["RATELIMIT_STORAGE_URI"] = "memory://"
+os.environ["CACHE_COMPACT_INTERVAL"] = "0"
+os.environ["PREFETCH_ENABLED"] = "false"
+os.environ["WARMUP_ON_START"] = "false"
+os.environ.setdefault("ALLOWED_ORIGINS", "*")
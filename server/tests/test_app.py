@@ -0,0 +1,89 @@
+import app
+import ratelimit
+from settings import SUMMARY_BATCH_MAX_URLS
+
+
+def _cost(body):
+    with app.app.test_request_context("/summary/batch", method="POST", json=body):
+        return app._batch_cost()
+
+
+def test_batch_is_charged_per_distinct_url():
+    per_page = ratelimit.cost("/summary")
+    assert _cost({"urls": ["https://a.example", "https://b.example", "https://a.example"]}) == 2 * per_page
+
+
+def test_rejected_batches_cost_one_summary():
+    per_page = ratelimit.cost("/summary")
+    too_many = [f"https://example.com/{i}" for i in range(SUMMARY_BATCH_MAX_URLS + 50)]
+    assert _cost({"urls": too_many}) == per_page
+    assert _cost({}) == per_page
+
+
+def test_oversized_batch_is_rejected_before_any_work():
+    client = app.app.test_client()
+    urls = [f"https://example.com/{i}" for i in range(SUMMARY_BATCH_MAX_URLS + 1)]
+    response = client.post("/summary/batch", json={"urls": urls})
+    assert response.status_code == 400
+
+
+def test_health_reports_llm_usage():
+    body = app.app.test_client().get("/health").get_json()
+    assert body["status"] in ("ok", "degraded")
+    assert {"scheduler", "tasks"} <= set(body["llm"])
+
+
+def test_invalid_requests_do_not_spend_the_llm_quota(monkeypatch):
+    # Every request would need the whole hourly quota
+    monkeypatch.setattr(ratelimit, "cost", lambda rule: 300)
+    client = app.app.test_client()
+    environ = {"REMOTE_ADDR": "10.0.21.1"}
+    for _ in range(3):
+        response = client.post("/compare-results", json={"url1": "https://a.example"}, environ_base=environ)
+        assert response.status_code == 400
+        response = client.post("/summary/batch", json={"urls": []}, environ_base=environ)
+        assert response.status_code == 400
+
+
+def test_accepted_requests_spend_the_llm_quota(monkeypatch):
+    import jobs
+
+    async def run(*_args):
+        return {"ok": True}
+
+    monkeypatch.setattr(ratelimit, "cost", lambda rule: 300)
+    monkeypatch.setattr(app, "compare_jobs", jobs.JobQueue("quota_test", run))
+    client = app.app.test_client()
+    environ = {"REMOTE_ADDR": "10.0.21.2"}
+    body = {"url1": "https://a.example", "url2": "https://b.example"}
+    assert client.post("/compare-jobs", json=body, environ_base=environ).status_code in (200, 202)
+    assert client.post("/compare-jobs", json=body, environ_base=environ).status_code == 429
+
+
+def test_compare_multi_reports_each_site(monkeypatch):
+    a, b = "https://multi-a.example", "https://multi-b.example"
+
+    async def compare_many(urls):
+        return {
+            "sites": {a: {"key_points": ["point a"], "strengths": ["fast"]}, b: None},
+            "comparison": {"unique_features": {a: ["only a"]}, "similarities": ["s"], "differences": [], "summary": "x"},
+        }
+
+    monkeypatch.setattr(app, "compare_many", compare_many)
+    client = app.app.test_client()
+    environ = {"REMOTE_ADDR": "10.0.17.1"}
+    response = client.post("/compare-multi", json={"sites": [{"url": a, "title": "A"}, {"url": b}]}, environ_base=environ)
+    assert response.status_code == 200
+    first, second = response.get_json()["websites"]
+    assert first == {
+        "url": a, "title": "A", "keyPoints": ["point a"], "uniqueFeatures": ["only a"],
+        "contentStructure": {}, "advantages": ["fast"], "limitations": [],
+    }
+    assert second == {"url": b, "title": None, "error": "Failed to analyze this webpage"}
+
+
+def test_compare_multi_needs_two_distinct_sites():
+    client = app.app.test_client()
+    environ = {"REMOTE_ADDR": "10.0.17.2"}
+    response = client.post("/compare-multi", json={"urls": ["https://same.example", "https://same.example"]}, environ_base=environ)
+    assert response.status_code == 400
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("a2wsgi")
+
+import asgi
+
+
+def _slow_wsgi(environ, start_response):
+    time.sleep(0.5)
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"ok"]
+
+
+async def _get(app, path):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"testserver")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["status"], b"".join(m.get("body", b"") for m in messages[1:])
+
+
+def test_requests_run_concurrently(monkeypatch):
+    # Same thread pool as the real entry point, with a view that blocks its thread
+    monkeypatch.setattr(asgi.app, "app", _slow_wsgi)
+
+    async def scenario():
+        started = time.monotonic()
+        results = await asyncio.gather(*(_get(asgi.app, "/slow") for _ in range(4)))
+        return results, time.monotonic() - started
+
+    results, elapsed = asyncio.run(scenario())
+    assert results == [(200, b"ok")] * 4
+    assert elapsed < 1.5
+
+
+def test_serves_the_flask_app():
+    status, body = asyncio.run(_get(asgi.app, "/health"))
+    assert status == 200
+    assert b'"status"' in body
@@ -0,0 +1,70 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from bench import fakes, loadgen, report
+
+
+def test_percentile_is_nearest_rank():
+    values = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+    assert report.percentile(values, 50) == 0.5
+    assert report.percentile(values, 95) == 1.0
+    assert report.percentile([], 50) is None
+
+
+def test_summary_counts_errors_and_keeps_them_out_of_latencies():
+    samples = [("search", 200, 0.1, 0.05), ("search", 200, 0.3, 0.1), ("search", 503, 9.0, None)]
+    result = report.summarize(samples, elapsed=2.0)
+    search = result["endpoints"]["search"]
+    assert search["requests"] == 3
+    assert search["errors"] == 1
+    assert search["throughput_rps"] == 1.0
+    assert search["max_ms"] == 300.0
+    assert search["status"] == {"200": 2, "503": 1}
+    assert result["endpoints"]["all"]["requests"] == 3
+
+
+def test_compare_reports_change_against_a_baseline():
+    before = report.summarize([("search", 200, 0.2, None)], elapsed=1.0)
+    after = report.summarize([("search", 200, 0.1, None)], elapsed=1.0)
+    assert "-50%" in report.compare(after, before)
+
+
+def test_mix_rejects_unknown_endpoints():
+    assert loadgen.parse_mix("search=3, summary=1") == {"search": 3.0, "summary": 1.0}
+    with pytest.raises(ValueError):
+        loadgen.parse_mix("search=1,bogus=2")
+    with pytest.raises(ValueError):
+        loadgen.parse_mix("search=0")
+
+
+def test_fakes_serve_search_pages_and_chat():
+    config = fakes.FakeConfig(search_latency=0, page_latency=0, llm_latency=0, llm_tps=0, results=3)
+
+    async def scenario():
+        runner = await fakes.start(config, port=0)
+        try:
+            port = runner.addresses[0][1]
+            base = f"http://127.0.0.1:{port}"
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"{base}/search.json", params={"q": "heat pumps"}) as response:
+                    organic = (await response.json())["organic_results"]
+                async with session.get(organic[0]["link"]) as response:
+                    page_status = response.status
+                    etag = response.headers["ETag"]
+                async with session.get(organic[0]["link"], headers={"If-None-Match": etag}) as response:
+                    revalidated = response.status
+                chat = {"model": "m", "messages": [{"role": "user", "content": "Summarize this."}]}
+                async with session.post(f"{base}/openai/v1/chat/completions", json=chat) as response:
+                    completion = await response.json()
+            return organic, page_status, revalidated, completion
+        finally:
+            await runner.cleanup()
+
+    organic, page_status, revalidated, completion = asyncio.run(scenario())
+    assert [r["position"] for r in organic] == [1, 2, 3]
+    assert page_status == 200
+    assert revalidated == 304
+    assert completion["choices"][0]["message"]["content"]
+    assert completion["usage"]["total_tokens"] > 0
@@ -0,0 +1,95 @@
+import asyncio
+import sqlite3
+import threading
+
+import cache
+from cache import SQLiteBackend, TTLCache
+
+
+def _sqlite(tmp_path, **kwargs):
+    return SQLiteBackend(str(tmp_path / "cache.db"), **kwargs)
+
+
+def test_sqlite_round_trip_and_expiry(tmp_path):
+    store = TTLCache("roundtrip", ttl=60, backend=_sqlite(tmp_path))
+    store.set("small", {"a": 1})
+    store.set("large", "x" * 10000)
+    store.set("expired", 1, ttl=-1)
+    assert store.get("small") == {"a": 1}
+    assert store.get("large") == "x" * 10000
+    assert store.get("expired") is None
+    assert (store.hits, store.misses) == (2, 1)
+
+
+def test_entry_cap_evicts_least_recently_used(tmp_path):
+    store = TTLCache("capped", max_entries=10, backend=f"sqlite:///{tmp_path / 'cache.db'}")
+    backend = store._backend
+    for i in range(11):
+        store.set(f"k{i}", i)
+    # Over the cap: trimmed to the low-water mark, oldest first
+    assert len(backend) == 9
+    assert store.get("k0") is None and store.get("k1") is None
+    assert store.get("k10") == 10
+    assert store.evictions == 2
+
+
+def test_byte_cap_evicts(tmp_path):
+    backend = _sqlite(tmp_path, max_bytes=1000)
+    store = TTLCache("bytes", backend=backend)
+    for i in range(20):
+        store.set(f"k{i}", "y" * 90)
+    assert backend._measure(backend._conn())[1] <= 1000
+    assert store.get("k19") == "y" * 90
+
+
+def test_writes_do_not_scan_the_table_below_the_caps(tmp_path):
+    backend = _sqlite(tmp_path, max_entries=1000)
+    store = TTLCache("scans", backend=backend)
+    store.set("first", 1)
+    scans = []
+    measure = backend._measure
+    backend._measure = lambda conn: scans.append(1) or measure(conn)
+    for i in range(50):
+        store.set(f"k{i}", i)
+    assert scans == []
+
+
+class _LockedBackend(cache.CacheBackend):
+    thread_safe = True
+    blocking = True
+
+    def get(self, key):
+        raise sqlite3.OperationalError("database is locked")
+
+    def set(self, key, entry):
+        self.get(key)
+
+    delete = get
+
+    def __len__(self):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_backend_errors_are_misses_and_dropped_writes():
+    store = TTLCache("locked", backend=_LockedBackend())
+    assert store.get("k", "default") == "default"
+    assert store.contains("k") is False
+    store.set("k", "v")
+    store.delete("k")
+    stats = store.stats()
+    assert stats["misses"] == 1 and stats["errors"] == 5 and stats["size"] is None
+
+
+def test_async_calls_run_blocking_backends_off_the_loop(tmp_path):
+    backend = _sqlite(tmp_path)
+    threads = []
+    get = backend.get
+    backend.get = lambda key: threads.append(threading.current_thread()) or get(key)
+    store = TTLCache("offloop", backend=backend)
+
+    async def scenario():
+        await store.aset("k", "v")
+        return await store.aget("k"), await store.acontains("k")
+
+    assert asyncio.run(scenario()) == ("v", True)
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,54 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import content_cache
+from settings import PAGE_CACHE_TTL, PAGE_FRESH_TTL
+
+
+def test_max_age_wins_over_expires():
+    headers = {"Cache-Control": "public, max-age=120", "Expires": formatdate(time.time() + 9999, usegmt=True)}
+    assert content_cache.freshness_lifetime(headers) == 120
+
+
+def test_s_maxage_is_preferred_and_capped():
+    assert content_cache.freshness_lifetime({"Cache-Control": "s-maxage=30, max-age=60"}) == 30
+    assert content_cache.freshness_lifetime({"Cache-Control": f"max-age={PAGE_CACHE_TTL * 2}"}) == PAGE_CACHE_TTL
+
+
+def test_no_cache_and_bad_values_mean_revalidate():
+    assert content_cache.freshness_lifetime({"Cache-Control": "no-cache"}) == 0
+    assert content_cache.freshness_lifetime({"Cache-Control": 'max-age="soon"'}) == 0
+    assert content_cache.freshness_lifetime({"Expires": "not a date"}) == 0
+
+
+def test_expires_header():
+    lifetime = content_cache.freshness_lifetime({"Expires": formatdate(time.time() + 600, usegmt=True)})
+    assert 595 <= lifetime <= 600
+    assert content_cache.freshness_lifetime({"Expires": formatdate(time.time() - 600, usegmt=True)}) == 0
+
+
+def test_default_lifetime_without_validators():
+    assert content_cache.freshness_lifetime({}) == PAGE_FRESH_TTL
+
+
+def test_304_keeps_validators_from_the_previous_entry():
+    async def scenario():
+        await content_cache.put_page("https://example.com/a", "text", {"ETag": '"v1"', "Cache-Control": "max-age=60"})
+        previous = await content_cache.get_page("https://example.com/a")
+        await content_cache.put_page("https://example.com/a", "text", {}, previous=previous)
+        return await content_cache.get_page("https://example.com/a")
+
+    entry = asyncio.run(scenario())
+    assert entry["etag"] == '"v1"'
+    assert content_cache.is_fresh(entry)
+    assert content_cache.conditional_headers(entry) == {"If-None-Match": '"v1"'}
+
+
+def test_no_store_removes_the_page():
+    async def scenario():
+        await content_cache.put_page("https://example.com/b", "text")
+        await content_cache.put_page("https://example.com/b", "text", {"Cache-Control": "no-store"})
+        return await content_cache.get_page("https://example.com/b")
+
+    assert asyncio.run(scenario()) is None
@@ -0,0 +1,46 @@
+import extract
+
+
+def test_chrome_is_dropped_and_content_kept():
+    html = """
+    <html><body>
+      <header><a href="/">Site name</a> Menu</header>
+      <nav><a>Home</a></nav>
+      <main><h1>Title</h1><p>First paragraph.</p><script>var x = 1;</script></main>
+      <footer>Footer links</footer>
+    </body></html>
+    """
+    assert extract.extract_text(html) == "Title\nFirst paragraph."
+
+
+def test_form_wrapped_pages_keep_their_text():
+    html = """
+    <body><form id="aspnetForm" method="post">
+      <input type="hidden" name="__VIEWSTATE" value="abc">
+      <div><h1>Annual report</h1><p>Revenue grew 12% this year.</p></div>
+      <select><option>English</option></select>
+      <button>Search</button>
+    </form></body>
+    """
+    assert extract.extract_text(html) == "Annual report\nRevenue grew 12% this year."
+
+
+def test_article_headers_are_content():
+    html = """
+    <body>
+      <header>Site banner</header>
+      <article><header><h1>Article title</h1><p>By A. Writer</p></header><p>Body text.</p></article>
+    </body>
+    """
+    assert extract.extract_text(html) == "Article title\nBy A. Writer\nBody text."
+
+
+def test_unclosed_elements_inside_a_skipped_subtree():
+    html = "<body><aside><ul><li>Related<li>Links</aside><p>Kept text</p></body>"
+    assert extract.extract_text(html) == "Kept text"
+
+
+def test_charset_sniffing():
+    body = '<meta charset="windows-1252"><p>caf\xe9</p>'.encode("cp1252")
+    assert extract.extract_from_bytes(body, "text/html") == "café"
+    assert extract.sniff_charset(b"\xef\xbb\xbfhello") == "utf-8-sig"
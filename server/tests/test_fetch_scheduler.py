@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+import pytest
+
+import fetch_scheduler
+from fetch_scheduler import FetchBlocked, FetchScheduler
+
+
+@pytest.fixture
+def fake_fetch(monkeypatch):
+    """Replace the HTTP download with a sleep; records (url, timeout, start, end)."""
+    monkeypatch.setattr(fetch_scheduler, "FETCH_RESPECT_ROBOTS", False)
+    log = []
+    delays = {}
+
+    async def fetch_bytes(url, headers=None, timeout=15, max_bytes=None, check_headers=None):
+        started = time.monotonic()
+        delay = delays.get(url, 0.05)
+        if delay is None:
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(delay)
+        log.append((url, timeout, started, time.monotonic()))
+        return b"page"
+
+    monkeypatch.setattr(fetch_scheduler.http_client, "fetch_bytes", fetch_bytes)
+    return log, delays
+
+
+def _peak(log):
+    events = sorted([(start, 1) for _, _, start, _ in log] + [(end, -1) for _, _, _, end in log])
+    peak = current = 0
+    for _, step in events:
+        current += step
+        peak = max(peak, current)
+    return peak
+
+
+def _fetch_all(scheduler, urls):
+    async def scenario():
+        return await asyncio.gather(*(scheduler.fetch(url) for url in urls))
+    return asyncio.run(scenario())
+
+
+def test_requests_to_one_host_are_capped_and_spaced(fake_fetch):
+    log, _ = fake_fetch
+    scheduler = FetchScheduler(per_host=2, min_interval=0.02)
+    assert _fetch_all(scheduler, [f"https://one.example/{i}" for i in range(4)]) == [b"page"] * 4
+    assert _peak(log) <= 2
+    starts = sorted(start for _, _, start, _ in log)
+    assert all(b - a >= 0.015 for a, b in zip(starts, starts[1:]))
+    assert scheduler.counters["fetches"] == 4
+    assert scheduler.stats()["active"] == 0 and scheduler.stats()["queued"] == 0
+
+
+def test_different_hosts_share_the_global_limit(fake_fetch):
+    log, _ = fake_fetch
+    scheduler = FetchScheduler(max_concurrency=3, per_host=2, min_interval=0)
+    _fetch_all(scheduler, [f"https://host{i}.example/" for i in range(6)])
+    assert _peak(log) == 3
+
+
+def test_a_host_that_keeps_stalling_gets_the_short_timeout(fake_fetch):
+    log, delays = fake_fetch
+    scheduler = FetchScheduler(min_interval=0, slow_threshold=0.01, slow_strikes=2, slow_timeout=2, slow_penalty=60)
+    slow = "https://slow.example/page"
+    delays[slow] = 0.02
+
+    async def scenario():
+        await scheduler.fetch(slow, timeout=10)
+        assert not scheduler.is_slow("slow.example")
+        await scheduler.fetch(slow, timeout=10)
+        assert scheduler.is_slow("slow.example")
+        delays[slow] = 0
+        await scheduler.fetch(slow, timeout=10)
+
+    asyncio.run(scenario())
+    assert [timeout for _, timeout, _, _ in log] == [10, 10, 2]
+    assert scheduler.counters["slow_hosts"] == 1
+    # Other hosts keep their normal timeout
+    assert scheduler.timeout_for("fast.example", 10) == 10
+
+
+def test_timeouts_count_as_strikes(fake_fetch):
+    _, delays = fake_fetch
+    scheduler = FetchScheduler(min_interval=0, slow_strikes=1)
+    delays["https://stall.example/"] = None
+    with pytest.raises(asyncio.TimeoutError):
+        _fetch_all(scheduler, ["https://stall.example/"])
+    assert scheduler.counters["timeouts"] == 1
+    assert scheduler.is_slow("stall.example")
+
+
+def test_robots_rules_are_cached_per_origin(monkeypatch):
+    monkeypatch.setattr(fetch_scheduler, "_robots", {})
+    loads = []
+
+    async def get_status_text(url, timeout=None):
+        loads.append(url)
+        return 200, "User-agent: *\nDisallow: /private\n"
+
+    monkeypatch.setattr(fetch_scheduler.http_client, "get_status_text", get_status_text)
+
+    async def scenario():
+        return [
+            await fetch_scheduler.robots_allowed("https://robots.example/public"),
+            await fetch_scheduler.robots_allowed("https://ROBOTS.example/private/page"),
+        ]
+
+    assert asyncio.run(scenario()) == [True, False]
+    assert loads == ["https://robots.example/robots.txt"]
+
+
+@pytest.mark.parametrize("status, allowed", [(404, True), (500, True), (403, False)])
+def test_robots_errors_follow_the_stdlib_rules(monkeypatch, status, allowed):
+    monkeypatch.setattr(fetch_scheduler, "_robots", {})
+
+    async def get_status_text(url, timeout=None):
+        return status, ""
+
+    monkeypatch.setattr(fetch_scheduler.http_client, "get_status_text", get_status_text)
+    assert asyncio.run(fetch_scheduler.robots_allowed("https://errors.example/page")) is allowed
+
+
+def test_disallowed_urls_are_blocked_before_fetching(monkeypatch, fake_fetch):
+    log, _ = fake_fetch
+    monkeypatch.setattr(fetch_scheduler, "FETCH_RESPECT_ROBOTS", True)
+
+    async def robots_allowed(url):
+        return False
+
+    monkeypatch.setattr(fetch_scheduler, "robots_allowed", robots_allowed)
+    scheduler = FetchScheduler()
+    with pytest.raises(FetchBlocked):
+        _fetch_all(scheduler, ["https://blocked.example/"])
+    assert log == []
+    assert scheduler.counters["robots_blocked"] == 1
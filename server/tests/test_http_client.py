@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+import http_client
+import runtime
+
+
+@pytest.fixture
+def server():
+    """A local site on the runtime loop; yields (base url, peer ports seen)."""
+    peers = []
+
+    async def page(request):
+        peers.append(request.transport.get_extra_info("peername")[1])
+        return web.Response(text="x" * 10000)
+
+    async def data(request):
+        peers.append(request.transport.get_extra_info("peername")[1])
+        return web.json_response({"q": request.query.get("q")})
+
+    async def start():
+        app = web.Application()
+        app.router.add_get("/page", page)
+        app.router.add_get("/data", data)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        return runner, site._server.sockets[0].getsockname()[1]
+
+    runner, port = runtime.run_sync(start(), timeout=5)
+    yield f"http://127.0.0.1:{port}", peers
+    runtime.run_sync(runner.cleanup(), timeout=5)
+
+
+def test_calls_from_any_loop_share_one_pooled_connection(server):
+    base, peers = server
+
+    async def fetch():
+        return await http_client.get_json(f"{base}/data", params={"q": "heat pumps"})
+
+    # Separate event loops, as separate request threads would have
+    assert asyncio.run(fetch()) == {"q": "heat pumps"}
+    assert asyncio.run(fetch()) == {"q": "heat pumps"}
+    assert len(peers) == 2
+    assert peers[0] == peers[1]
+
+
+def test_fetch_bytes_stops_at_max_bytes(server):
+    base, _ = server
+    body, headers = asyncio.run(http_client.fetch_bytes(f"{base}/page", max_bytes=1000))
+    assert body == b"x" * 1000
+    assert headers["Content-Type"].startswith("text/plain")
+
+
+def test_shutdown_closes_the_session_and_the_next_call_reopens_it(server):
+    base, _ = server
+    asyncio.run(http_client.get_text(f"{base}/page"))
+    session = http_client._session
+    runtime.run_sync(http_client.close(), timeout=5)
+    assert session.closed and http_client._session is None
+    assert asyncio.run(http_client.get_status_text(f"{base}/page"))[0] == 200
+    assert http_client._session is not session
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import app
+import jobs
+import runtime
+
+
+def _queue(run, **kwargs):
+    kwargs.setdefault("workers", 1)
+    kwargs.setdefault("max_queue", 4)
+    return jobs.JobQueue("test", run, **kwargs)
+
+
+def test_swapped_pair_joins_the_same_job():
+    calls = []
+
+    async def run(url1, url2):
+        calls.append((url1, url2))
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    queue = _queue(run)
+
+    async def scenario():
+        first, created = await queue.submit(jobs.pair_id("a", "b"), ("a", "b"))
+        second, joined = await queue.submit(jobs.pair_id("b", "a"), ("b", "a"))
+        return first, created, second, joined
+
+    first, created, second, joined = runtime.run_sync(scenario())
+    assert created and not joined
+    assert first["id"] == second["id"]
+    done = runtime.run_sync(queue.wait_done(first["id"], 5))
+    assert done["status"] == jobs.DONE
+    assert calls == [("a", "b")]
+    assert queue.counters["deduplicated"] == 1
+
+
+def test_long_poll_returns_as_soon_as_the_job_finishes():
+    async def run(*_args):
+        await asyncio.sleep(0.2)
+        return {"ok": True}
+
+    queue = _queue(run)
+    record, _ = runtime.run_sync(queue.submit("job", ()))
+    assert record["status"] not in jobs.TERMINAL
+
+    started = time.monotonic()
+    done = runtime.run_sync(queue.wait_done("job", 10))
+    assert done["status"] == jobs.DONE
+    assert time.monotonic() - started < 5
+
+
+def test_long_poll_gives_up_after_its_timeout():
+    async def run(*_args):
+        await asyncio.sleep(5)
+        return {"ok": True}
+
+    queue = _queue(run)
+    runtime.run_sync(queue.submit("slow", ()))
+    started = time.monotonic()
+    record = runtime.run_sync(queue.wait_done("slow", 0.2))
+    assert record["status"] not in jobs.TERMINAL
+    assert time.monotonic() - started < 2
+    queue._tasks["slow"].get_loop().call_soon_threadsafe(queue._tasks["slow"].cancel)
+
+
+def test_full_queue_rejects_new_jobs():
+    async def run(*_args):
+        await asyncio.sleep(5)
+        return {"ok": True}
+
+    queue = _queue(run, workers=1, max_queue=0)
+    runtime.run_sync(queue.submit("one", ()))
+    try:
+        runtime.run_sync(queue.submit("two", ()))
+    except jobs.QueueFull:
+        pass
+    else:
+        raise AssertionError("expected QueueFull")
+    assert queue.counters["rejected"] == 1
+    queue._tasks["one"].get_loop().call_soon_threadsafe(queue._tasks["one"].cancel)
+
+
+def _app_queue(monkeypatch, run, **kwargs):
+    queue = _queue(run, **kwargs)
+    monkeypatch.setattr(app, "compare_jobs", queue)
+    monkeypatch.setattr(app.limiter, "enabled", False)
+    return queue
+
+
+def test_full_queue_is_a_503_with_retry_after(monkeypatch):
+    async def run(*_args):
+        await asyncio.sleep(5)
+        return {"ok": True}
+
+    queue = _app_queue(monkeypatch, run, workers=1, max_queue=0)
+    client = app.app.test_client()
+    first = client.post("/compare-jobs", json={"url1": "https://a.example", "url2": "https://b.example"})
+    assert first.status_code == 202
+    second = client.post("/compare-jobs", json={"url1": "https://c.example", "url2": "https://d.example"})
+    assert second.status_code == 503
+    assert "Retry-After" in second.headers
+    for task in list(queue._tasks.values()):
+        task.get_loop().call_soon_threadsafe(task.cancel)
+
+
+def test_unknown_and_expired_jobs_are_404(monkeypatch):
+    async def run(*_args):
+        return {"ok": True}
+
+    queue = _app_queue(monkeypatch, run, ttl=0.3)
+    client = app.app.test_client()
+    assert client.get("/compare-jobs/nope").status_code == 404
+
+    record, _ = runtime.run_sync(queue.submit("short", ()))
+    runtime.run_sync(queue.wait_done("short", 5))
+    assert runtime.run_sync(queue.get("short"))["status"] == jobs.DONE
+    time.sleep(0.4)
+    assert client.get("/compare-jobs/short").status_code == 404
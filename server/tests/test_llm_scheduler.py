@@ -0,0 +1,218 @@
+import asyncio
+
+import pytest
+
+from llm_scheduler import BACKGROUND, INTERACTIVE, LLMOverloaded, LLMScheduler, TokenBucket
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)  # one token per second
+    assert bucket.wait_time(60) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1, abs=0.05)
+    # Larger than the bucket: wait for a full bucket, not forever
+    assert bucket.wait_time(600) == pytest.approx(60, abs=0.1)
+
+
+def test_token_bucket_refunds_unused_tokens():
+    bucket = TokenBucket(100)
+    bucket.take(80)
+    bucket.give(50)
+    assert bucket.tokens == pytest.approx(70, abs=0.1)
+    bucket.give(1000)
+    assert bucket.tokens == 100
+
+
+def test_unlimited_bucket_never_waits():
+    bucket = TokenBucket(0)
+    bucket.take(10 ** 6)
+    assert bucket.wait_time(10 ** 6) == 0
+
+
+def _admit_in_order(scheduler, requests):
+    """Queue (client, priority) requests behind a held slot; return the order they are admitted in."""
+
+    async def scenario():
+        order = []
+        held = await scheduler.acquire(1)
+
+        async def call(client, priority):
+            waiter = await scheduler.acquire(1, priority, client)
+            order.append(client)
+            scheduler.release(waiter, 1)
+
+        tasks = [asyncio.ensure_future(call(client, priority)) for client, priority in requests]
+        await asyncio.sleep(0)
+        scheduler.release(held, 1)
+        await asyncio.gather(*tasks)
+        return order
+
+    return asyncio.run(scenario())
+
+
+def test_clients_are_served_round_robin():
+    scheduler = LLMScheduler(max_concurrency=1, interactive_reserve=0)
+    requests = [("a", INTERACTIVE)] * 3 + [("b", INTERACTIVE)] * 2
+    assert _admit_in_order(scheduler, requests) == ["a", "b", "a", "b", "a"]
+
+
+def test_interactive_work_goes_first():
+    scheduler = LLMScheduler(max_concurrency=1, interactive_reserve=0)
+    requests = [("bg", BACKGROUND), ("bg", BACKGROUND), ("user", INTERACTIVE)]
+    assert _admit_in_order(scheduler, requests) == ["user", "bg", "bg"]
+
+
+def test_background_work_cannot_use_reserved_slots():
+    scheduler = LLMScheduler(max_concurrency=2, interactive_reserve=1, queue_timeout=0.05)
+
+    async def scenario():
+        await scheduler.acquire(1, BACKGROUND, "bg")
+        with pytest.raises(LLMOverloaded):
+            await scheduler.acquire(1, BACKGROUND, "bg")
+        # The reserved slot is still there for a user
+        await scheduler.acquire(1, INTERACTIVE, "user")
+
+    asyncio.run(scenario())
+
+
+def test_per_client_queue_limit_rejects_with_429():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue_per_client=1, queue_timeout=1)
+
+    async def scenario():
+        await scheduler.acquire(1, INTERACTIVE, "a")
+        queued = asyncio.ensure_future(scheduler.acquire(1, INTERACTIVE, "a"))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMOverloaded) as exc:
+            await scheduler.acquire(1, INTERACTIVE, "a")
+        queued.cancel()
+        return exc.value.status
+
+    assert asyncio.run(scenario()) == 429
+
+
+def test_token_budget_delays_admission():
+    scheduler = LLMScheduler(max_concurrency=4, tpm=600, queue_timeout=0.05)  # 10 tokens/s
+
+    async def scenario():
+        await scheduler.acquire(600)
+        with pytest.raises(LLMOverloaded):
+            await scheduler.acquire(100)
+
+    asyncio.run(scenario())
+    assert scheduler.counters["timed_out"] == 1
+
+
+def test_models_have_separate_budgets():
+    scheduler = LLMScheduler(max_concurrency=4, model_limits={"big": (0, 600), "small": (0, 6000)}, queue_timeout=0.05)
+
+    async def scenario():
+        await scheduler.acquire(600, model="big")
+        with pytest.raises(LLMOverloaded):
+            await scheduler.acquire(100, model="big")
+        # The other model's budget is untouched
+        await scheduler.acquire(100, model="small")
+
+    asyncio.run(scenario())
+
+
+def test_throttled_model_does_not_block_other_models():
+    scheduler = LLMScheduler(max_concurrency=4, model_limits={"big": (0, 60), "small": (0, 0)}, queue_timeout=1)
+
+    async def scenario():
+        await scheduler.acquire(60, model="big")
+        throttled = asyncio.ensure_future(scheduler.acquire(60, model="big"))
+        await asyncio.sleep(0)
+        # Queued behind the throttled call, same client, but for another model
+        await asyncio.wait_for(scheduler.acquire(1, model="small"), 0.1)
+        assert not throttled.done()
+        throttled.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_provider_429_pauses_only_that_model():
+    scheduler = LLMScheduler(max_concurrency=4, queue_timeout=0.05)
+    error = type("RateLimited", (Exception,), {"status_code": 429})()
+
+    async def scenario():
+        scheduler.note_error(error, "big")
+        with pytest.raises(LLMOverloaded):
+            await scheduler.acquire(1, model="big")
+        await scheduler.acquire(1, model="small")
+
+    asyncio.run(scenario())
+
+
+def test_background_work_leaves_the_interactive_token_share():
+    scheduler = LLMScheduler(max_concurrency=4, tpm=600, interactive_token_share=0.5, queue_timeout=0.05)
+
+    async def scenario():
+        await scheduler.acquire(300, BACKGROUND, "bg")
+        # The other half of the budget is only for users
+        with pytest.raises(LLMOverloaded):
+            await scheduler.acquire(100, BACKGROUND, "bg")
+        await scheduler.acquire(250, INTERACTIVE, "user")
+
+    asyncio.run(scenario())
+
+
+def test_promoted_background_call_moves_to_the_interactive_queue():
+    scheduler = LLMScheduler(max_concurrency=1, interactive_reserve=0)
+    flight = type("Flight", (), {"priority": BACKGROUND, "parent": None})()
+
+    async def scenario():
+        order = []
+        held = await scheduler.acquire(1)
+
+        async def call(name, priority, flight=None):
+            waiter = await scheduler.acquire(1, priority, name, flight=flight)
+            order.append(name)
+            scheduler.release(waiter, 1)
+
+        tasks = [
+            asyncio.ensure_future(call("other_bg", BACKGROUND)),
+            asyncio.ensure_future(call("joined", BACKGROUND, flight)),
+            asyncio.ensure_future(call("user", INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        # An interactive caller joined the flight
+        flight.priority = INTERACTIVE
+        scheduler.promote()
+        scheduler.release(held, 1)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["user", "joined", "other_bg"]
+    assert scheduler.counters["promoted"] == 1
+    assert scheduler.queued[BACKGROUND] == scheduler.queued[INTERACTIVE] == 0
+
+
+def test_guard_wraps_only_the_admitted_provider_call(monkeypatch):
+    import llm_scheduler
+
+    scheduler = LLMScheduler(max_concurrency=1, interactive_reserve=0)
+    monkeypatch.setattr(llm_scheduler, "scheduler", scheduler)
+    events = []
+
+    class Chain:
+        async def ainvoke(self, inputs):
+            events.append("provider")
+            return "ok"
+
+    async def guard(attempt):
+        events.append(f"guard active={scheduler.active}")
+        return await attempt()
+
+    async def scenario():
+        held = await scheduler.acquire(1)
+        call = asyncio.ensure_future(
+            llm_scheduler._invoke(Chain(), {}, 1, INTERACTIVE, "-", None, None, guard)
+        )
+        await asyncio.sleep(0.01)
+        # Still queued: the guard (and its latency clock) hasn't started
+        assert events == []
+        scheduler.release(held)
+        return await call
+
+    assert asyncio.run(scenario()) == "ok"
+    assert events == ["guard active=1", "provider"]
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from mapreduce import map_chunks, reduce_tree
+
+
+def test_reduce_tree_merges_level_by_level():
+    calls = []
+
+    async def merge(group):
+        calls.append(list(group))
+        return "(" + "+".join(group) + ")"
+
+    result = asyncio.run(reduce_tree(list("abcde"), merge, fanin=2))
+    assert result == "(((a+b)+(c+d))+e)"
+    # Odd group out passes through without a merge call
+    assert ["e"] not in calls
+
+
+def test_reduce_tree_keeps_originals_when_a_merge_fails():
+    async def merge(group):
+        return None if "b" in group else "+".join(group)
+
+    assert asyncio.run(reduce_tree(["a", "b", "c", "d"], merge, fanin=2)) == "a\n\nb+c+d"
+
+
+def test_reduce_tree_single_and_empty_inputs_cost_nothing():
+    async def merge(group):
+        raise AssertionError("no merge expected")
+
+    assert asyncio.run(reduce_tree(["only", "", None], merge)) == "only"
+    assert asyncio.run(reduce_tree([], merge)) is None
+
+
+def test_map_chunks_keeps_order_and_skips_failures():
+    async def work(chunk):
+        await asyncio.sleep(0.01 * (3 - chunk))
+        if chunk == 1:
+            raise ValueError("bad chunk")
+        return f"r{chunk}"
+
+    assert asyncio.run(map_chunks([0, 1, 2], work, concurrency=3)) == ["r0", "r2"]
+
+
+def test_map_chunks_raises_when_everything_fails():
+    async def work(chunk):
+        raise ValueError(chunk)
+
+    with pytest.raises(ValueError):
+        asyncio.run(map_chunks([1, 2], work))
+
+
+def test_map_chunks_returns_partial_results_at_the_deadline():
+    async def work(chunk):
+        await asyncio.sleep(0 if chunk == "fast" else 5)
+        return chunk
+
+    assert asyncio.run(map_chunks(["fast", "slow"], work, deadline=0.05)) == ["fast"]
@@ -0,0 +1,46 @@
+import contextvars
+
+import app
+import metrics
+import runtime
+
+
+def _series(histogram, **labels):
+    return histogram._values.get(histogram._key(labels))
+
+
+def test_stage_is_labelled_with_the_current_endpoint():
+    def observe():
+        metrics.current_endpoint.set("/test-endpoint")
+        metrics.stage_seconds.observe(0.01, stage="test_stage")
+
+    contextvars.copy_context().run(observe)
+    assert _series(metrics.stage_seconds, endpoint="/test-endpoint", stage="test_stage")[2] == 1
+
+
+def test_endpoint_follows_work_onto_the_runtime_loop():
+    async def observe():
+        metrics.stage_seconds.observe(0.01, stage="test_loop_stage")
+
+    def scenario():
+        metrics.current_endpoint.set("/test-loop")
+        runtime.run_sync(observe(), timeout=5)
+
+    contextvars.copy_context().run(scenario)
+    assert _series(metrics.stage_seconds, endpoint="/test-loop", stage="test_loop_stage")[2] == 1
+
+
+def test_requests_set_the_endpoint_from_their_route_pattern():
+    def scenario():
+        with app.app.test_request_context("/compare-jobs/abc123"):
+            app.app.preprocess_request()
+            return metrics.current_endpoint.get()
+
+    assert contextvars.copy_context().run(scenario) == "/compare-jobs/<job_id>"
+
+
+def test_request_latency_is_exported_by_route_pattern():
+    client = app.app.test_client()
+    client.get("/health")
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'sixthsense_request_seconds_count{endpoint="/health",method="GET",status="200"}' in body
@@ -0,0 +1,34 @@
+import asyncio
+
+import models
+from settings import LLM_FALLBACK_TIER
+
+
+class _Message:
+    def __init__(self, content):
+        self.content = content
+        self.usage_metadata = {"input_tokens": 10, "output_tokens": 5}
+
+
+def _fallback_count(task, tier, reason):
+    return models.fallbacks._values.get((task, tier, reason), 0)
+
+
+def test_validation_fallback_is_counted(monkeypatch):
+    answers = {"small": _Message("bad"), LLM_FALLBACK_TIER: _Message("good answer")}
+
+    async def invoke_tier(task, tier, template, inputs, tokens, fallback=None):
+        models._record(task, tier, 0, answers[tier], fallback=fallback)
+        return answers[tier]
+
+    monkeypatch.setattr(models, "_invoke_tier", invoke_tier)
+    monkeypatch.setitem(models.LLM_TASK_TIERS, "test_task", "small")
+    before = _fallback_count("test_task", "small", "validation")
+
+    result = asyncio.run(models.ainvoke("test_task", "{x}", {"x": 1}, 10, validate=lambda text: text == "good answer"))
+
+    assert result.content == "good answer"
+    assert _fallback_count("test_task", "small", "validation") == before + 1
+    report = models.stats()["test_task"]
+    assert report[models.LLM_TIER_MODELS["small"]]["fallbacks"] == 1
+    assert report[models.LLM_TIER_MODELS[LLM_FALLBACK_TIER]]["calls"] == 1
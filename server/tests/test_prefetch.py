@@ -0,0 +1,65 @@
+import asyncio
+
+import llm_scheduler
+import prefetch
+import runtime
+
+
+def _run_batch(monkeypatch, warm_page, urls, budget=1000):
+    monkeypatch.setattr(prefetch, "warm_page", warm_page)
+    monkeypatch.setattr(prefetch, "PREFETCH_TOKEN_BUDGET", budget)
+    runtime.run_sync(prefetch._prefetch_batch(urls, None), timeout=5)
+
+
+def test_prefetch_runs_at_background_priority(monkeypatch):
+    priorities = []
+
+    async def warm_page(url, summarize=True, reserve_tokens=None, query=None):
+        priorities.append(llm_scheduler.current_priority.get())
+        return True
+
+    _run_batch(monkeypatch, warm_page, ["https://p1.example", "https://p2.example"])
+    assert priorities == [llm_scheduler.BACKGROUND] * 2
+
+
+def test_spent_budget_cancels_the_rest_of_the_batch(monkeypatch):
+    monkeypatch.setattr(prefetch, "counters", prefetch.Counter())
+    cancelled = []
+
+    async def warm_page(url, summarize=True, reserve_tokens=None, query=None):
+        if url.endswith("big"):
+            # Wants more than the whole budget
+            return reserve_tokens(5000)
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(url)
+            raise
+        return True
+
+    _run_batch(monkeypatch, warm_page, ["https://slow.example", "https://big"], budget=1000)
+    assert cancelled == ["https://slow.example"]
+    assert prefetch.counters["cancelled"] == 2
+    assert prefetch.counters["completed"] == 0
+
+
+def test_a_click_on_a_prefetched_url_counts_as_used(monkeypatch):
+    monkeypatch.setattr(prefetch, "counters", prefetch.Counter())
+
+    async def warm_page(url, summarize=True, reserve_tokens=None, query=None):
+        return True
+
+    _run_batch(monkeypatch, warm_page, ["https://used.example"])
+    prefetch.note_request("https://used.example")
+    prefetch.note_request("https://used.example")
+    prefetch.note_request("https://never-prefetched.example")
+    assert prefetch.counters["completed"] == 1
+    assert prefetch.counters["used"] == 1
+
+
+def test_schedule_does_nothing_when_disabled(monkeypatch):
+    monkeypatch.setattr(prefetch, "counters", prefetch.Counter())
+    monkeypatch.setattr(prefetch, "PREFETCH_ENABLED", False)
+    prefetch.schedule(["https://a.example"], "query")
+    assert not prefetch._batches
+    assert prefetch.counters["scheduled"] == 0
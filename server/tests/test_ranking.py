@@ -0,0 +1,88 @@
+import ranking
+
+
+def test_boilerplate_and_repeated_lines_are_dropped():
+    text = "\n".join([
+        "Subscribe to our newsletter",
+        "Solar panels convert sunlight into electricity using photovoltaic cells.",
+        "Share this",
+        "Solar panels convert sunlight into electricity using photovoltaic cells.",
+        "Yes",
+        "Yes",
+    ])
+    lines, dropped = ranking.clean_lines(text)
+    assert lines == [
+        "Solar panels convert sunlight into electricity using photovoltaic cells.",
+        "Yes",
+        "Yes",
+    ]
+    assert dropped["boilerplate"] > 0 and dropped["duplicate"] > 0
+
+
+def test_content_that_mentions_chrome_words_is_kept():
+    for line in ("How to sign up for Medicare", "Log in with OAuth", "Step 3: subscribe to the webhook events"):
+        assert not ranking.is_boilerplate(line), line
+    for line in ("Read more", "Copyright 2024 Acme Inc. All rights reserved.", "Skip to main content"):
+        assert ranking.is_boilerplate(line), line
+
+
+def test_boilerplate_is_only_dropped_for_a_query():
+    text = "Sign up\nA paragraph about the topic at hand."
+    assert ranking.select(text) == text
+    assert ranking.select(text, "topic") == "A paragraph about the topic at hand."
+
+
+def test_passages_respect_size_and_keep_order():
+    lines = [f"Line number {i} with some words in it." for i in range(40)]
+    passages = ranking.split_passages(lines, size=200)
+    assert all(len(p) <= 200 for p in passages)
+    assert "\n".join(passages).splitlines() == lines
+
+
+def test_long_lines_are_split_at_sentences():
+    line = " ".join(f"Sentence {i} is here." for i in range(50))
+    pieces = ranking._split_long(line, 100)
+    assert all(len(p) <= 100 for p in pieces)
+    assert " ".join(pieces) == line
+
+
+def test_bm25_prefers_passages_about_the_query():
+    passages = [
+        "General introduction to the company and its history.",
+        "Battery storage lets you keep solar power for the night. Battery sizes vary.",
+        "Contact information and office hours.",
+    ]
+    scores = ranking.bm25(passages, "best solar battery")
+    assert scores.argmax() == 1
+    assert scores[0] == 0 and scores[2] == 0
+
+
+def test_select_packs_best_passages_into_budget_in_page_order():
+    # Each section is long enough to be a passage of its own
+    intro = "Acme guide to home energy. " * 20
+    filler = [f"Unrelated section {i} about gardening and lawn care tips. " * 12 for i in range(6)]
+    target = "Heat pump efficiency depends on outdoor temperature; heat pump COP drops in cold weather. " * 4
+    text = "\n".join([intro, *filler[:3], target, *filler[3:]])
+    selected = ranking.select(text, "heat pump efficiency", budget=250)
+    assert "Heat pump efficiency" in selected
+    assert selected.startswith("Acme guide")
+    assert "gardening" not in selected
+    assert ranking.estimate_tokens(selected) <= 250 + 10
+
+
+def test_select_without_query_keeps_everything_but_noise():
+    text = "First paragraph of real content here.\n\nSecond paragraph of real content here."
+    assert ranking.select(text) == "First paragraph of real content here.\nSecond paragraph of real content here."
+
+
+def test_bm25_memory_does_not_scale_with_the_longest_token():
+    import tracemalloc
+
+    passages = [f"solar panel words {i} " * 50 + "A" * 200000 for i in range(5)]
+    tracemalloc.start()
+    scores = ranking.bm25(passages, "solar")
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert (scores > 0).all()
+    # A fixed-width unicode array would need words x 200000 x 4 bytes (~200MB)
+    assert peak < 20 * 1024 * 1024
@@ -0,0 +1,66 @@
+from limits.storage import storage_from_string
+
+import ratelimit
+
+# `limits` key for a 100-per-minute limit
+KEY = "LIMITER/127.0.0.1/llm-quota/100/1/minute"
+
+
+def _storage(batch=10):
+    return ratelimit.BatchedStorage("batched+memory://", batch=batch)
+
+
+def test_hits_are_counted_locally_within_a_reservation():
+    storage = _storage()
+    assert [storage.incr(KEY, 60) for _ in range(10)] == list(range(1, 11))
+    # One round trip reserved all ten
+    assert storage.inner.get(KEY) == 10
+    assert storage.incr(KEY, 60) == 11
+    assert storage.inner.get(KEY) == 20
+
+
+def test_workers_sharing_a_store_never_undercount():
+    inner = storage_from_string("memory://")
+    workers = [_storage(), _storage()]
+    for worker in workers:
+        worker.inner = inner
+    counts = [worker.incr(KEY, 60) for _ in range(5) for worker in workers]
+    # Positions are unique, and each worker's reservation is charged up front
+    assert len(set(counts)) == len(counts)
+    assert inner.get(KEY) == 20
+
+
+def test_weighted_hits_spend_several_positions():
+    storage = _storage()
+    assert storage.incr(KEY, 60, amount=5) == 5
+    assert storage.incr(KEY, 60, amount=5) == 10
+    assert storage.incr(KEY, 60, amount=5) == 15
+
+
+def test_small_limits_are_not_batched():
+    storage = _storage()
+    key = "LIMITER/127.0.0.1/search/10/1/minute"
+    assert storage.batch_size(key) == 1
+    storage.incr(key, 60)
+    assert storage.inner.get(key) == 1
+
+
+def test_clear_drops_the_local_reservation():
+    storage = _storage()
+    storage.incr(KEY, 60)
+    storage.clear(KEY)
+    assert storage.incr(KEY, 60) == 1
+
+
+def test_sqlite_storage_counts_across_connections(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'limits.db'}"
+    first, second = ratelimit.SQLiteStorage(uri), ratelimit.SQLiteStorage(uri)
+    first.incr("k", 60)
+    second.incr("k", 60, amount=2)
+    assert first.get("k") == 3
+
+
+def test_storage_uri_wraps_shared_stores_only():
+    assert ratelimit.storage_uri("sqlite:///x.db", batch=10) == "batched+sqlite:///x.db"
+    assert ratelimit.storage_uri("memory://", batch=10) == "memory://"
+    assert ratelimit.storage_uri("redis://h:6379", batch=1) == "redis://h:6379"
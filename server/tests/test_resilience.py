@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+import resilience
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, RetryBudget, Upstream
+
+
+class Unavailable(Exception):
+    status_code = 503
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+@pytest.fixture(autouse=True)
+def _fast(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRY_BACKOFF", 0)
+    monkeypatch.setattr(resilience, "HEDGE_MIN_DELAY", 0.01)
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker("test", failures=2, reset_timeout=0.05)
+    breaker.before_call()
+    breaker.on_failure(Unavailable())
+    # Our own bad requests don't count against the upstream
+    breaker.on_failure(BadRequest())
+    assert breaker.state == CLOSED
+    breaker.on_failure(Unavailable())
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    asyncio.run(asyncio.sleep(0.06))
+    assert breaker.current_state() == HALF_OPEN
+    breaker.before_call()
+    # Only one probe at a time
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    breaker.on_success()
+    assert breaker.state == CLOSED
+    assert dict(breaker.transitions) == {OPEN: 1, HALF_OPEN: 1, CLOSED: 1}
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker("test", failures=1, reset_timeout=0.05)
+    breaker.on_failure(Unavailable())
+    asyncio.run(asyncio.sleep(0.06))
+    breaker.before_call()
+    breaker.on_failure(Unavailable())
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+
+def test_precheck_leaves_the_half_open_probe_to_the_call():
+    up = Upstream("test-precheck")
+    up.breaker.threshold = 1
+    up.breaker.on_failure(Unavailable())
+    with pytest.raises(CircuitOpen):
+        up.precheck()
+    up.breaker.opened_at -= up.breaker.reset_timeout
+    up.precheck()
+    assert asyncio.run(up.call(lambda: asyncio.sleep(0, "ok"))) == "ok"
+    assert up.breaker.state == CLOSED
+
+
+def test_retry_budget_allows_ratio_of_calls_plus_minimum():
+    budget = RetryBudget(ratio=0.5, minimum=1)
+    for _ in range(4):
+        budget.record_call()
+    assert [budget.try_spend() for _ in range(4)] == [True, True, True, False]
+
+
+def test_transient_errors_are_retried_until_the_budget_runs_out():
+    up = Upstream("test-retry", max_retries=3)
+    up.budget = RetryBudget(ratio=0, minimum=1)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        raise Unavailable()
+
+    with pytest.raises(Unavailable):
+        asyncio.run(up.call(flaky))
+    assert len(attempts) == 2
+    assert up.counters["retries"] == 1
+    assert up.counters["retries_denied"] == 1
+
+
+def test_non_transient_errors_are_not_retried():
+    up = Upstream("test-no-retry", max_retries=3)
+    attempts = []
+
+    async def bad():
+        attempts.append(1)
+        raise BadRequest()
+
+    with pytest.raises(BadRequest):
+        asyncio.run(up.call(bad))
+    assert attempts == [1]
+
+
+def _hedging_upstream(name):
+    up = Upstream(name, hedge=True)
+    for _ in range(resilience.HEDGE_MIN_SAMPLES):
+        up.latency.observe(0.01)
+    return up
+
+
+def test_slow_attempt_is_hedged_and_the_faster_one_wins():
+    up = _hedging_upstream("test-hedge")
+    delays = iter([1.0, 0.0])
+    cancelled = []
+
+    async def attempt():
+        delay = next(delays)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    assert asyncio.run(up.call(attempt)) == 0.0
+    assert up.counters["hedges"] == 1
+    assert up.counters["hedge_wins"] == 1
+    assert cancelled == [1.0]
+
+
+def test_cancelling_the_caller_cancels_its_attempts():
+    up = _hedging_upstream("test-hedge-cancel")
+    cancelled = []
+
+    async def attempt():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def scenario():
+        call = asyncio.ensure_future(up.call(attempt))
+        # Cancelled while still waiting to decide whether to hedge
+        await asyncio.sleep(0.001)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0.01)
+        # Before asyncio.run would clean up leftover tasks
+        return list(cancelled)
+
+    assert asyncio.run(scenario()) == [1]
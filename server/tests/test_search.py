@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import search
+from search import SearchResult
+
+
+def _fake_api(monkeypatch, results):
+    calls = []
+
+    async def search_api(query, max_results=10, gl=None, hl=None):
+        calls.append((query, gl, hl))
+        return [SearchResult(**r.to_dict()) for r in results]
+
+    monkeypatch.setattr(search, "search_api", search_api)
+    return calls
+
+
+RESULTS = [SearchResult(link="https://a.example", rank=1, snippet="A", title="A")]
+
+
+def test_equivalent_queries_share_a_cache_key():
+    assert search._cache_key("  Heat   PUMPS ", "US", "EN") == search._cache_key("heat pumps", "us", "en")
+    assert search._cache_key("ｈｅａｔ pumps", "us", "en") == search._cache_key("heat pumps", "us", "en")
+    assert search._cache_key("heat pumps", "us", "en") != search._cache_key("heat pumps", "uk", "en")
+
+
+def test_repeated_searches_are_served_from_the_cache(monkeypatch):
+    calls = _fake_api(monkeypatch, RESULTS)
+    first = asyncio.run(search.search("Cache Test Query"))
+    second = asyncio.run(search.search("cache   test query"))
+    assert [r.to_dict() for r in first] == [r.to_dict() for r in second] == [RESULTS[0].to_dict()]
+    assert len(calls) == 1
+    # Another locale is a different search
+    asyncio.run(search.search("cache test query", gl="de", hl="de"))
+    assert len(calls) == 2
+
+
+def test_empty_results_are_not_cached(monkeypatch):
+    calls = _fake_api(monkeypatch, [])
+    assert asyncio.run(search.search("empty result query")) == []
+    assert asyncio.run(search.search("empty result query")) == []
+    assert len(calls) == 2
+
+
+def test_expired_results_stand_in_when_serpapi_returns_nothing(monkeypatch):
+    key = search._cache_key("stale query", search.SEARCH_GL, search.SEARCH_HL)
+    search.search_cache.set(key, {"results": [RESULTS[0].to_dict()], "fresh_until": time.time() - 1})
+    calls = _fake_api(monkeypatch, [])
+    results = asyncio.run(search.search("stale query"))
+    assert [r.link for r in results] == ["https://a.example"]
+    assert len(calls) == 1
+
+
+
+def test_search_result_serializes_to_the_api_record():
+    record = SearchResult(link="https://a.example", rank=1, snippet="s", title="t").to_dict()
+    assert json.loads(json.dumps(record)) == {"link": "https://a.example", "rank": 1, "snippet": "s", "title": "t"}
+    assert not hasattr(SearchResult(), "__dict__")
+
+
+def test_serpapi_results_are_parsed_and_ranked(monkeypatch):
+    async def get_json(url, params=None, headers=None, timeout=10):
+        return {"organic_results": [
+            {"link": "https://a.example", "title": "A", "description": "from description"},
+            {"link": "https://b.example", "title": "B", "snippet": "from snippet"},
+        ]}
+
+    monkeypatch.setattr(search, "SERPAPI_KEY", "test-key")
+    monkeypatch.setattr(search.http_client, "get_json", get_json)
+    results = asyncio.run(search.search_api("parse test"))
+    assert [(r.rank, r.link, r.snippet) for r in results] == [
+        (1, "https://a.example", "from description"),
+        (2, "https://b.example", "from snippet"),
+    ]
+
+
+def test_search_path_does_not_import_pandas():
+    code = "import sys, search; assert 'pandas' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(search.__file__), check=True)
+
+
+def test_search_endpoint_returns_result_records(monkeypatch):
+    import app
+
+    async def fake_search(query):
+        return RESULTS
+
+    async def no_summary(snippets):
+        return None
+
+    monkeypatch.setattr(app, "search", fake_search)
+    monkeypatch.setattr(app, "get_summerized_results", no_summary)
+    response = app.app.test_client().post("/search", json={"query": "records"}, environ_base={"REMOTE_ADDR": "10.0.14.1"})
+    assert response.status_code == 200
+    assert response.get_json() == {"results": [RESULTS[0].to_dict()], "summary_result": []}
@@ -0,0 +1,244 @@
+import asyncio
+
+import pytest
+
+import services
+from services import _JsonSectionScanner
+from settings import SUMMARY_CHUNK_SIZE
+
+
+def _feed_all(scanner, text, step):
+    sections = []
+    for i in range(0, len(text), step):
+        sections.extend(scanner.feed(text[i:i + step]))
+    return sections
+
+
+def test_sections_are_emitted_as_soon_as_they_close():
+    scanner = _JsonSectionScanner()
+    assert scanner.feed('{"a": {"web1": [1, 2]}, ') == [("a", {"web1": [1, 2]})]
+    assert scanner.feed('"b": "x"') == []
+    assert scanner.feed("}") == [("b", "x")]
+
+
+def test_any_chunking_gives_the_same_sections():
+    text = 'Here you go: {"key": {"web1": "a, b", "web2": "}"}, "list": [1, {"n": 2}], "s": "q\\"uote"}'
+    expected = [("key", {"web1": "a, b", "web2": "}"}), ("list", [1, {"n": 2}]), ("s", 'q"uote')]
+    for step in (1, 3, 7, len(text)):
+        assert _feed_all(_JsonSectionScanner(), text, step) == expected
+
+
+def test_malformed_members_are_skipped():
+    scanner = _JsonSectionScanner()
+    assert scanner.feed('{"ok": 1, "bad": nope, "also": 2}') == [("ok", 1), ("also", 2)]
+
+
+def test_stream_compare_cancels_the_other_clean_when_one_fails(monkeypatch):
+    cancelled = []
+
+    async def clean(url, query=None):
+        if url.endswith("bad"):
+            raise ValueError("Failed to load content")
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(url)
+            raise
+        return "text"
+
+    monkeypatch.setattr(services, "_clean_for_stream", clean)
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            async for _ in services.stream_compare("https://a.example/bad", "https://b.example/good"):
+                pass
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert cancelled == ["https://b.example/good"]
+
+
+def test_default_budget_maps_several_chunks_of_a_long_page():
+    chunks = ["x" * SUMMARY_CHUNK_SIZE] * 5
+    assert len(services._budget_chunks(chunks)) > 1
+    assert sum(len(c) for c in services._budget_chunks(chunks)) >= 20000
+
+
+def test_long_page_splits_into_several_budgeted_chunks():
+    pytest.importorskip("langchain_text_splitters")
+    page = "\n\n".join(f"Paragraph {i}. " + "word " * 200 for i in range(60))
+    assert len(services._budget_chunks(services._split_chunks(page))) > 1
+
+
+def test_ranked_passages_are_all_cleaned_within_the_page_budget(monkeypatch):
+    budgets, mapped = [], []
+
+    def select(text, query, budget):
+        budgets.append(budget)
+        return text
+
+    async def map_chunks(chunks, fn, **_kwargs):
+        mapped.extend(chunks)
+        return list(chunks)
+
+    async def reduce_tree(parts, merge, fanin):
+        return "\n".join(parts)
+
+    monkeypatch.setattr(services.ranking, "select", select)
+    monkeypatch.setattr(services, "_split_chunks", lambda text: [text] * 4)
+    monkeypatch.setattr(services, "map_chunks", map_chunks)
+    monkeypatch.setattr(services, "reduce_tree", reduce_tree)
+    monkeypatch.setattr(services, "SUMMARY_TOKEN_BUDGET", 1000)
+    monkeypatch.setattr(services, "SUMMARY_QUERY_TOKEN_BUDGET", 4000)
+
+    page = "x" * 2000  # 501 tokens a chunk: only one would fit the page budget
+    asyncio.run(services._clean_document(page, query="topic"))
+    assert budgets == [1000]
+    assert len(mapped) == 4
+
+
+def test_prefetch_warms_the_summary_for_the_search_query(monkeypatch):
+    import prefetch
+    import runtime
+
+    warmed = []
+
+    async def warm_page(url, summarize=True, reserve_tokens=None, query=None):
+        warmed.append((url, query))
+        return True
+
+    monkeypatch.setattr(prefetch, "warm_page", warm_page)
+    runtime.run_sync(prefetch._prefetch_batch(["https://a.example", "https://b.example"], "heat pumps"), timeout=5)
+    assert sorted(warmed) == [("https://a.example", "heat pumps"), ("https://b.example", "heat pumps")]
+
+
+def _collect(deltas):
+    async def scenario():
+        return [delta async for delta in deltas]
+
+    return asyncio.run(scenario())
+
+
+def test_streamed_snippet_summary_is_cached_and_replayed(monkeypatch):
+    streamed = []
+
+    async def astream_prompt(task, template, inputs):
+        streamed.append(task)
+        for delta in ("[First point|", "Second ", "point]"):
+            yield delta
+
+    monkeypatch.setattr(services, "_astream_prompt", astream_prompt)
+    snippets = "Snippets for a stream-cache test."
+
+    first = _collect(services.stream_summerized_results(snippets))
+    assert first == ["[First point|", "Second ", "point]"]
+    # The second request is served from the cache, without an LLM call
+    assert _collect(services.stream_summerized_results(snippets)) == ["[First point|Second point]"]
+    assert streamed == ["snippet_summary"]
+    assert asyncio.run(services.get_summerized_results(snippets)) == "[First point|Second point]"
+
+
+def test_invalid_streamed_snippet_summary_is_not_cached(monkeypatch):
+    async def astream_prompt(task, template, inputs):
+        yield "Sorry, I can't help with that."
+
+    monkeypatch.setattr(services, "_astream_prompt", astream_prompt)
+    snippets = "Snippets for an invalid stream test."
+    _collect(services.stream_summerized_results(snippets))
+    key = services._llm_key("snippet_summary", services.summarized_template, snippets)
+    assert services.content_cache.llm_cache.get(key) is None
+
+
+def test_stream_joins_a_snippet_summary_already_in_flight(monkeypatch):
+    import runtime
+
+    calls = []
+
+    class Message:
+        content = "[Shared point|Another]"
+
+    async def ainvoke(task, template, inputs, validate=None):
+        calls.append(task)
+        await asyncio.sleep(0.05)
+        return Message()
+
+    async def astream_prompt(task, template, inputs):
+        raise AssertionError("should have joined the call in flight")
+        yield
+
+    monkeypatch.setattr(services, "_ainvoke", ainvoke)
+    monkeypatch.setattr(services, "_astream_prompt", astream_prompt)
+    snippets = "Snippets for an in-flight stream test."
+
+    async def scenario():
+        plain = asyncio.ensure_future(services.get_summerized_results(snippets))
+        await asyncio.sleep(0.01)
+        streamed = [delta async for delta in services.stream_summerized_results(snippets)]
+        return await plain, streamed
+
+    assert runtime.run_sync(scenario(), timeout=5) == ("[Shared point|Another]", ["[Shared point|Another]"])
+    assert calls == ["snippet_summary"]
+
+
+def _fake_site_model(monkeypatch, calls, merged=None):
+    """Stub the page cleaner and the model for compare_many; `calls` records
+    (task, content) for every model call that isn't served from cache."""
+    import json
+
+    class Message:
+        def __init__(self, content):
+            self.content = content
+
+    async def clean(url):
+        return None if url.endswith("/empty") else f"Cleaned text of {url}"
+
+    async def ainvoke(task, template, inputs, validate=None):
+        calls.append((task, inputs["content"]))
+        if task == "analysis":
+            return Message(json.dumps({"key_points": [inputs["content"]], "strengths": ["fast"]}))
+        site_labels = sorted(json.loads(inputs["content"]))
+        return Message(json.dumps(merged or {
+            "unique_features": {label: [f"only {label}"] for label in site_labels},
+            "similarities": ["both pages"],
+            "differences": [],
+            "summary": "merged",
+        }))
+
+    monkeypatch.setattr(services, "clean_webpage_content", clean)
+    monkeypatch.setattr(services, "_ainvoke", ainvoke)
+
+
+def test_compare_many_reuses_cached_site_analyses(monkeypatch):
+    import runtime
+
+    calls = []
+    _fake_site_model(monkeypatch, calls)
+    a, b, c = (f"https://compare-{name}.example/page" for name in "abc")
+
+    first = runtime.run_sync(services.compare_many([a, b]), timeout=5)
+    assert [task for task, _ in calls] == ["analysis", "analysis", "multi_compare"]
+    assert first["comparison"]["unique_features"] == {a: ["only site1"], b: ["only site2"]}
+
+    calls.clear()
+    second = runtime.run_sync(services.compare_many([c, b, a]), timeout=5)
+    # Only the new site is analyzed; a and b come from the first comparison
+    assert [task for task, _ in calls] == ["analysis", "multi_compare"]
+    assert set(second["sites"]) == {a, b, c}
+    assert second["comparison"]["unique_features"][c] == ["only site3"]
+
+    calls.clear()
+    # The same set of sites in another order hits the cached merge too
+    runtime.run_sync(services.compare_many([a, c, b]), timeout=5)
+    assert calls == []
+
+
+def test_compare_many_skips_the_merge_with_fewer_than_two_analyses(monkeypatch):
+    import runtime
+
+    calls = []
+    _fake_site_model(monkeypatch, calls)
+    good = "https://compare-lonely.example/page"
+    outcome = runtime.run_sync(services.compare_many([good, "https://compare-x.example/empty"]), timeout=5)
+    assert outcome["comparison"] is None
+    assert outcome["sites"]["https://compare-x.example/empty"] is None
+    assert [task for task, _ in calls] == ["analysis"]
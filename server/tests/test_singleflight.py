@@ -0,0 +1,125 @@
+import asyncio
+
+import llm_scheduler
+import runtime
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_task():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        return await asyncio.gather(*(flights.do("op", "key", work) for _ in range(5)))
+
+    assert runtime.run_sync(scenario(), timeout=5) == ["done"] * 5
+    assert len(calls) == 1
+    assert flights.stats() == {"op": {"started": 1, "coalesced": 4, "promoted": 0}}
+
+
+def test_different_keys_run_separately():
+    flights = SingleFlight()
+
+    async def scenario():
+        return await asyncio.gather(
+            flights.do("op", "a", lambda: asyncio.sleep(0, "a")),
+            flights.do("op", "b", lambda: asyncio.sleep(0, "b")),
+        )
+
+    assert runtime.run_sync(scenario(), timeout=5) == ["a", "b"]
+    assert flights.stats()["op"]["started"] == 2
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    flights = SingleFlight()
+    attempts = []
+
+    async def fail():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        return await asyncio.gather(*(flights.do("op", "k", fail) for _ in range(3)), return_exceptions=True)
+
+    results = runtime.run_sync(scenario(), timeout=5)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(attempts) == 1
+    # The failure is not remembered: the next call tries again
+    assert isinstance(runtime.run_sync(scenario(), timeout=5)[0], ValueError)
+    assert len(attempts) == 2
+
+
+def test_cancelled_waiter_leaves_shared_task_running_for_others():
+    flights = SingleFlight()
+    finished = []
+
+    async def work():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+        return "ok"
+
+    async def scenario():
+        first = asyncio.ensure_future(flights.do("op", "k", work))
+        second = asyncio.ensure_future(flights.do("op", "k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert runtime.run_sync(scenario(), timeout=5) == "ok"
+    assert finished == [1]
+
+
+def test_shared_task_is_cancelled_when_every_waiter_leaves():
+    flights = SingleFlight()
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def scenario():
+        waiter = asyncio.ensure_future(flights.do("op", "k", work))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.01)
+
+    runtime.run_sync(scenario(), timeout=5)
+    assert cancelled == [1]
+
+
+def test_interactive_caller_promotes_a_background_call():
+    flights = SingleFlight()
+    started = []
+    seen = []
+
+    async def work():
+        started.append(1)
+        await asyncio.sleep(0.05)
+        # Checked after the interactive caller joined
+        flight = llm_scheduler.current_flight.get()
+        seen.append(llm_scheduler.effective_priority(llm_scheduler.current_priority.get(), flight))
+        return "ok"
+
+    async def call(priority):
+        llm_scheduler.current_priority.set(priority)
+        return await flights.do("op", "k", work)
+
+    async def scenario():
+        background = asyncio.ensure_future(call(llm_scheduler.BACKGROUND))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.ensure_future(call(llm_scheduler.INTERACTIVE))
+        return await asyncio.gather(background, interactive)
+
+    assert runtime.run_sync(scenario(), timeout=5) == ["ok", "ok"]
+    assert started == [1]
+    assert seen == [llm_scheduler.INTERACTIVE]
+    assert flights.stats()["op"] == {"started": 1, "coalesced": 1, "promoted": 1}
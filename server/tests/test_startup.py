@@ -0,0 +1,35 @@
+import json
+import os
+import subprocess
+import sys
+
+from bench.startup import DEFERRED, SERVER_DIR, _env
+
+# Generous for a loaded CI machine; bench.startup reports the real profile
+BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+import_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{"import_ms": import_ms, "loaded": sorted(m for m in {deferred!r} if m in sys.modules)}}))
+"""
+
+
+def _probe():
+    env = _env()
+    env["CONTENT_CACHE_BACKEND"] = "memory"
+    env["RATELIMIT_STORAGE_URI"] = "memory://"
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(deferred=DEFERRED)],
+        cwd=SERVER_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_app_defers_heavy_modules_and_fits_budget():
+    # Best of a few runs, so one cold disk cache doesn't fail the build
+    probes = [_probe() for _ in range(3)]
+    assert all(p["loaded"] == [] for p in probes), probes[0]["loaded"]
+    assert min(p["import_ms"] for p in probes) < BUDGET_MS
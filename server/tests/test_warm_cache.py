@@ -0,0 +1,128 @@
+import asyncio
+import io
+import json
+
+import pytest
+
+import warm_cache
+from llm_scheduler import LLMOverloaded
+from search import SearchResult
+from warm_cache import QUERY, URL, Warmer, load_journal, read_items
+
+
+def test_read_items_classifies_lines_and_drops_repeats(tmp_path):
+    path = tmp_path / "popular.txt"
+    path.write_text(
+        "# popular this week\n"
+        "best laptops\n"
+        "\n"
+        "https://a.example/page\n"
+        "  best laptops  \n"
+        "http://b.example\n",
+        encoding="utf-8",
+    )
+    assert read_items(path) == [
+        (QUERY, "best laptops"),
+        (URL, "https://a.example/page"),
+        (URL, "http://b.example"),
+    ]
+
+
+def test_load_journal_keeps_only_finished_successes(tmp_path):
+    path = tmp_path / "popular.txt.warm.jsonl"
+    assert load_journal(path) == set()
+    path.write_text(
+        json.dumps({"kind": QUERY, "item": "ok query", "ok": True}) + "\n"
+        + json.dumps({"kind": URL, "item": "https://failed.example", "ok": False}) + "\n"
+        + '{"kind": "url", "item": "https://cut.exa',
+        encoding="utf-8",
+    )
+    assert load_journal(path) == {(QUERY, "ok query")}
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Stub the search and summary pipelines; returns the calls they receive."""
+    calls = []
+
+    async def search(query):
+        calls.append(("search", query))
+        return [SearchResult(link=f"https://{query}.example/{i}", rank=i, snippet="s", title="t") for i in range(1, 4)]
+
+    async def get_summerized_results(snippets):
+        calls.append(("snippets", snippets))
+        return "[point]"
+
+    async def clean_webpage_content(url):
+        calls.append(("clean", url))
+        return "cleaned"
+
+    async def get_summary(url, query=None):
+        calls.append(("summary", url, query))
+        return "summary"
+
+    monkeypatch.setattr(warm_cache, "search", search)
+    monkeypatch.setattr(warm_cache, "get_summerized_results", get_summerized_results)
+    monkeypatch.setattr(warm_cache, "clean_webpage_content", clean_webpage_content)
+    monkeypatch.setattr(warm_cache, "get_summary", get_summary)
+    return calls
+
+
+def _journal_entries(journal):
+    return [json.loads(line) for line in journal.getvalue().splitlines()]
+
+
+def test_followed_pages_get_the_summary_for_their_query(pipeline):
+    journal = io.StringIO()
+    warmer = Warmer(journal, concurrency=2, follow=2, progress_every=0)
+    asyncio.run(warmer.run([(QUERY, "laptops"), (URL, "https://laptops.example/1")]))
+
+    summaries = sorted(call[1:] for call in pipeline if call[0] == "summary")
+    # The URL that was also listed in the input is warmed once, as listed
+    assert summaries == [
+        ("https://laptops.example/1", None),
+        ("https://laptops.example/2", "laptops"),
+    ]
+    assert warmer.total == 3
+    assert warmer.counters["followed"] == 1
+    assert warmer.counters["ok"] == 3
+    assert all(entry["ok"] for entry in _journal_entries(journal))
+
+
+def test_resumed_run_skips_items_already_done(pipeline):
+    warmer = Warmer(io.StringIO(), progress_every=0, skip={(QUERY, "done")})
+    asyncio.run(warmer.run([(QUERY, "done"), (URL, "https://new.example")]))
+    assert warmer.counters["skipped"] == 1
+    assert ("search", "done") not in pipeline
+    assert ("clean", "https://new.example") in pipeline
+
+
+def test_an_overloaded_llm_is_waited_out_then_the_item_fails(monkeypatch, pipeline):
+    attempts = []
+
+    async def get_summary(url, query=None):
+        attempts.append(url)
+        raise LLMOverloaded("busy", retry_after=0)
+
+    monkeypatch.setattr(warm_cache, "get_summary", get_summary)
+    journal = io.StringIO()
+    warmer = Warmer(journal, retries=2, progress_every=0)
+    asyncio.run(warmer.run([(URL, "https://busy.example")]))
+
+    assert len(attempts) == 3
+    assert warmer.counters["failed"] == 1
+    [entry] = _journal_entries(journal)
+    assert entry["ok"] is False and entry["error"] == "busy"
+
+
+def test_an_unexpected_error_fails_the_item_without_retrying(monkeypatch, pipeline):
+    async def clean_webpage_content(url):
+        pipeline.append(("clean", url))
+        raise ValueError("Failed to load content")
+
+    monkeypatch.setattr(warm_cache, "clean_webpage_content", clean_webpage_content)
+    warmer = Warmer(io.StringIO(), retries=2, progress_every=0)
+    asyncio.run(warmer.run([(URL, "https://broken.example")]))
+    assert pipeline == [("clean", "https://broken.example")]
+    assert warmer.counters["failed"] == 1
+    assert warmer.progress_line().startswith("1/1 warmed (1 failed)")
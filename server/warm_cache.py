@@ -0,0 +1,269 @@
+"""Warm the shared caches with popular queries and pages, e.g. off-peak before a deploy.
+
+Reads a file with one query or URL per line (lines starting with http:// or
+https:// are URLs; blank lines and # comments are skipped) and runs the same
+pipelines the API does, so everything lands in the server's cache store
+(CONTENT_CACHE_BACKEND / SEARCH_CACHE_BACKEND):
+
+- a query: `search`, then `get_summerized_results` on its top snippets; with
+  --follow N its top N result pages are warmed as URLs too, with the
+  summary focused on the query as a click on the result asks for it;
+- a URL: `clean_webpage_content`, then `get_summary`.
+
+At most --concurrency items are in progress at once; the fetch politeness and
+LLM scheduler limits (LLM_SMALL_TPM, LLM_LARGE_TPM, ...) apply on top, per process. Each
+finished item is appended to a journal (default: <input>.warm.jsonl), and
+--resume skips the ones an earlier run completed. Progress and throughput are
+printed every --progress seconds and at the end. Run from the server directory:
+
+    python warm_cache.py popular.txt
+    python warm_cache.py popular.txt --concurrency 8 --follow 3
+    python warm_cache.py popular.txt --resume
+
+Exits 1 if any item failed, 130 if interrupted.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+import cache
+import llm_scheduler
+import metrics
+import models
+import runtime
+from llm_scheduler import LLMOverloaded
+from search import search, snippets_text
+from services import clean_webpage_content, get_summary, get_summerized_results
+
+logger = logging.getLogger("warm_cache")
+
+QUERY = "query"
+URL = "url"
+
+
+def read_items(path):
+    """(kind, item) pairs from the input file, in order and without repeats."""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            items.append((URL if line.startswith(("http://", "https://")) else QUERY, line))
+    return list(dict.fromkeys(items))
+
+
+def load_journal(path):
+    """(kind, item) pairs an earlier run warmed successfully."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Cut short by an interrupted run
+                continue
+            if entry.get("ok"):
+                done.add((entry["kind"], entry["item"]))
+    return done
+
+
+class Warmer:
+    """Runs items through a fixed pool of workers and records each outcome."""
+
+    def __init__(self, journal, concurrency=4, follow=0, retries=2, progress_every=10.0, skip=()):
+        self.journal = journal
+        self.concurrency = concurrency
+        self.follow = follow
+        self.retries = retries
+        self.progress_every = progress_every
+        self.skip = set(skip)
+        # ok, failed, skipped, followed
+        self.counters = Counter()
+        self.latency = {QUERY: [], URL: []}
+        self.total = 0
+        self.started = None
+        self._seen = set()
+        # Query that led to each followed URL, for its focused summary
+        self._queries = {}
+        self._queue = None
+
+    def _enqueue(self, kind, item):
+        if (kind, item) in self._seen:
+            return False
+        self._seen.add((kind, item))
+        if (kind, item) in self.skip:
+            self.counters["skipped"] += 1
+            return False
+        self.total += 1
+        self._queue.put_nowait((kind, item))
+        return True
+
+    async def _warm_query(self, query):
+        results = await search(query)
+        if not results:
+            return False
+        for result in results[:self.follow]:
+            if result.link and self._enqueue(URL, result.link):
+                self._queries[result.link] = query
+                self.counters["followed"] += 1
+        return bool(await get_summerized_results(snippets_text(results)))
+
+    async def _warm_url(self, url):
+        # Without a query get_summary reuses the cleaned text cached by the
+        # first step; a followed page gets the summary focused on its query
+        if not await clean_webpage_content(url):
+            return False
+        return bool(await get_summary(url, self._queries.get(url)))
+
+    async def _warm(self, kind, item):
+        started = time.perf_counter()
+        ok, error = False, None
+        for attempt in range(self.retries + 1):
+            try:
+                ok = await (self._warm_query(item) if kind == QUERY else self._warm_url(item))
+                error = None if ok else "no result"
+                break
+            except LLMOverloaded as e:
+                # The LLM quota is spent for now; wait for it rather than fail the item
+                error = str(e)
+                if attempt < self.retries:
+                    await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.exception(f"Warming {kind} {item!r} failed")
+                error = str(e)
+                break
+        elapsed = time.perf_counter() - started
+        self.latency[kind].append(elapsed)
+        self.counters["ok" if ok else "failed"] += 1
+        entry = {"kind": kind, "item": item, "ok": ok, "seconds": round(elapsed, 3)}
+        if error:
+            entry["error"] = error
+        self.journal.write(json.dumps(entry) + "\n")
+        self.journal.flush()
+
+    async def _worker(self):
+        while True:
+            kind, item = await self._queue.get()
+            try:
+                await self._warm(kind, item)
+            finally:
+                self._queue.task_done()
+
+    async def _report_progress(self):
+        while True:
+            await asyncio.sleep(self.progress_every)
+            print(self.progress_line(), flush=True)
+
+    async def run(self, items):
+        llm_scheduler.current_client.set("warm-cache")
+        self._queue = asyncio.Queue()
+        self.started = time.perf_counter()
+        for kind, item in items:
+            self._enqueue(kind, item)
+        tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.concurrency)]
+        if self.progress_every > 0:
+            tasks.append(asyncio.ensure_future(self._report_progress()))
+        try:
+            await self._queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started if self.started else 0.0
+
+    def progress_line(self):
+        finished = self.counters["ok"] + self.counters["failed"]
+        elapsed = self.elapsed()
+        rate = finished / elapsed if elapsed else 0.0
+        return (
+            f"{finished}/{self.total} warmed ({self.counters['failed']} failed) "
+            f"in {elapsed:.1f}s, {rate:.2f} items/s"
+        )
+
+    def report(self):
+        print()
+        print(self.progress_line())
+        print(
+            f"skipped (done in an earlier run): {self.counters['skipped']}, "
+            f"result links followed: {self.counters['followed']}"
+        )
+        for kind, samples in self.latency.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            print(
+                f"{kind:<6} n={len(samples):<5} p50 {statistics.median(ordered) * 1000:>8.0f}ms "
+                f"p95 {p95 * 1000:>8.0f}ms  max {ordered[-1] * 1000:>8.0f}ms"
+            )
+        calls = Counter()
+        for (upstream, outcome), n in metrics.upstream_requests._values.items():
+            calls[upstream] += n
+        print("upstream calls:", dict(calls))
+        tokens = Counter()
+        for usage in models.usage.values():
+            tokens["input"] += int(usage["input_tokens"])
+            tokens["output"] += int(usage["output_tokens"])
+        print("LLM tokens:", dict(tokens))
+        for snap in (c.stats() for c in cache.caches):
+            print(f"cache {snap['name']:<14} {snap['size'] if snap['size'] is not None else '?':>7} entries, {snap['hits']} hits, {snap['misses']} misses")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="file with one query or URL per line")
+    parser.add_argument("--concurrency", type=int, default=4, help="items warmed at once")
+    parser.add_argument("--follow", type=int, default=0, help="also warm the top N result pages of each query")
+    parser.add_argument("--resume", action="store_true", help="skip items the journal records as done")
+    parser.add_argument("--journal", help="progress journal (default: <input>.warm.jsonl)")
+    parser.add_argument("--retries", type=int, default=2, help="times to wait out a saturated LLM quota per item")
+    parser.add_argument("--progress", type=float, default=10, help="seconds between progress lines; 0 for none")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log pipeline details")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+    )
+    items = read_items(args.input)
+    journal_path = args.journal or args.input + ".warm.jsonl"
+    done = load_journal(journal_path) if args.resume else set()
+
+    interrupted = False
+    with open(journal_path, "a" if args.resume else "w", encoding="utf-8") as journal:
+        warmer = Warmer(
+            journal,
+            concurrency=args.concurrency,
+            follow=args.follow,
+            retries=args.retries,
+            progress_every=args.progress,
+            skip=done,
+        )
+        future = runtime.submit(warmer.run(items))
+        try:
+            future.result()
+        except KeyboardInterrupt:
+            # Let in-flight items stop before the journal closes
+            interrupted = True
+            future.cancel()
+            concurrent.futures.wait([future], timeout=10)
+            print("\ninterrupted; run again with --resume to continue", file=sys.stderr)
+    warmer.report()
+    if interrupted:
+        sys.exit(130)
+    sys.exit(1 if warmer.counters["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()